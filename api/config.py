@@ -1,35 +1,95 @@
 # api/config.py
 import os
-from fastapi import FastAPI
+import time
+import asyncio
+from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-import google.generativeai as genai
 
 from utils.logging import setup_logging
 from api.routes import router
 from api.middleware import add_middleware
+from api.responses import JSONBytesResponse, run_job_extraction
+from services.backends import get_backend
 from services.gemini import validate_gemini_api_key
+from services.image_pool import start_image_pool, stop_image_pool
+from services.jobs import get_job_store, start_job_workers, stop_job_workers
+from services.limiter import get_upstream_limiter
+from services.memory import start_memory_profiling, stop_memory_profiling
+from services.metrics import bind_gauges, mark_worker_dead, render_metrics
+from services.registry import get_registry, init_registry
+from services.results import start_result_writer, stop_result_writer
+from services.scheduler import get_upstream_scheduler
+from services.shared_state import start_shared_state, stop_shared_state
+from services.warmup import is_ready, record_startup_timing, set_ready, startup_timings, warm_up
 
-def initialize_app() -> FastAPI:
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start background workers on startup and stop them on shutdown
+    
+    The worker only starts taking requests once the warmup is done, and
+    reports ready from then until shutdown starts. On shutdown, in-flight
+    requests have already drained; running jobs are
+    handed back to the queue, queued results are committed to the result
+    store, and shared state held by this worker is released.
+    
+    Args:
+        app: FastAPI application
+    """
+    start_shared_state()
+    start_image_pool()
+    await warm_up()
+    start_memory_profiling()
+    start_result_writer()
+    start_job_workers(run_job_extraction)
+    prompt_watcher = asyncio.create_task(get_registry().watch())
+    set_ready(True)
+    yield
+    set_ready(False)
+    prompt_watcher.cancel()
+    await stop_job_workers()
+    await stop_result_writer()
+    stop_image_pool()
+    await stop_shared_state()
+    stop_memory_profiling()
+    mark_worker_dead()
+
+def initialize_app(import_seconds: Optional[float] = None) -> FastAPI:
     """
     Initialize and configure the FastAPI application
     
+    Args:
+        import_seconds: Time the entry point spent importing the application, if measured
+        
     Returns:
         FastAPI: Configured FastAPI application
     """
+    init_start = time.perf_counter()
+    
     # Initialize logging
     logger = setup_logging()
+    if import_seconds is not None:
+        logger.info("Application modules imported in %.2fs", import_seconds)
+        record_startup_timing("import", import_seconds)
     
-    # Validate Gemini API key
-    gemini_api_key = validate_gemini_api_key()
+    # The fake and replay backends run offline without an API key
+    backend = get_backend()
+    if backend.requires_api_key:
+        # Fail fast on a missing key; the SDK itself is imported by the warmup
+        validate_gemini_api_key()
     
-    # Configure Gemini
-    genai.configure(api_key=gemini_api_key)
+    # Load prompts once for the whole process
+    init_registry()
     
     # Create FastAPI app
     app = FastAPI(
         title="Patient Care Data Extraction API",
         description="API for extracting data from patient care forms",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=JSONBytesResponse
     )
     
     # Add CORS middleware
@@ -47,14 +107,43 @@ def initialize_app() -> FastAPI:
     # Include routers
     app.include_router(router, prefix="/api/v1")
     
+    # Export queue gauges read at scrape time
+    bind_gauges(get_upstream_limiter(), get_upstream_scheduler(), get_job_store)
+    
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics endpoint"""
+        # Gauges over shared state query the store, which can block on other workers
+        body, content_type = await asyncio.to_thread(render_metrics)
+        return Response(content=body, media_type=content_type)
+    
     @app.get("/health")
     async def health_check():
         """Health check endpoint"""
         from datetime import datetime
+        prompt = get_registry().get_prompt("extraction")
         return {
             "status": "ok",
             "version": "1.0.0",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "backend": get_backend().name,
+            "prompt_version": prompt.version,
+            "prompt_sha256": prompt.sha256
         }
     
+    @app.get("/health/live")
+    async def liveness_check():
+        """Liveness probe: the worker's event loop is responding"""
+        return {"status": "alive"}
+    
+    @app.get("/health/ready")
+    async def readiness_check():
+        """Readiness probe: the warmup is done and the worker is not shutting down"""
+        if not is_ready():
+            return JSONBytesResponse(status_code=503, content={"status": "not_ready"})
+        return {"status": "ready", "startup_seconds": startup_timings()}
+    
+    record_startup_timing("init", time.perf_counter() - init_start)
+    logger.info("Application initialized in %.2fs", time.perf_counter() - init_start)
+    
     return app
\ No newline at end of file
@@ -1,39 +1,91 @@
 # api/middleware.py
 import time
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 import logging
 
+from utils.logging import request_id_var
+from services.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_BYTES, HTTP_REQUEST_SECONDS, HTTP_RESPONSE_BYTES
+
 logger = logging.getLogger("patient-care-api")
 
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware that logs requests and records HTTP metrics
+
+    Unlike `@app.middleware("http")`, it does not wrap the response in a
+    streaming task, so it adds almost nothing per request and does not
+    buffer streamed responses. It records request duration, request and
+    response body sizes and the number of requests in flight, and sets the
+    X-Process-Time header to the time until the response headers were sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = "unknown"
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+
+        # Records logged while handling this request carry its ID
+        request_id_token = request_id_var.set(None if request_id == "unknown" else request_id)
+        method = scope["method"]
+        start_time = time.perf_counter()
+        request_bytes = 0
+        response_bytes = 0
+        status_code = 500
+
+        # Log request information
+        logger.info("[%s] Request started: %s %s", request_id, method, scope["path"])
+
+        async def receive_wrapper():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_bytes, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Add processing time header
+                process_time = time.perf_counter() - start_time
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-process-time", str(process_time).encode("latin-1"))
+                ]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            process_time = time.perf_counter() - start_time
+
+            # Label by route name rather than path to keep the number of series bounded
+            handler = getattr(scope.get("route"), "name", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(method, handler, str(status_code)).observe(process_time)
+            HTTP_REQUEST_BYTES.labels(method, handler).observe(request_bytes)
+            HTTP_RESPONSE_BYTES.labels(method, handler).observe(response_bytes)
+
+            # Log response information
+            logger.info("[%s] Request completed: %s in %.2fs", request_id, status_code, process_time)
+            request_id_var.reset(request_id_token)
+
 def add_middleware(app: FastAPI):
     """
     Add custom middleware to the FastAPI application
-    
+
     Args:
         app: FastAPI application
     """
-    @app.middleware("http")
-    async def log_requests(request: Request, call_next):
-        """
-        Middleware to log request details and timing
-        """
-        request_id = request.headers.get("X-Request-ID", "unknown")
-        start_time = time.time()
-        
-        # Log request information
-        logger.info(f"[{request_id}] Request started: {request.method} {request.url.path}")
-        
-        # Process the request
-        response = await call_next(request)
-        
-        # Calculate processing time
-        process_time = time.time() - start_time
-        
-        # Log response information
-        logger.info(
-            f"[{request_id}] Request completed: {response.status_code} in {process_time:.2f}s"
-        )
-        
-        # Add processing time header
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
\ No newline at end of file
+    app.add_middleware(RequestMetricsMiddleware)
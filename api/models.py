@@ -2,12 +2,17 @@
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 
+from services.response_schema import FormExtraction
+
 class ExtractionResponse(BaseModel):
     """Response model for successful extraction"""
     request_id: str
     timestamp: str
     status: str
-    data: Dict[str, Any]
+    data: FormExtraction
+    cached: bool = False
+    near_duplicate_of: Optional[str] = None
+    coalesced_with: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     """Response model for errors"""
@@ -0,0 +1,312 @@
+# api/responses.py
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from fastapi.responses import JSONResponse
+
+from services.extraction import extract_patient_care_data
+from services.context import ExtractionContext
+from services.images import ImageEnvelope
+from services.metrics import count_error
+from services.results import record_result
+from services.scheduler import PRIORITY_JOB
+from utils.errors import ErrorType, get_error_message
+from utils.logging import bind_request_id
+from utils import jsonlib
+
+logger = logging.getLogger("patient-care-api")
+
+# Error types caused by the client's input
+CLIENT_ERROR_TYPES = [
+    ErrorType.INSUFFICIENT_IMAGES,
+    ErrorType.INVALID_IMAGES,
+    ErrorType.INCONSISTENT_INFORMATION,
+    ErrorType.IMAGE_QUALITY_ISSUE,
+    ErrorType.DUPLICATE_IMAGES,
+    ErrorType.INVALID_FILE_FORMAT,
+    ErrorType.INVALID_REQUEST
+]
+
+class JSONBytesResponse(JSONResponse):
+    """JSON response serialized straight to bytes, with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return jsonlib.dumps(content)
+
+def get_error_status_code(error_type: str) -> int:
+    """
+    Map an error type to its HTTP status code
+
+    Args:
+        error_type: Type of error
+
+    Returns:
+        int: HTTP status code
+    """
+    if error_type in CLIENT_ERROR_TYPES:
+        return 400
+    if error_type == ErrorType.SERVICE_BUSY:
+        return 429
+    if error_type == ErrorType.UPSTREAM_UNAVAILABLE:
+        return 503
+    if error_type == ErrorType.PAYLOAD_TOO_LARGE:
+        return 413
+    if error_type == ErrorType.NOT_FOUND:
+        return 404
+    return 500
+
+def build_error_content(
+    request_id: str,
+    timestamp: str,
+    error_type: str,
+    message: str,
+    details: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Build the body of an error response
+
+    Args:
+        request_id: Request ID
+        timestamp: Request timestamp
+        error_type: Type of error
+        message: Error message
+        details: Additional error details
+
+    Returns:
+        Dict: Body in the shape of ErrorResponse
+    """
+    return {
+        "request_id": request_id,
+        "timestamp": timestamp,
+        "status": "error",
+        "error": {
+            "type": error_type,
+            "message": message,
+            "details": details or {}
+        }
+    }
+
+def build_result_content(
+    request_id: str,
+    timestamp: str,
+    result: Dict[str, Any],
+    context: ExtractionContext
+) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+    """
+    Build the response for an extraction result
+
+    Args:
+        request_id: Request ID
+        timestamp: Request timestamp
+        result: Extracted data or error information
+        context: Per-request context of the extraction
+
+    Returns:
+        Tuple containing:
+            - int: HTTP status code
+            - Dict: Response body
+            - Dict: Extra response headers
+    """
+    headers = {}
+    if context.timings:
+        headers["Server-Timing"] = format_server_timing(context.timings)
+
+    if "error" in result and result["error"]:
+        count_error(result["error_type"])
+        retry_after = result.get("error_details", {}).get("retry_after")
+        if retry_after is not None:
+            headers["Retry-After"] = str(retry_after)
+
+        content = build_error_content(
+            request_id,
+            timestamp,
+            result["error_type"],
+            result["message"],
+            result.get("error_details", {})
+        )
+        return get_error_status_code(result["error_type"]), content, headers
+
+    # Built as a plain dict in the shape of ExtractionResponse: the data
+    # came from our own parser, so model validation would only copy it
+    content = {
+        "request_id": request_id,
+        "timestamp": timestamp,
+        "status": "success",
+        "data": result,
+        "cached": context.cached,
+        "near_duplicate_of": context.near_duplicate_of,
+        "coalesced_with": context.coalesced_with
+    }
+    return 200, content, headers
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """
+    Format per-stage timings as a Server-Timing header value
+
+    Args:
+        timings: Seconds spent in each stage
+
+    Returns:
+        str: Header value, e.g. "validate;dur=3.1, upstream;dur=1520.4"
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+async def decode_uploads(
+    uploads: List[Tuple[Optional[str], bytes]],
+    request_id: str,
+    timestamp: str
+) -> Tuple[Optional[List[ImageEnvelope]], Optional[Dict[str, Any]]]:
+    """
+    Validate uploaded images by decoding each of them once for the whole pipeline
+
+    The uploads are decoded concurrently in worker threads, so large images
+    do not hold up the event loop.
+
+    Args:
+        uploads: (filename, content) of each uploaded image, front side first
+        request_id: Request ID
+        timestamp: Request timestamp
+
+    Returns:
+        Tuple containing:
+            - List: Decoded images, or None if one is invalid
+            - Dict: Error response body for the first invalid image, or None
+    """
+    decoded = await asyncio.gather(
+        *(asyncio.to_thread(ImageEnvelope.from_bytes, content, filename) for filename, content in uploads),
+        return_exceptions=True
+    )
+    for (filename, _), result in zip(uploads, decoded):
+        if isinstance(result, BaseException):
+            for envelope in decoded:
+                if isinstance(envelope, ImageEnvelope):
+                    envelope.release()
+            error_content = build_error_content(
+                request_id,
+                timestamp,
+                ErrorType.INVALID_FILE_FORMAT,
+                f"File '{filename}' không phải là hình ảnh hợp lệ",
+                {
+                    "filename": filename,
+                    "error": str(result)
+                }
+            )
+            return None, error_content
+    return list(decoded), None
+
+async def run_extraction(
+    uploads: List[Tuple[Optional[str], bytes]],
+    request_id: str,
+    timestamp: str,
+    context: Optional[ExtractionContext] = None
+) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+    """
+    Validate uploaded images, extract their data and build the response
+
+    Args:
+        uploads: (filename, content) of each uploaded image, front side first
+        request_id: Request ID
+        timestamp: Request timestamp
+        context: Per-request context, e.g. one already holding the upload read time
+
+    Returns:
+        Tuple containing:
+            - int: HTTP status code
+            - Dict: Response body
+            - Dict: Extra response headers
+    """
+    bind_request_id(request_id)
+    try:
+        if context is None:
+            context = ExtractionContext(request_id=request_id)
+        stage_start = time.perf_counter()
+        images, error_content = await decode_uploads(uploads, request_id, timestamp)
+        context.record_timing("validate", time.perf_counter() - stage_start)
+        if error_content is not None:
+            return 400, error_content, {}
+
+        # Extract data
+        result = await extract_patient_care_data(images, request_id, context)
+        status_code, content, headers = build_result_content(request_id, timestamp, result, context)
+        record_result(status_code, content, context)
+        return status_code, content, headers
+
+    except Exception as e:
+        logger.error("[%s] Lỗi khi xử lý request: %s", request_id, e, exc_info=True)
+        content = build_error_content(
+            request_id,
+            timestamp,
+            ErrorType.PROCESSING_ERROR,
+            f"Lỗi khi xử lý request: {str(e)}"
+        )
+        return 500, content, {}
+
+async def run_job_extraction(
+    uploads: List[Tuple[Optional[str], bytes]],
+    request_id: str,
+    timestamp: str
+) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+    """
+    Run the extraction of a background job, behind interactive and batch traffic
+
+    Args:
+        uploads: (filename, content) of each uploaded image, front side first
+        request_id: Job ID
+        timestamp: Job start timestamp
+
+    Returns:
+        Tuple containing:
+            - int: HTTP status code
+            - Dict: Response body
+            - Dict: Extra response headers
+    """
+    context = ExtractionContext(request_id=request_id, priority=PRIORITY_JOB)
+    return await run_extraction(uploads, request_id, timestamp, context)
+
+def build_insufficient_images_content(request_id: str, timestamp: str, received: int) -> Dict[str, Any]:
+    """
+    Build the error body for a request without exactly two images
+
+    Args:
+        request_id: Request ID
+        timestamp: Request timestamp
+        received: Number of images received
+
+    Returns:
+        Dict: Serialized ErrorResponse
+    """
+    return build_error_content(
+        request_id,
+        timestamp,
+        ErrorType.INSUFFICIENT_IMAGES,
+        f"{get_error_message(ErrorType.INSUFFICIENT_IMAGES)}, đã nhận {received}",
+        {
+            "received": received,
+            "required": 2
+        }
+    )
+
+def build_batch_images_content(request_id: str, timestamp: str, received: int) -> Dict[str, Any]:
+    """
+    Build the error body for a batch that is empty or has an image without its other side
+
+    Args:
+        request_id: Request ID
+        timestamp: Request timestamp
+        received: Number of images received
+
+    Returns:
+        Dict: Serialized ErrorResponse
+    """
+    return build_error_content(
+        request_id,
+        timestamp,
+        ErrorType.INSUFFICIENT_IMAGES,
+        f"Lô ảnh cần một hoặc nhiều cặp mặt trước và mặt sau, số ảnh phải là số chẵn, đã nhận {received}",
+        {
+            "received": received,
+            "required": "front and back image for each pair"
+        }
+    )
@@ -1,37 +1,123 @@
 # api/routes.py
+import os
+import time
 import uuid
+import io
+import asyncio
+import zipfile
 from datetime import datetime
-from fastapi import APIRouter, File, UploadFile, BackgroundTasks, HTTPException
-from fastapi.responses import JSONResponse
-from typing import List
+from fastapi import APIRouter, Request, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional, Tuple
 import logging
-from PIL import Image
-import io
 
-from api.models import ExtractionResponse, ErrorResponse
-from services.extraction import extract_patient_care_data
+from api.models import ErrorResponse, ExtractionResponse
+from api.responses import (
+    JSONBytesResponse,
+    build_batch_images_content,
+    build_error_content,
+    build_insufficient_images_content,
+    build_result_content,
+    decode_uploads,
+    get_error_status_code,
+    run_extraction
+)
+from api.uploads import UploadContent, UploadForm, UploadLimits, UploadRejected, read_upload_form, upload_request_body
+from services.context import ExtractionContext
+from services.extraction import stream_patient_care_data
+from services.cache import get_result_cache
+from services.jobs import check_callback_url, get_job_store, notify_job_workers
+from services.registry import get_registry
+from services.results import encode_row, get_result_store, record_result
+from services.scheduler import PRIORITY_BATCH
+from utils.errors import ErrorType
+from utils.logging import bind_request_id
+from utils import jsonlib
 
 # Create router
 router = APIRouter()
 logger = logging.getLogger("patient-care-api")
 
+IMAGE_FILES_DESCRIPTION = "Upload 2 images: front and back of the patient care form"
+
 def generate_request_id():
     """Generate unique request ID"""
     return str(uuid.uuid4())
 
+def _error_response(
+    request_id: str,
+    timestamp: str,
+    error_type: ErrorType,
+    message: str,
+    details: Optional[Dict] = None
+) -> JSONBytesResponse:
+    """
+    Build an error response in the shape of ErrorResponse
+    
+    Args:
+        request_id: Request ID
+        timestamp: Request timestamp
+        error_type: Type of error
+        message: Error message
+        details: Additional error details
+        
+    Returns:
+        JSONBytesResponse: Response with the status code of the error type
+    """
+    return JSONBytesResponse(
+        status_code=get_error_status_code(error_type),
+        content=build_error_content(request_id, timestamp, error_type, message, details)
+    )
+
+async def _read_form(
+    request: Request,
+    request_id: str,
+    timestamp: str,
+    file_fields: Dict[str, str],
+    limits: UploadLimits
+) -> Tuple[Optional[UploadForm], Optional[JSONBytesResponse]]:
+    """
+    Stream the multipart body of a request, turning a rejection into an error response
+    
+    Args:
+        request: Incoming request
+        request_id: Request ID
+        timestamp: Request timestamp
+        file_fields: Kind of file expected in each file field
+        limits: Size limits
+        
+    Returns:
+        Tuple containing:
+            - UploadForm: Parsed form, or None if it was rejected
+            - JSONBytesResponse: Error response, or None
+    """
+    try:
+        return await read_upload_form(request, file_fields, limits), None
+    except UploadRejected as e:
+        return None, JSONBytesResponse(
+            status_code=get_error_status_code(e.error_type),
+            content=build_error_content(request_id, timestamp, e.error_type, e.message, e.details)
+        )
+
 @router.post("/extract", 
          summary="Extract information from patient care form images",
-         description="Upload exactly 2 images (front and back of the patient care form) to extract information")
-async def extract_from_uploads(
-    background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(..., description="Upload 2 images: front and back of the patient care form")
-):
+         description="Upload exactly 2 images (front and back of the patient care form) to extract information",
+         responses={
+             200: {"model": ExtractionResponse},
+             400: {"model": ErrorResponse},
+             413: {"model": ErrorResponse}
+         },
+         openapi_extra=upload_request_body({"files": IMAGE_FILES_DESCRIPTION}))
+async def extract_from_uploads(request: Request, background_tasks: BackgroundTasks):
     """
     Extract information from uploaded patient care form images
     
+    The multipart body is streamed in with size and format checks, so
+    oversized or non-image uploads are refused before they are buffered.
+    
     Args:
+        request: Incoming request with the multipart body
         background_tasks: Background tasks manager
-        files: List of uploaded files
         
     Returns:
         ExtractionResponse or ErrorResponse
@@ -39,87 +125,525 @@ async def extract_from_uploads(
     request_id = generate_request_id()
     timestamp = datetime.now().isoformat()
     
+    context = ExtractionContext(request_id=request_id)
+    stage_start = time.perf_counter()
+    form, error_response = await _read_form(
+        request, request_id, timestamp, {"files": "image"}, UploadLimits.from_env(max_files=2)
+    )
+    if error_response is not None:
+        return error_response
+    context.record_timing("read", time.perf_counter() - stage_start)
+    
+    try:
+        uploads = form.uploads("files")
+        
+        # Check number of files
+        if len(uploads) != 2:
+            return JSONBytesResponse(
+                status_code=400,
+                content=build_insufficient_images_content(request_id, timestamp, len(uploads))
+            )
+        
+        status_code, content, headers = await run_extraction(uploads, request_id, timestamp, context)
+        return JSONBytesResponse(status_code=status_code, headers=headers, content=content)
+    finally:
+        form.close()
+
+@router.post("/extract/stream",
+         summary="Extract information with streamed partial results",
+         description=(
+             "Upload exactly 2 images (front and back). Returns Server-Sent Events: a 'section' event "
+             "for each form section as soon as the model has produced it, then a final 'result' "
+             "or 'error' event with the full validated response."
+         ),
+         openapi_extra=upload_request_body({"files": IMAGE_FILES_DESCRIPTION}))
+async def extract_stream(request: Request):
+    """
+    Extract information from uploaded images and stream sections as Server-Sent Events
+    
+    Args:
+        request: Incoming request with the multipart body
+        
+    Returns:
+        StreamingResponse or ErrorResponse
+    """
+    request_id = generate_request_id()
+    timestamp = datetime.now().isoformat()
+    
+    bind_request_id(request_id)
+    context = ExtractionContext(request_id=request_id)
+    stage_start = time.perf_counter()
+    form, error_response = await _read_form(
+        request, request_id, timestamp, {"files": "image"}, UploadLimits.from_env(max_files=2)
+    )
+    if error_response is not None:
+        return error_response
+    context.record_timing("read", time.perf_counter() - stage_start)
+    
+    uploads = form.uploads("files")
+    
     # Check number of files
-    if len(files) != 2:
-        return JSONResponse(
+    if len(uploads) != 2:
+        form.close()
+        return JSONBytesResponse(
             status_code=400,
-            content=ErrorResponse(
-                request_id=request_id,
-                timestamp=timestamp,
-                error={
-                    "type": "INSUFFICIENT_IMAGES",
-                    "message": f"Cần chính xác 2 hình ảnh, đã nhận {len(files)}",
-                    "details": {
-                        "received": len(files),
-                        "required": 2
-                    }
-                }
-            ).dict()
+            content=build_insufficient_images_content(request_id, timestamp, len(uploads))
         )
     
-    # Process files
+    stage_start = time.perf_counter()
+    images, error_content = await decode_uploads(uploads, request_id, timestamp)
+    context.record_timing("validate", time.perf_counter() - stage_start)
+    if error_content is not None:
+        form.close()
+        return JSONBytesResponse(status_code=400, content=error_content)
+    
+    return StreamingResponse(
+        _stream_events(images, request_id, timestamp, context, form),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Request-ID": request_id
+        }
+    )
+
+async def _stream_events(images, request_id: str, timestamp: str, context: ExtractionContext, form: UploadForm):
+    """
+    Turn streamed extraction output into Server-Sent Events
+    
+    Args:
+        images: Decoded uploads, front side first
+        request_id: Request ID
+        timestamp: Request timestamp
+        context: Per-request context
+        form: Uploaded form, released once the stream ends
+        
+    Yields:
+        bytes: Encoded SSE events
+    """
     try:
-        image_data = []
-        for file in files:
-            content = await file.read()
-            
-            # Validate image
-            try:
-                Image.open(io.BytesIO(content))
-                image_data.append(content)
-            except Exception as e:
-                return JSONResponse(
-                    status_code=400,
-                    content=ErrorResponse(
-                        request_id=request_id,
-                        timestamp=timestamp,
-                        error={
-                            "type": "INVALID_FILE_FORMAT",
-                            "message": f"File '{file.filename}' không phải là hình ảnh hợp lệ",
-                            "details": {
-                                "filename": file.filename,
-                                "error": str(e)
-                            }
-                        }
-                    ).dict()
+        yield _format_sse("start", {"request_id": request_id, "timestamp": timestamp})
+        
+        async for event, payload in stream_patient_care_data(images, request_id, context):
+            if event == "section":
+                yield _format_sse("section", payload)
+            else:
+                status_code, content, _ = build_result_content(request_id, timestamp, payload, context)
+                record_result(status_code, content, context)
+                yield _format_sse("result" if status_code == 200 else "error", {"status_code": status_code, **content})
+    finally:
+        form.close()
+
+def _format_sse(event: str, data: dict) -> bytes:
+    """
+    Encode one Server-Sent Event
+    
+    Args:
+        event: Event name
+        data: JSON payload
+        
+    Returns:
+        bytes: Encoded event
+    """
+    return b"event: " + event.encode("ascii") + b"\ndata: " + jsonlib.dumps(data) + b"\n\n"
+
+@router.post("/extract/batch",
+         summary="Extract information from many patient care forms",
+         description=(
+             "Upload front/back pairs either as consecutive files (pair i is files 2i and 2i+1) "
+             "or as a zip archive whose images, sorted by name, are paired the same way. "
+             "Results are streamed as NDJSON, one line per pair, in completion order."
+         ),
+         responses={
+             400: {"model": ErrorResponse},
+             413: {"model": ErrorResponse}
+         },
+         openapi_extra=upload_request_body({
+             "files": "Front/back images, pair by pair",
+             "archive": "Zip archive of front/back images"
+         }))
+async def extract_batch(request: Request):
+    """
+    Extract information from many front/back pairs with bounded concurrency
+    
+    Args:
+        request: Incoming request with the images in `files`, front then back
+            for each pair, or a zip archive in `archive`
+        
+    Returns:
+        StreamingResponse: NDJSON lines, one per pair
+    """
+    request_id = generate_request_id()
+    timestamp = datetime.now().isoformat()
+    
+    max_pairs = int(os.getenv("BATCH_MAX_PAIRS", "200"))
+    limits = UploadLimits.from_env(
+        max_files=2 * max_pairs,
+        max_request_bytes=int(os.getenv("BATCH_MAX_REQUEST_BYTES", str(512 * 1024 * 1024))),
+        max_pairs=max_pairs
+    )
+    form, error_response = await _read_form(
+        request, request_id, timestamp, {"files": "image", "archive": "zip"}, limits
+    )
+    if error_response is not None:
+        return error_response
+    
+    uploads, error_response = await _collect_batch_uploads(form, limits, request_id, timestamp)
+    if error_response is None and (not uploads or len(uploads) % 2 != 0):
+        # Every pair needs a front and a back image
+        error_response = JSONBytesResponse(
+            status_code=400,
+            content=build_batch_images_content(request_id, timestamp, len(uploads))
+        )
+    if error_response is not None:
+        form.close()
+        return error_response
+    
+    pairs = [uploads[i:i + 2] for i in range(0, len(uploads), 2)]
+    logger.info("[%s] Starting batch extraction of %d pairs", request_id, len(pairs))
+    return StreamingResponse(
+        _stream_batch(pairs, request_id, form),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-ID": request_id}
+    )
+
+async def _collect_batch_uploads(
+    form: UploadForm,
+    limits: UploadLimits,
+    request_id: str,
+    timestamp: str
+) -> Tuple[List[Tuple[Optional[str], UploadContent]], Optional[JSONBytesResponse]]:
+    """
+    Get the images of a batch from its files, or from its archive
+    
+    Args:
+        form: Uploaded form
+        limits: Size limits applied to archive members
+        request_id: Request ID
+        timestamp: Request timestamp
+        
+    Returns:
+        Tuple containing:
+            - List: (filename, content) of each image
+            - JSONBytesResponse: Error response for an unreadable archive, or None
+    """
+    archives = form.uploads("archive")
+    if not archives:
+        return form.uploads("files"), None
+    
+    filename, content = archives[0]
+    try:
+        return await asyncio.to_thread(_read_archive, content, limits), None
+    except UploadRejected as e:
+        error_type, message, details = e.error_type, e.message, e.details
+    except zipfile.BadZipFile as e:
+        error_type = ErrorType.INVALID_FILE_FORMAT
+        message = f"File '{filename}' không phải là file zip hợp lệ"
+        details = {"filename": filename, "error": str(e)}
+    return [], JSONBytesResponse(
+        status_code=get_error_status_code(error_type),
+        content=build_error_content(request_id, timestamp, error_type, message, details)
+    )
+
+async def _stream_batch(pairs: List[List[Tuple[Optional[str], UploadContent]]], batch_id: str, form: UploadForm):
+    """
+    Run every pair with bounded concurrency and yield results as they finish
+    
+    Args:
+        pairs: Uploads of each pair
+        batch_id: Request ID of the batch, for logging
+        form: Uploaded form, released once the stream ends
+        
+    Yields:
+        bytes: One NDJSON line per pair
+    """
+    semaphore = asyncio.Semaphore(int(os.getenv("BATCH_CONCURRENCY", "4")))
+    
+    async def run_pair(pair_index: int, uploads: List[Tuple[Optional[str], UploadContent]]) -> dict:
+        async with semaphore:
+            request_id = generate_request_id()
+            timestamp = datetime.now().isoformat()
+            context = ExtractionContext(request_id=request_id, priority=PRIORITY_BATCH)
+            status_code, content, _ = await run_extraction(uploads, request_id, timestamp, context)
+            return {
+                "pair_index": pair_index,
+                "filenames": [filename for filename, _ in uploads],
+                "status_code": status_code,
+                **content
+            }
+    
+    tasks = [asyncio.create_task(run_pair(i, pair)) for i, pair in enumerate(pairs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            yield jsonlib.dumps(line) + b"\n"
+        logger.info("[%s] Batch extraction completed", batch_id)
+    finally:
+        # Stop outstanding pairs if the client goes away
+        for task in tasks:
+            task.cancel()
+        form.close()
+
+def _read_archive(content: UploadContent, limits: UploadLimits) -> List[Tuple[str, bytes]]:
+    """
+    Read the images of a zip archive in name order
+    
+    Args:
+        content: Zip archive bytes, or a memory map of them
+        limits: Size limits applied to each member
+        
+    Returns:
+        List: (filename, content) of each image
+        
+    Raises:
+        UploadRejected: If there are too many members or one is too large
+    """
+    uploads = []
+    archive_file = io.BytesIO(content) if isinstance(content, bytes) else content
+    with zipfile.ZipFile(archive_file) as archive:
+        members = sorted(
+            (
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith("__MACOSX/")
+                and not os.path.basename(info.filename).startswith(".")
+            ),
+            key=lambda info: info.filename
+        )
+        if len(members) > limits.max_files:
+            raise limits.too_many_files()
+        for info in members:
+            # Check the declared size before inflating, and cap the read in case it lies
+            data = b""
+            if info.file_size <= limits.max_file_bytes:
+                with archive.open(info) as member:
+                    data = member.read(limits.max_file_bytes + 1)
+            if info.file_size > limits.max_file_bytes or len(data) > limits.max_file_bytes:
+                raise UploadRejected(
+                    ErrorType.PAYLOAD_TOO_LARGE,
+                    f"File '{info.filename}' vượt quá {limits.max_file_bytes} bytes",
+                    {"filename": info.filename, "max_bytes": limits.max_file_bytes}
                 )
+            uploads.append((info.filename, data))
+    return uploads
+
+@router.post("/jobs",
+         status_code=202,
+         summary="Submit an extraction job",
+         description="Store 2 images (front and back) for background extraction and return a job ID to poll",
+         openapi_extra=upload_request_body(
+             {"files": IMAGE_FILES_DESCRIPTION},
+             {"callback_url": "URL that receives a POST with the result when the job finishes"}
+         ),
+         responses={
+             400: {"model": ErrorResponse},
+             413: {"model": ErrorResponse}
+         })
+async def submit_job(request: Request):
+    """
+    Queue an extraction job
+    
+    Args:
+        request: Incoming request with the images in `files` and an optional
+            `callback_url` notified on completion
         
-        # Extract data
-        result = await extract_patient_care_data(image_data, request_id)
-        
-        # Format response
-        if "error" in result and result["error"]:
-            return JSONResponse(
-                status_code=400 if result["error_type"] in ["INSUFFICIENT_IMAGES", "INVALID_IMAGES", "INCONSISTENT_INFORMATION", "IMAGE_QUALITY_ISSUE", "DUPLICATE_IMAGES"] else 500,
-                content=ErrorResponse(
-                    request_id=request_id,
-                    timestamp=timestamp,
-                    error={
-                        "type": result["error_type"],
-                        "message": result["message"],
-                        "details": result.get("error_details", {})
-                    }
-                ).dict()
+    Returns:
+        Dict: Job ID and status URL
+    """
+    request_id = generate_request_id()
+    timestamp = datetime.now().isoformat()
+    
+    form, error_response = await _read_form(
+        request, request_id, timestamp, {"files": "image"}, UploadLimits.from_env(max_files=2)
+    )
+    if error_response is not None:
+        return error_response
+    
+    try:
+        uploads = form.uploads("files")
+        callback_url = form.fields.get("callback_url") or None
+        
+        # Check number of files
+        if len(uploads) != 2:
+            return JSONBytesResponse(
+                status_code=400,
+                content=build_insufficient_images_content(request_id, timestamp, len(uploads))
             )
-        else:
-            return ExtractionResponse(
-                request_id=request_id,
-                timestamp=timestamp,
-                status="success",
-                data=result
+        
+        if callback_url:
+            try:
+                # Resolving the host can block, so it runs in a thread
+                await asyncio.to_thread(check_callback_url, callback_url)
+            except ValueError as e:
+                return _error_response(
+                    request_id, timestamp, ErrorType.INVALID_REQUEST, str(e), {"callback_url": callback_url}
+                )
+        
+        job_id = await asyncio.to_thread(get_job_store().create, uploads, callback_url)
+    finally:
+        form.close()
+    notify_job_workers()
+    logger.info("[%s] Job queued", job_id)
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": str(request.url_for("get_job", job_id=job_id))
+    }
+
+@router.get("/jobs/{job_id}",
+         summary="Get the status and result of an extraction job",
+         responses={404: {"model": ErrorResponse}})
+async def get_job(job_id: str):
+    """
+    Get job status and, once finished, its result
+    
+    Args:
+        job_id: Job ID returned on submission
+        
+    Returns:
+        Dict: Job status, result body and status code of the extraction
+    """
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        return _error_response(
+            generate_request_id(), datetime.now().isoformat(), ErrorType.NOT_FOUND,
+            f"Job {job_id} not found", {"job_id": job_id}
+        )
+    return job
+
+@router.get("/results",
+         summary="List stored extraction results",
+         description=(
+             "Newest first. Filter by the SHA-256 of either image or the result cache key, and by a "
+             "creation time range. Pass next_cursor from a response to get the following page."
+         ),
+         responses={
+             400: {"model": ErrorResponse},
+             404: {"model": ErrorResponse}
+         })
+async def list_results(
+    content_hash: Optional[str] = Query(None, description="SHA-256 of either image, or the result cache key"),
+    since: Optional[datetime] = Query(None, description="Earliest creation time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Creation time to stop before (ISO 8601)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page")
+):
+    """
+    List stored extraction results, streamed as they are read
+    
+    Args:
+        content_hash: SHA-256 of either image, or the result cache key
+        since: Earliest creation time
+        until: Creation time to stop before
+        limit: Maximum number of results
+        cursor: next_cursor of the previous page
+        
+    Returns:
+        StreamingResponse: {"items": [...], "next_cursor": ...}
+    """
+    store = get_result_store()
+    if store is None:
+        return _error_response(
+            generate_request_id(), datetime.now().isoformat(), ErrorType.NOT_FOUND, "The result store is disabled"
+        )
+    
+    start_cursor = None
+    if cursor:
+        try:
+            created_at, seq = cursor.split(":")
+            start_cursor = (float(created_at), int(seq))
+        except ValueError:
+            return _error_response(
+                generate_request_id(), datetime.now().isoformat(), ErrorType.INVALID_REQUEST,
+                "Invalid cursor", {"cursor": cursor}
             )
+    
+    filters = {
+        "content_hash": content_hash,
+        "since": since.timestamp() if since else None,
+        "until": until.timestamp() if until else None
+    }
+    return StreamingResponse(_stream_results(store, filters, start_cursor, limit), media_type="application/json")
+
+async def _stream_results(store, filters: dict, cursor: Optional[Tuple[float, int]], limit: int):
+    """
+    Read results page by page and yield them as one JSON document
+    
+    Args:
+        store: Result store
+        filters: Filters accepted by ResultStore.page
+        cursor: (created_at, seq) to start after
+        limit: Maximum number of results
         
-    except Exception as e:
-        logger.error(f"[{request_id}] Lỗi khi xử lý request: {str(e)}", exc_info=True)
-        return JSONResponse(
-            status_code=500,
-            content=ErrorResponse(
-                request_id=request_id,
-                timestamp=timestamp,
-                error={
-                    "type": "PROCESSING_ERROR",
-                    "message": f"Lỗi khi xử lý request: {str(e)}",
-                    "details": {}
-                }
-            ).dict()
-        )
\ No newline at end of file
+    Yields:
+        bytes: Parts of the JSON body
+    """
+    page_size = int(os.getenv("RESULT_STORE_PAGE_SIZE", "200"))
+    remaining = limit
+    separator = b""
+    yield b'{"items":['
+    while remaining > 0:
+        rows = await asyncio.to_thread(store.page, cursor=cursor, limit=min(page_size, remaining), **filters)
+        if not rows:
+            break
+        yield separator + b",".join(encode_row(row) for row in rows)
+        separator = b","
+        remaining -= len(rows)
+        cursor = (rows[-1]["created_at"], rows[-1]["seq"])
+    
+    # A full page may have more results after it
+    next_cursor = f"{cursor[0]!r}:{cursor[1]}" if remaining == 0 and cursor is not None else None
+    yield b'],"next_cursor":' + jsonlib.dumps(next_cursor) + b"}"
+
+@router.get("/results/{request_id}",
+         summary="Get the stored result of a request or job",
+         responses={404: {"model": ErrorResponse}})
+async def get_result(request_id: str):
+    """
+    Get the stored result of a request, with its hashes, versions and stage timings
+    
+    Args:
+        request_id: Request or job ID
+        
+    Returns:
+        Dict: Newest stored result, plus earlier ones if the request ran more than once
+    """
+    store = get_result_store()
+    if store is None:
+        return _error_response(
+            generate_request_id(), datetime.now().isoformat(), ErrorType.NOT_FOUND, "The result store is disabled"
+        )
+    
+    results = await asyncio.to_thread(store.by_request_id, request_id)
+    if not results:
+        return _error_response(
+            generate_request_id(), datetime.now().isoformat(), ErrorType.NOT_FOUND,
+            f"No stored result for request {request_id}", {"request_id": request_id}
+        )
+    return {**results[0], "previous": results[1:]}
+
+@router.get("/cache/stats",
+         summary="Get extraction result cache counters")
+async def get_cache_stats():
+    """
+    Get hit, miss and eviction counters of the extraction result cache
+    
+    Returns:
+        Dict: Cache counters
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.get("/prompts",
+         summary="Get the active prompt versions and model clients")
+async def get_prompts():
+    """
+    Get the hash and version of each active prompt
+    
+    Returns:
+        Dict: Prompt versions and model names
+    """
+    return get_registry().describe()
@@ -0,0 +1,464 @@
+# api/uploads.py
+import io
+import os
+import mmap
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import Request
+from PIL import Image
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+
+from utils.errors import ErrorType
+
+logger = logging.getLogger("patient-care-api")
+
+# Leading bytes of the image formats accepted for extraction
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF")
+]
+ZIP_SIGNATURES = [b"PK\x03\x04", b"PK\x05\x06"]
+
+# Bytes needed to tell the format apart; WebP needs "RIFF....WEBP"
+SIGNATURE_BYTES = 12
+
+# Header sizes at which the dimensions are probed, and the most kept for it
+SNIFF_CHECKPOINTS = (1024, 8192, 65536)
+
+# Largest accepted value of a plain (non-file) form field
+MAX_FIELD_BYTES = 64 * 1024
+
+# Memory-mapped or in-memory content of one upload
+UploadContent = Union[bytes, mmap.mmap]
+
+class UploadRejected(Exception):
+    """An upload refused while it was streaming in"""
+
+    def __init__(self, error_type: str, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.message = message
+        self.details = details or {}
+
+@dataclass
+class UploadLimits:
+    """Size limits applied while a multipart body streams in"""
+    max_file_bytes: int
+    max_request_bytes: int
+    max_files: int
+    max_pixels: int
+    spool_threshold: int
+    max_pairs: Optional[int] = None
+
+    @classmethod
+    def from_env(
+        cls,
+        max_files: int,
+        max_request_bytes: Optional[int] = None,
+        max_pairs: Optional[int] = None
+    ) -> "UploadLimits":
+        """
+        Load limits from environment variables
+
+        Args:
+            max_files: Number of file parts accepted
+            max_request_bytes: Body size limit overriding UPLOAD_MAX_REQUEST_BYTES
+            max_pairs: Front/back pairs accepted, for batches; reported instead of `max_files`
+
+        Returns:
+            UploadLimits: Limits for one request
+        """
+        if max_request_bytes is None:
+            max_request_bytes = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(40 * 1024 * 1024)))
+        return cls(
+            max_file_bytes=int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(20 * 1024 * 1024))),
+            max_request_bytes=max_request_bytes,
+            max_files=max_files,
+            max_pixels=int(os.getenv("UPLOAD_MAX_PIXELS", "50000000")),
+            spool_threshold=int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024))),
+            max_pairs=max_pairs
+        )
+
+    def too_many_files(self) -> UploadRejected:
+        """
+        Build the rejection for a request with more files than `max_files`
+
+        Returns:
+            UploadRejected: Error stated in pairs for batches, in files otherwise
+        """
+        if self.max_pairs is not None:
+            return UploadRejected(
+                ErrorType.PAYLOAD_TOO_LARGE,
+                f"Mỗi lô chỉ nhận tối đa {self.max_pairs} cặp ảnh",
+                {"max_pairs": self.max_pairs, "max_files": self.max_files}
+            )
+        return UploadRejected(
+            ErrorType.PAYLOAD_TOO_LARGE,
+            f"Chỉ nhận tối đa {self.max_files} file",
+            {"max_files": self.max_files}
+        )
+
+class SpooledUpload:
+    """
+    One file part, kept in memory up to the spool threshold and in an
+    anonymous temporary file beyond it
+
+    Spooled files are memory-mapped when read, so decoding works on the
+    page cache instead of a second copy of the upload.
+    """
+
+    def __init__(self, field_name: str, filename: Optional[str], kind: str, limits: UploadLimits):
+        self.field_name = field_name
+        self.filename = filename
+        self.kind = kind
+        self.limits = limits
+        self.size = 0
+        self.format: Optional[str] = None
+        self.dimensions: Optional[Tuple[int, int]] = None
+        self._head = bytearray()
+        self._sniffed = False
+        self._buffer: Optional[bytearray] = bytearray()
+        self._file = None
+        self._view: Optional[mmap.mmap] = None
+
+    @property
+    def spooled(self) -> bool:
+        """True if the content was moved to a temporary file"""
+        return self._file is not None
+
+    def write(self, data: bytes):
+        """
+        Append a chunk of the part, checking the size limit and the header
+
+        Args:
+            data: Next chunk of the part body
+
+        Raises:
+            UploadRejected: If the file is too large or is not of the expected kind
+        """
+        self.size += len(data)
+        max_bytes = self.limits.max_file_bytes if self.kind == "image" else self.limits.max_request_bytes
+        if self.size > max_bytes:
+            raise UploadRejected(
+                ErrorType.PAYLOAD_TOO_LARGE,
+                f"File '{self.filename}' vượt quá {max_bytes} bytes",
+                {"filename": self.filename, "max_bytes": max_bytes}
+            )
+
+        if not self._sniffed:
+            self._sniff(data)
+
+        if self._buffer is not None:
+            self._buffer += data
+            if len(self._buffer) > self.limits.spool_threshold:
+                self._file = tempfile.TemporaryFile(dir=os.getenv("UPLOAD_SPOOL_DIR") or None)
+                self._file.write(self._buffer)
+                self._buffer = None
+        else:
+            self._file.write(data)
+
+    def finish(self):
+        """
+        Run the last header checks once the part is complete
+
+        Raises:
+            UploadRejected: If the file is empty or is not of the expected kind
+        """
+        if not self._sniffed:
+            self._sniff(b"", final=True)
+        self._head = bytearray()
+        if self._file is not None:
+            self._file.flush()
+
+    def content(self) -> UploadContent:
+        """
+        Get the upload content
+
+        Returns:
+            bytes or mmap: The bytes for small uploads, a read-only memory map for spooled ones
+        """
+        if self._file is None:
+            return bytes(self._buffer)
+        if self._view is None:
+            self._view = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._view
+
+    def close(self):
+        """Unmap and delete the spooled content"""
+        if self._view is not None:
+            try:
+                self._view.close()
+            except BufferError:
+                # Still referenced by a live buffer; released with it
+                pass
+            self._view = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = None
+
+    def _sniff(self, data: bytes, final: bool = False):
+        """Check the signature and, for images, the dimensions from the leading bytes"""
+        previous = len(self._head)
+        self._head += data[:SNIFF_CHECKPOINTS[-1] - previous]
+        head = bytes(self._head)
+
+        if self.format is None:
+            if len(head) < SIGNATURE_BYTES and not final:
+                return
+            self.format = _match_signature(head, self.kind)
+            if self.format is None:
+                self._sniffed = True
+                expected = "hình ảnh" if self.kind == "image" else "file zip"
+                raise UploadRejected(
+                    ErrorType.INVALID_FILE_FORMAT,
+                    f"File '{self.filename}' không phải là {expected} hợp lệ",
+                    {"filename": self.filename, "error": "unrecognized file signature"}
+                )
+            if self.kind != "image":
+                self._sniffed = True
+                return
+
+        # Probe the dimensions only when the header crosses a checkpoint
+        if not final and not any(previous < size <= len(head) for size in SNIFF_CHECKPOINTS):
+            return
+
+        try:
+            with Image.open(io.BytesIO(head)) as image:
+                self.dimensions = image.size
+        except Exception:
+            if final or len(head) >= SNIFF_CHECKPOINTS[-1]:
+                # Left to the full decode, which reports the actual error
+                self._sniffed = True
+            return
+
+        self._sniffed = True
+        width, height = self.dimensions
+        if width * height > self.limits.max_pixels:
+            raise UploadRejected(
+                ErrorType.PAYLOAD_TOO_LARGE,
+                f"Hình ảnh '{self.filename}' có kích thước {width}x{height} vượt quá {self.limits.max_pixels} điểm ảnh",
+                {"filename": self.filename, "width": width, "height": height, "max_pixels": self.limits.max_pixels}
+            )
+
+def _match_signature(head: bytes, kind: str) -> Optional[str]:
+    """Get the format named by the leading bytes, or None if it is not of the expected kind"""
+    if kind == "zip":
+        return "ZIP" if any(head.startswith(signature) for signature in ZIP_SIGNATURES) else None
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, name in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return name
+    return None
+
+@dataclass
+class UploadForm:
+    """Parsed multipart body: file parts by field name and plain fields"""
+    files: Dict[str, List[SpooledUpload]] = field(default_factory=dict)
+    fields: Dict[str, str] = field(default_factory=dict)
+    received_bytes: int = 0
+
+    def uploads(self, field_name: str) -> List[Tuple[Optional[str], UploadContent]]:
+        """
+        Get the (filename, content) pairs of a file field
+
+        Args:
+            field_name: Form field name
+
+        Returns:
+            List: (filename, content) of each file, in upload order
+        """
+        return [(upload.filename, upload.content()) for upload in self.files.get(field_name, [])]
+
+    def close(self):
+        """Release every spooled file"""
+        for uploads in self.files.values():
+            for upload in uploads:
+                upload.close()
+
+class _MultipartReader:
+    """Callbacks feeding a streaming multipart parser into spooled uploads"""
+
+    def __init__(self, form: UploadForm, file_fields: Dict[str, str], limits: UploadLimits):
+        self.form = form
+        self.file_fields = file_fields
+        self.limits = limits
+        self.file_count = 0
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers: Dict[bytes, bytes] = {}
+        self._upload: Optional[SpooledUpload] = None
+        self._field_name: Optional[str] = None
+        self._field_value: Optional[bytearray] = None
+
+    def callbacks(self) -> Dict[str, Any]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._upload = None
+        self._field_name = None
+        self._field_value = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+
+        if filename is None:
+            self._field_name = name
+            self._field_value = bytearray()
+            return
+
+        kind = self.file_fields.get(name)
+        if kind is None:
+            raise UploadRejected(
+                ErrorType.INVALID_FILE_FORMAT,
+                f"Trường '{name}' không nhận file",
+                {"field": name}
+            )
+
+        self.file_count += 1
+        if self.file_count > self.limits.max_files:
+            raise self.limits.too_many_files()
+
+        self._upload = SpooledUpload(name, filename.decode("utf-8", "replace"), kind, self.limits)
+        self.form.files.setdefault(name, []).append(self._upload)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._upload is not None:
+            self._upload.write(data[start:end])
+        elif self._field_value is not None:
+            self._field_value += data[start:end]
+            if len(self._field_value) > MAX_FIELD_BYTES:
+                raise UploadRejected(
+                    ErrorType.PAYLOAD_TOO_LARGE,
+                    f"Trường '{self._field_name}' vượt quá {MAX_FIELD_BYTES} bytes",
+                    {"field": self._field_name, "max_bytes": MAX_FIELD_BYTES}
+                )
+
+    def on_part_end(self):
+        if self._upload is not None:
+            self._upload.finish()
+        elif self._field_value is not None:
+            self.form.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+        self._upload = None
+        self._field_value = None
+
+async def read_upload_form(request: Request, file_fields: Dict[str, str], limits: UploadLimits) -> UploadForm:
+    """
+    Stream a multipart body into spooled uploads, enforcing limits as it arrives
+
+    Nothing is buffered past the first chunk that breaks a limit: oversized
+    bodies are refused from Content-Length before reading, oversized files
+    and non-images as soon as their bytes arrive.
+
+    Args:
+        request: Incoming request
+        file_fields: Kind of file expected in each file field, "image" or "zip"
+        limits: Size limits
+
+    Returns:
+        UploadForm: Parsed form; the caller must close it once the content is no longer needed
+
+    Raises:
+        UploadRejected: If a limit is exceeded or the body is not an acceptable form
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(
+            ErrorType.INVALID_FILE_FORMAT,
+            "Yêu cầu phải có dạng multipart/form-data",
+            {"content_type": request.headers.get("content-type")}
+        )
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limits.max_request_bytes:
+        raise UploadRejected(
+            ErrorType.PAYLOAD_TOO_LARGE,
+            f"Dung lượng yêu cầu vượt quá {limits.max_request_bytes} bytes",
+            {"content_length": int(content_length), "max_bytes": limits.max_request_bytes}
+        )
+
+    form = UploadForm()
+    reader = _MultipartReader(form, file_fields, limits)
+    parser = MultipartParser(boundary, reader.callbacks())
+    try:
+        async for chunk in request.stream():
+            form.received_bytes += len(chunk)
+            if form.received_bytes > limits.max_request_bytes:
+                raise UploadRejected(
+                    ErrorType.PAYLOAD_TOO_LARGE,
+                    f"Dung lượng yêu cầu vượt quá {limits.max_request_bytes} bytes",
+                    {"max_bytes": limits.max_request_bytes}
+                )
+            parser.write(chunk)
+        parser.finalize()
+    except UploadRejected as e:
+        form.close()
+        logger.warning("Upload rejected after %d bytes: %s", form.received_bytes, e.message)
+        raise
+    except Exception as e:
+        form.close()
+        raise UploadRejected(
+            ErrorType.INVALID_FILE_FORMAT,
+            "Không đọc được dữ liệu multipart",
+            {"error": str(e)}
+        ) from e
+
+    return form
+
+def upload_request_body(file_fields: Dict[str, str], text_fields: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Describe a streamed multipart body for the OpenAPI schema, since the
+    route reads the body itself instead of declaring File parameters
+
+    Args:
+        file_fields: Description of each file field
+        text_fields: Description of each plain field
+
+    Returns:
+        Dict: Value for the route's openapi_extra
+    """
+    properties = {
+        name: {"type": "array", "items": {"type": "string", "format": "binary"}, "description": description}
+        for name, description in file_fields.items()
+    }
+    for name, description in (text_fields or {}).items():
+        properties[name] = {"type": "string", "description": description}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"multipart/form-data": {"schema": {"type": "object", "properties": properties}}}
+        }
+    }
@@ -0,0 +1,97 @@
+# benchmarks/enhancement.py
+"""
+Micro-benchmark for the contrast + sharpness enhancement step
+
+Compares the Pillow ImageEnhance chain with the fused NumPy kernel on
+synthetic form-like scans (12 MP by default), in RGB and grayscale, and
+reports the largest per-pixel difference between the two. With
+--pipeline, the whole preprocessing (rotate, downscale, enhance, encode)
+is timed with each kernel as well.
+
+    python benchmarks/enhancement.py --width 4000 --height 3000 --repeat 5 --pipeline
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import warnings
+from dataclasses import replace
+
+warnings.filterwarnings("ignore")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from services.preprocessing import PreprocessProfile, enhance_contrast_sharpness, render_payload
+
+def build_scan(width: int, height: int) -> Image.Image:
+    """
+    Build a page that looks like a photographed form: ruled lines and text
+    blocks on an uneven grey background with sensor noise
+    """
+    page = Image.new("L", (width, height), 200)
+    draw = ImageDraw.Draw(page)
+    for y in range(height // 20, height, height // 20):
+        draw.line((width // 20, y, width - width // 20, y), fill=40, width=max(1, height // 1000))
+        for x in range(width // 10, width - width // 10, width // 8):
+            draw.rectangle((x, y - height // 60, x + width // 12, y - height // 200), fill=70)
+    gradient = np.linspace(-30, 30, width, dtype=np.float32)[None, :]
+    noise = np.asarray(Image.effect_noise((width, height), 12), dtype=np.float32) - 128
+    pixels = np.clip(np.asarray(page, dtype=np.float32) + gradient + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, "L").convert("RGB")
+
+def pillow_chain(img: Image.Image, contrast: float, sharpness: float) -> Image.Image:
+    """The enhancement chain the fused kernel replaces"""
+    img = ImageEnhance.Contrast(img).enhance(contrast)
+    return ImageEnhance.Sharpness(img).enhance(sharpness)
+
+def measure(fn, repeat: int) -> float:
+    """Median wall time of fn in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start_time)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4000, help="Image width in pixels")
+    parser.add_argument("--height", type=int, default=3000, help="Image height in pixels")
+    parser.add_argument("--contrast", type=float, default=1.2, help="Contrast factor")
+    parser.add_argument("--sharpness", type=float, default=1.3, help="Sharpness factor")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+    parser.add_argument("--pipeline", action="store_true", help="Also time the whole preprocessing step")
+    args = parser.parse_args()
+
+    scan = build_scan(args.width, args.height)
+    megapixels = args.width * args.height / 1e6
+    print(f"Input: {args.width}x{args.height} ({megapixels:.1f} MP)")
+    print(f"{'mode':>5} {'pillow ms':>10} {'fused ms':>9} {'speedup':>8} {'max diff':>9} {'mean diff':>10}")
+
+    for mode in ("RGB", "L"):
+        img = scan.convert(mode)
+        expected = np.asarray(pillow_chain(img, args.contrast, args.sharpness), dtype=np.int16)
+        actual = np.asarray(enhance_contrast_sharpness(img, args.contrast, args.sharpness), dtype=np.int16)
+        difference = np.abs(expected - actual)
+
+        pillow_ms = measure(lambda: pillow_chain(img, args.contrast, args.sharpness), args.repeat)
+        fused_ms = measure(lambda: enhance_contrast_sharpness(img, args.contrast, args.sharpness), args.repeat)
+        print(
+            f"{mode:>5} {pillow_ms:>10.1f} {fused_ms:>9.1f} {pillow_ms / fused_ms:>7.2f}x "
+            f"{int(difference.max()):>9} {float(difference.mean()):>10.3f}"
+        )
+
+    if args.pipeline:
+        print("\nWhole preprocessing step (default profile)")
+        base = PreprocessProfile(contrast=args.contrast, sharpness=args.sharpness)
+        for kernel in ("pillow", "numpy"):
+            profile = replace(base, enhance_kernel=kernel)
+            elapsed = measure(lambda: render_payload(scan, profile), args.repeat)
+            data, quality, size = render_payload(scan, profile)
+            print(f"{kernel:>7}: {elapsed:8.1f} ms -> {size[0]}x{size[1]}, {len(data)} bytes at quality {quality}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/json_parsing.py
+"""
+Micro-benchmark for model-output parsing and response serialization
+
+Compares, on synthetic extraction outputs of increasing size:
+
+- parse: the previous regex extraction + json.loads against the single-pass
+  scanner + utils.jsonlib (orjson when installed)
+- serialize: pydantic model + .dict() + JSONResponse against a plain dict
+  rendered by JSONBytesResponse
+
+    python benchmarks/json_parsing.py --sizes 10,100,1000 --repeat 200
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import warnings
+
+warnings.filterwarnings("ignore")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+
+from api.models import ExtractionResponse
+from api.responses import JSONBytesResponse
+from services.gemini import parse_response_text
+from utils import jsonlib
+
+def legacy_extract_json_from_text(text: str) -> str:
+    """The regex-based extraction this benchmark compares against"""
+    json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text, re.DOTALL)
+    if json_match:
+        return json_match.group(1).strip()
+    clean_text = re.sub(r'^```|```$', '', text.strip())
+    json_obj_match = re.search(r'(\{[\s\S]*\})', clean_text, re.DOTALL)
+    if json_obj_match:
+        return json_obj_match.group(1).strip()
+    return clean_text.strip()
+
+def legacy_parse(text: str):
+    return json.loads(legacy_extract_json_from_text(text))
+
+def build_output(sections: int) -> str:
+    """
+    Build a model output shaped like an extraction: a fenced JSON document
+    with Vietnamese field values, checkbox groups and confidence scores,
+    followed by a line of prose
+    """
+    form = {}
+    scores = {}
+    for index in range(sections):
+        form[f"{index}_muc_cham_soc"] = {
+            "ghi_chu": "Bệnh nhân tỉnh, tiếp xúc tốt, ăn uống được {không} sốt",
+            "ngay_thuc_hien": "12/03/2024",
+            "lua_chon": {"co": index % 2 == 0, "khong": index % 2 == 1},
+            "chi_so": [index, index * 1.5, None]
+        }
+        scores[f"{index}_muc_cham_soc"] = 80 + index % 20
+    document = {"phieu_cham_soc": form, "confidence_scores": scores}
+    return "```json\n" + json.dumps(document, ensure_ascii=False, indent=2) + "\n```\nĐã trích xuất xong."
+
+def measure(fn, repeat: int) -> float:
+    """Median wall time of fn in microseconds"""
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start_time)
+    return statistics.median(samples) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated numbers of form sections")
+    parser.add_argument("--repeat", type=int, default=200, help="Runs per measurement")
+    args = parser.parse_args()
+
+    print(f"JSON library: {jsonlib.JSON_LIBRARY}")
+    print(f"{'sections':>8} {'bytes':>9} {'parse old us':>13} {'parse new us':>13} {'dump old us':>12} {'dump new us':>12}")
+    for sections in (int(size) for size in args.sizes.split(",")):
+        text = build_output(sections)
+        result, error = parse_response_text(text, "benchmark")
+        assert error is None and result == legacy_parse(text)
+
+        def old_dump():
+            content = ExtractionResponse(
+                request_id="benchmark", timestamp="2024-03-12T00:00:00", status="success", data=result
+            ).dict()
+            JSONResponse(content=content)
+
+        def new_dump():
+            content = {
+                "request_id": "benchmark", "timestamp": "2024-03-12T00:00:00", "status": "success",
+                "data": result, "cached": False, "near_duplicate_of": None
+            }
+            JSONBytesResponse(content=content)
+
+        print(
+            f"{sections:>8} {len(text.encode('utf-8')):>9} "
+            f"{measure(lambda: legacy_parse(text), args.repeat):>13.1f} "
+            f"{measure(lambda: parse_response_text(text, 'benchmark'), args.repeat):>13.1f} "
+            f"{measure(old_dump, args.repeat):>12.1f} "
+            f"{measure(new_dump, args.repeat):>12.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
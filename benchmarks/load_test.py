@@ -0,0 +1,207 @@
+# benchmarks/load_test.py
+"""
+Load test for /api/v1/extract
+
+Drives the extraction endpoint with front/back image pairs at fixed
+concurrency levels and reports throughput, p50/p95/p99 latency, status
+codes and the mean time of each pipeline stage (from the Server-Timing
+header).
+
+Against a running server:
+
+    EXTRACTION_BACKEND=fake uvicorn main:app --port 8000
+    python benchmarks/load_test.py --url http://localhost:8000 --corpus samples/ --concurrency 1,4,16
+
+In-process, with the fake backend and synthetic images (no server, no API key):
+
+    python benchmarks/load_test.py --in-process --concurrency 1,4,16 --requests 200
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+
+Pair = List[Tuple[str, bytes]]
+
+def load_corpus(corpus_dir: str) -> List[Pair]:
+    """
+    Load image pairs from a directory; images sorted by name are paired in order
+
+    Args:
+        corpus_dir: Directory of sample images
+
+    Returns:
+        List: (filename, content) pairs, front side first
+    """
+    names = sorted(name for name in os.listdir(corpus_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if len(names) < 2:
+        raise SystemExit(f"Need at least two images in {corpus_dir}")
+
+    images = []
+    for name in names[:len(names) - len(names) % 2]:
+        with open(os.path.join(corpus_dir, name), "rb") as f:
+            images.append((name, f.read()))
+    return [images[i:i + 2] for i in range(0, len(images), 2)]
+
+def synthetic_corpus(pairs: int, size: Tuple[int, int]) -> List[Pair]:
+    """
+    Generate distinct noise-image pairs so duplicate detection and caching do not short-circuit requests
+
+    Args:
+        pairs: Number of pairs
+        size: Image size in pixels
+
+    Returns:
+        List: (filename, content) pairs, front side first
+    """
+    from PIL import Image
+
+    corpus = []
+    for index in range(pairs):
+        pair = []
+        for side in ("front", "back"):
+            buffer = io.BytesIO()
+            Image.effect_noise(size, 40 + index % 50).convert("RGB").save(buffer, "JPEG", quality=85)
+            pair.append((f"{index:04d}_{side}.jpg", buffer.getvalue()))
+        corpus.append(pair)
+    return corpus
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parse a Server-Timing header into stage durations
+
+    Args:
+        header: Header value, e.g. "decode;dur=3.1, upstream;dur=1520.4"
+
+    Returns:
+        Dict: Milliseconds per stage
+    """
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                timings[name] = float(value)
+    return timings
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+async def run_level(client: httpx.AsyncClient, corpus: List[Pair], concurrency: int, requests: int) -> Dict:
+    """
+    Send `requests` extractions with `concurrency` requests in flight
+
+    Args:
+        client: HTTP client
+        corpus: Image pairs, used in turn
+        concurrency: Requests in flight
+        requests: Total requests
+
+    Returns:
+        Dict: Summary of the level
+    """
+    latencies = []
+    statuses = Counter()
+    stages = defaultdict(list)
+    counter = iter(range(requests))
+
+    async def worker():
+        for index in counter:
+            pair = corpus[index % len(corpus)]
+            files = [("files", (name, content, "application/octet-stream")) for name, content in pair]
+            start_time = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/extract", files=files)
+                statuses[response.status_code] += 1
+                for stage, duration in parse_server_timing(response.headers.get("server-timing")).items():
+                    stages[stage].append(duration)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "stages_mean_ms": {stage: round(statistics.fmean(values), 1) for stage, values in stages.items()}
+    }
+
+def build_client(args) -> httpx.AsyncClient:
+    """Client for a running server, or for the app loaded in this process"""
+    timeout = httpx.Timeout(args.timeout)
+    if not args.in_process:
+        return httpx.AsyncClient(base_url=args.url, timeout=timeout)
+
+    os.environ.setdefault("EXTRACTION_BACKEND", "fake")
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+    os.environ.setdefault("NEAR_DUPLICATE_MODE", "off")
+    from api.config import initialize_app
+
+    app = initialize_app()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=timeout)
+
+def print_report(results: List[Dict]):
+    """Print one row per concurrency level"""
+    print(f"{'conc':>5} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses / stage means (ms)")
+    for result in results:
+        print(
+            f"{result['concurrency']:>5} {result['requests']:>6} {result['throughput_rps']:>8.2f} "
+            f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}  "
+            f"{result['statuses']} {result['stages_mean_ms']}"
+        )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of a running server")
+    parser.add_argument("--in-process", action="store_true", help="Load the app in this process (fake backend by default)")
+    parser.add_argument("--corpus", help="Directory of sample images; synthetic images are used if omitted")
+    parser.add_argument("--pairs", type=int, default=50, help="Number of synthetic pairs")
+    parser.add_argument("--image-size", default="1600x2200", help="Size of synthetic images, WxH")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        width, height = (int(value) for value in args.image_size.lower().split("x"))
+        corpus = synthetic_corpus(args.pairs, (width, height))
+
+    results = []
+    async with build_client(args) as client:
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            results.append(await run_level(client, corpus, concurrency, args.requests))
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"corpus_pairs": len(corpus), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,7 @@
 # main.py
+import time
+import_start = time.perf_counter()
+
 import uvicorn
 from dotenv import load_dotenv
 from api.config import initialize_app
@@ -6,8 +9,8 @@ from api.config import initialize_app
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize FastAPI app
-app = initialize_app()
+# Initialize FastAPI app, logging the import time to catch cold-start regressions
+app = initialize_app(import_seconds=time.perf_counter() - import_start)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
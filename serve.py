@@ -0,0 +1,70 @@
+# serve.py
+import os
+import shutil
+import logging
+import importlib.util
+
+import uvicorn
+from dotenv import load_dotenv
+
+logger = logging.getLogger("patient-care-api")
+
+def _pick(preferred: str, fallback: str) -> str:
+    """Use an optional accelerated implementation when it is installed"""
+    return preferred if importlib.util.find_spec(preferred) else fallback
+
+def _reset_path(path: str, is_dir: bool = False):
+    """Remove state left by a previous run; no worker is running yet"""
+    if is_dir:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        return
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+def main():
+    """
+    Run the API in production: pre-forked workers without auto-reload
+
+    With more than one worker, per-process state moves to shared stores so
+    limits and cache hits hold across workers: the upstream limiter and
+    circuit breaker use the SQLite file at SHARED_STATE_PATH, the result
+    cache uses its disk tier, and metrics are merged from
+    PROMETHEUS_MULTIPROC_DIR. On SIGTERM every worker stops accepting
+    connections and drains in-flight requests for up to
+    GRACEFUL_SHUTDOWN_TIMEOUT seconds before shutting down.
+    """
+    load_dotenv()
+    workers = int(os.getenv("WEB_WORKERS") or os.cpu_count() or 1)
+
+    if workers > 1:
+        os.environ["SHARED_STATE_PATH"] = os.getenv("SHARED_STATE_PATH") or "state/shared.db"
+        os.environ["RESULT_CACHE_DB_PATH"] = os.getenv("RESULT_CACHE_DB_PATH") or "cache/results.db"
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.getenv("PROMETHEUS_MULTIPROC_DIR") or "state/metrics"
+        os.makedirs(os.path.dirname(os.environ["SHARED_STATE_PATH"]) or ".", exist_ok=True)
+        _reset_path(os.environ["SHARED_STATE_PATH"])
+        _reset_path(os.environ["PROMETHEUS_MULTIPROC_DIR"], is_dir=True)
+
+    loop = _pick("uvloop", "asyncio")
+    http = _pick("httptools", "h11")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logger.info(f"Starting {workers} workers (loop={loop}, http={http})")
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30")),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_TIMEOUT", "5")),
+        proxy_headers=True,
+        access_log=False
+    )
+
+if __name__ == "__main__":
+    main()
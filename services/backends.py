@@ -0,0 +1,539 @@
+# services/backends.py
+import os
+import json
+import math
+import time
+import base64
+import random
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from google.api_core import exceptions as api_exceptions
+
+from services.gemini import get_gemini_model, get_model_name, parse_response_text
+from services.context import ExtractionContext
+from services.limiter import get_upstream_limiter
+from services.metrics import observe_stage
+from services.resilience import UPSTREAM_FAILURES, CircuitOpenError, ResponseParseError, get_resilient_caller
+from services.response_schema import ResponseSchema
+from services.scheduler import PRIORITY_INTERACTIVE, UpstreamScheduler, get_upstream_scheduler
+
+logger = logging.getLogger("patient-care-api")
+
+# Response returned by the fake backend when FAKE_RESPONSE_PATH is not set
+FAKE_RESPONSE = {
+    "phieu_cham_soc": {
+        "1_ho_ten_benh_nhan": "Nguyễn Văn A",
+        "2_tuoi": "65",
+        "3_gioi_tinh": "Nam",
+        "4_chan_doan": "Tăng huyết áp",
+        "5_benh_kem_theo": {"khong": False, "tieu_duong": True}
+    },
+    "confidence_scores": {
+        "1_ho_ten_benh_nhan": 95,
+        "2_tuoi": 90,
+        "4_chan_doan": 85
+    }
+}
+
+class ExtractionBackend:
+    """
+    Provider that turns request contents into the model's response text
+
+    Backends only produce text; the rate scheduler, upstream limiter,
+    deadlines, retries, hedging and the circuit breaker are applied around them by
+    `call_backend` and `stream_backend`.
+    """
+
+    # Short identifier used in configuration and logs
+    name = "base"
+    # Human-readable name used in error messages
+    label = "Backend"
+    # Whether the backend needs GEMINI_API_KEY
+    requires_api_key = False
+
+    @property
+    def model_name(self) -> str:
+        """Model identifier that results are cached under"""
+        return self.name
+
+    async def generate(self, contents: List[Dict], request_id: str, schema: Optional[ResponseSchema] = None) -> str:
+        """
+        Produce the full response text for a request
+
+        Args:
+            contents: Request contents
+            request_id: Request ID for logging
+            schema: Response schema the output should be constrained to
+
+        Returns:
+            str: Response text
+        """
+        raise NotImplementedError
+
+    def warm(self):
+        """Build clients ahead of the first request; nothing to do by default"""
+
+    async def stream(
+        self,
+        contents: List[Dict],
+        request_id: str,
+        schema: Optional[ResponseSchema] = None
+    ) -> AsyncIterator[str]:
+        """
+        Produce the response text in chunks
+
+        The default implementation yields the full response as one chunk.
+
+        Args:
+            contents: Request contents
+            request_id: Request ID for logging
+            schema: Response schema the output should be constrained to
+
+        Yields:
+            str: Response text chunks
+        """
+        yield await self.generate(contents, request_id, schema)
+
+class GeminiBackend(ExtractionBackend):
+    """Backend calling the Gemini API, optionally recording responses for replay"""
+
+    name = "gemini"
+    label = "Gemini API"
+    requires_api_key = True
+
+    def __init__(self, record_dir: Optional[str] = None):
+        self.record_dir = record_dir
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+    @property
+    def model_name(self) -> str:
+        return get_model_name()
+
+    def warm(self):
+        get_gemini_model()
+
+    async def generate(self, contents: List[Dict], request_id: str, schema: Optional[ResponseSchema] = None) -> str:
+        response = await get_gemini_model().generate_content_async(
+            contents, generation_config=schema.generation_config if schema else None
+        )
+        text = response.text
+        if self.record_dir:
+            await asyncio.to_thread(self._record, contents, text)
+        return text
+
+    async def stream(
+        self,
+        contents: List[Dict],
+        request_id: str,
+        schema: Optional[ResponseSchema] = None
+    ) -> AsyncIterator[str]:
+        response = await get_gemini_model().generate_content_async(
+            contents, generation_config=schema.generation_config if schema else None, stream=True
+        )
+        chunks = []
+        async for chunk in response:
+            chunks.append(chunk.text)
+            yield chunk.text
+        if self.record_dir:
+            await asyncio.to_thread(self._record, contents, "".join(chunks))
+
+    def _record(self, contents: List[Dict], text: str):
+        """Save a response under the key of its request images"""
+        path = os.path.join(self.record_dir, f"{contents_key(contents)}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+class FakeBackend(ExtractionBackend):
+    """
+    Offline backend with configurable latency and failure rates for capacity testing
+
+    Latencies are drawn from a fixed, uniform, normal or lognormal
+    distribution with the given mean and standard deviation. A share of
+    requests fails with a 503 and another share returns text that is not JSON.
+    """
+
+    name = "fake"
+    label = "Fake backend"
+
+    def __init__(
+        self,
+        response_text: str,
+        distribution: str = "lognormal",
+        mean: float = 1.5,
+        stddev: float = 0.5,
+        error_rate: float = 0.0,
+        parse_error_rate: float = 0.0,
+        chunk_size: int = 64,
+        seed: Optional[int] = None
+    ):
+        if distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.response_text = response_text
+        self.distribution = distribution
+        self.mean = mean
+        self.stddev = stddev
+        self.error_rate = error_rate
+        self.parse_error_rate = parse_error_rate
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """
+        Draw one latency from the configured distribution
+
+        Returns:
+            float: Latency in seconds
+        """
+        if self.distribution == "fixed" or self.stddev <= 0:
+            return self.mean
+        if self.distribution == "uniform":
+            spread = self.stddev * math.sqrt(3)
+            return max(0.0, self._random.uniform(self.mean - spread, self.mean + spread))
+        if self.distribution == "normal":
+            return max(0.0, self._random.gauss(self.mean, self.stddev))
+        # Lognormal with the requested mean and standard deviation
+        sigma = math.sqrt(math.log(1 + (self.stddev / self.mean) ** 2))
+        mu = math.log(self.mean) - sigma ** 2 / 2
+        return self._random.lognormvariate(mu, sigma)
+
+    def _outcome(self) -> str:
+        """Pick the outcome of one request: "ok", "error" or "parse_error\""""
+        roll = self._random.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.parse_error_rate:
+            return "parse_error"
+        return "ok"
+
+    async def generate(self, contents: List[Dict], request_id: str, schema: Optional[ResponseSchema] = None) -> str:
+        outcome = self._outcome()
+        await asyncio.sleep(self.sample_latency())
+        if outcome == "error":
+            raise api_exceptions.ServiceUnavailable("Injected fake backend failure")
+        if outcome == "parse_error":
+            return "Xin lỗi, tôi không thể đọc được hình ảnh này."
+        return self.response_text
+
+    async def stream(
+        self,
+        contents: List[Dict],
+        request_id: str,
+        schema: Optional[ResponseSchema] = None
+    ) -> AsyncIterator[str]:
+        outcome = self._outcome()
+        latency = self.sample_latency()
+        if outcome == "error":
+            await asyncio.sleep(latency)
+            raise api_exceptions.ServiceUnavailable("Injected fake backend failure")
+
+        text = self.response_text if outcome == "ok" else "Xin lỗi, tôi không thể đọc được hình ảnh này."
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield chunk
+
+class ReplayBackend(ExtractionBackend):
+    """
+    Backend answering from responses recorded on disk
+
+    A response recorded for the same request images (see
+    EXTRACTION_RECORD_DIR) is returned when one exists; otherwise the
+    recordings are served in turn, so any corpus can be replayed.
+    """
+
+    name = "replay"
+    label = "Replay backend"
+
+    def __init__(self, replay_dir: str, latency: float = 0.0):
+        self.replay_dir = replay_dir
+        self.latency = latency
+        self._responses: Dict[str, str] = {}
+        for filename in sorted(os.listdir(replay_dir)):
+            if filename.endswith((".txt", ".json")):
+                with open(os.path.join(replay_dir, filename), "r", encoding="utf-8") as f:
+                    self._responses[os.path.splitext(filename)[0]] = f.read()
+        if not self._responses:
+            raise ValueError(f"No recorded responses found in {replay_dir}")
+        self._order = list(self._responses)
+        self._next = 0
+        logger.info("Loaded %d recorded responses from %s", len(self._responses), replay_dir)
+
+    async def generate(self, contents: List[Dict], request_id: str, schema: Optional[ResponseSchema] = None) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._responses.get(contents_key(contents))
+        if text is None:
+            text = self._responses[self._order[self._next % len(self._order)]]
+            self._next += 1
+        return text
+
+def contents_key(contents: List[Dict]) -> str:
+    """
+    Key request contents by their image payloads
+
+    Args:
+        contents: Request contents
+
+    Returns:
+        str: SHA-256 hex digest of the inline image data
+    """
+    digest = hashlib.sha256()
+    for content in contents:
+        for part in content.get("parts", []):
+            inline_data = part.get("inline_data") if isinstance(part, dict) else None
+            if inline_data:
+                data = inline_data["data"]
+                # Recordings are keyed by the base64 text the payload used to carry
+                digest.update(data.encode("ascii") if isinstance(data, str) else base64.b64encode(data))
+    return digest.hexdigest()
+
+def _background_timeout(scheduler: UpstreamScheduler, priority: str, waited: float) -> Optional[float]:
+    """
+    Get how long a caller may still wait for an upstream slot outside the bounded queue
+
+    Args:
+        scheduler: Upstream scheduler holding the wait limit of each class
+        priority: Traffic class of the caller
+        waited: Seconds already spent waiting for the rate budget
+
+    Returns:
+        float: Remaining wait for batch and job traffic, or None for interactive callers
+    """
+    if priority == PRIORITY_INTERACTIVE:
+        return None
+    return max(0.0, scheduler.max_wait[priority] - waited)
+
+async def call_backend(
+    contents: List[Dict],
+    request_id: str,
+    context: Optional[ExtractionContext] = None,
+    schema: Optional[ResponseSchema] = None
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Call the configured extraction backend with the provided contents
+
+    The call first waits for the upstream rate budget in the order of its
+    priority, then holds one slot of the shared upstream limiter while it
+    runs; batch and job calls wait for that slot up to their class's
+    remaining wait limit instead of being rejected by the full queue. Each attempt has a deadline; transient failures are retried, slow
+    attempts may be hedged, and the circuit breaker fails fast while the
+    upstream is unhealthy. Retries and hedges are charged to the rate
+    budget as well.
+
+    With a response schema the output is constrained to JSON of that shape
+    and validated once; a response that does not match is returned as a
+    JSON_PARSING_ERROR result instead of being retried. Without one,
+    unparseable responses are retried.
+
+    Args:
+        contents: Request contents
+        request_id: Request ID for logging
+        context: Per-request context with the priority and token estimate,
+            which receives schedule, upstream and parse timings
+        schema: Response schema to constrain and validate the output with
+
+    Returns:
+        Tuple containing:
+            - Dict: Parsed JSON result if successful
+            - str: Error message if failed
+
+    Raises:
+        UpstreamBusyError: If the rate budget or an upstream slot is not available in time
+        CircuitOpenError: If the circuit breaker is open
+    """
+    backend = get_backend()
+    limiter = get_upstream_limiter()
+    caller = get_resilient_caller()
+    scheduler = get_upstream_scheduler()
+
+    record_timing = context.record_timing if context is not None else observe_stage
+    priority = context.priority if context is not None else PRIORITY_INTERACTIVE
+    tokens = context.estimated_tokens if context is not None else 0
+    attempts = 0
+
+    async def attempt() -> Dict:
+        nonlocal attempts
+        attempts += 1
+        if attempts > 1:
+            await scheduler.charge(tokens)
+        logger.info("[%s] Calling %s", request_id, backend.label)
+        stage_start = time.perf_counter()
+        try:
+            text = await backend.generate(contents, request_id, schema)
+        except api_exceptions.TooManyRequests:
+            await scheduler.throttle()
+            raise
+        record_timing("upstream", time.perf_counter() - stage_start)
+
+        stage_start = time.perf_counter()
+        if schema is not None:
+            result = schema.parse(text, request_id)
+            record_timing("parse", time.perf_counter() - stage_start)
+            return result
+        result, error = parse_response_text(text, request_id)
+        record_timing("parse", time.perf_counter() - stage_start)
+        if error:
+            raise ResponseParseError(error)
+        return result
+
+    waited = await scheduler.admit(priority, tokens)
+    record_timing("schedule", waited)
+    async with limiter.slot(_background_timeout(scheduler, priority, waited)):
+        start_time = time.time()
+        try:
+            result = await caller.call(attempt, request_id, limiter)
+        except CircuitOpenError:
+            raise
+        except ResponseParseError as e:
+            return None, str(e)
+        except Exception as e:
+            processing_time = time.time() - start_time
+            logger.error(
+                "[%s] %s call failed after %.2fs: %s",
+                request_id, backend.label, processing_time, _describe_error(e)
+            )
+            return None, f"{backend.label} call failed: {_describe_error(e)}"
+
+        processing_time = time.time() - start_time
+        logger.info("[%s] %s call successful in %.2fs", request_id, backend.label, processing_time)
+        return result, None
+
+async def stream_backend(
+    contents: List[Dict],
+    request_id: str,
+    context: Optional[ExtractionContext] = None,
+    schema: Optional[ResponseSchema] = None
+) -> AsyncIterator[str]:
+    """
+    Call the configured extraction backend with streaming output
+
+    Waits for the upstream rate budget, then holds one slot of the shared
+    upstream limiter until the stream ends.
+
+    Args:
+        contents: Request contents
+        request_id: Request ID for logging
+        context: Per-request context with the priority and token estimate
+        schema: Response schema to constrain the output with
+
+    Yields:
+        str: Response text chunks as they arrive
+
+    Raises:
+        UpstreamBusyError: If the rate budget or an upstream slot is not available in time
+        CircuitOpenError: If the circuit breaker is open
+    """
+    backend = get_backend()
+    limiter = get_upstream_limiter()
+    caller = get_resilient_caller()
+    breaker = caller.breaker
+    scheduler = get_upstream_scheduler()
+
+    record_timing = context.record_timing if context is not None else observe_stage
+    priority = context.priority if context is not None else PRIORITY_INTERACTIVE
+    tokens = context.estimated_tokens if context is not None else 0
+
+    waited = await scheduler.admit(priority, tokens)
+    record_timing("schedule", waited)
+
+    async with limiter.slot(_background_timeout(scheduler, priority, waited)):
+        trial = await breaker.check()
+        start_time = time.time()
+        logger.info("[%s] Calling %s (streaming)", request_id, backend.label)
+        try:
+            chunks = backend.stream(contents, request_id, schema)
+            first_chunk = True
+            while True:
+                try:
+                    # The deadline covers the wait for the first chunk
+                    if first_chunk:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=caller.attempt_timeout)
+                    else:
+                        chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                if first_chunk:
+                    logger.info("[%s] First chunk after %.2fs", request_id, time.time() - start_time)
+                    first_chunk = False
+                yield chunk
+        except api_exceptions.TooManyRequests:
+            await scheduler.throttle()
+            await breaker.abandon(trial)
+            raise
+        except UPSTREAM_FAILURES:
+            await breaker.record_failure(trial)
+            raise
+        except BaseException:
+            await breaker.abandon(trial)
+            raise
+
+        await breaker.record_success(trial)
+        logger.info("[%s] %s stream completed in %.2fs", request_id, backend.label, time.time() - start_time)
+
+def _describe_error(e: Exception) -> str:
+    """Describe an upstream error, naming timeouts that carry no message"""
+    if isinstance(e, asyncio.TimeoutError):
+        return f"attempt timed out after {get_resilient_caller().attempt_timeout:g}s"
+    return str(e)
+
+_backend: Optional[ExtractionBackend] = None
+
+def get_backend_name() -> str:
+    """
+    Get the configured backend name
+
+    Returns:
+        str: "gemini", "fake" or "replay"
+    """
+    return os.getenv("EXTRACTION_BACKEND", "gemini").lower()
+
+def get_backend() -> ExtractionBackend:
+    """
+    Get the process-wide extraction backend
+
+    Returns:
+        ExtractionBackend: Backend selected by EXTRACTION_BACKEND
+
+    Raises:
+        ValueError: If the backend name is unknown or its configuration is invalid
+    """
+    global _backend
+    if _backend is None:
+        _backend = _create_backend(get_backend_name())
+        logger.info("Extraction backend: %s", _backend.name)
+    return _backend
+
+def _create_backend(name: str) -> ExtractionBackend:
+    """Build a backend from environment variables"""
+    if name == "gemini":
+        return GeminiBackend(record_dir=os.getenv("EXTRACTION_RECORD_DIR") or None)
+
+    if name == "fake":
+        response_path = os.getenv("FAKE_RESPONSE_PATH")
+        if response_path:
+            with open(response_path, "r", encoding="utf-8") as f:
+                response_text = f.read()
+        else:
+            response_text = "```json\n" + json.dumps(FAKE_RESPONSE, ensure_ascii=False, indent=2) + "\n```"
+        seed = os.getenv("FAKE_SEED")
+        return FakeBackend(
+            response_text=response_text,
+            distribution=os.getenv("FAKE_LATENCY_DISTRIBUTION", "lognormal").lower(),
+            mean=float(os.getenv("FAKE_LATENCY_MEAN", "1.5")),
+            stddev=float(os.getenv("FAKE_LATENCY_STDDEV", "0.5")),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+            parse_error_rate=float(os.getenv("FAKE_PARSE_ERROR_RATE", "0")),
+            chunk_size=int(os.getenv("FAKE_CHUNK_SIZE", "64")),
+            seed=int(seed) if seed else None
+        )
+
+    if name == "replay":
+        return ReplayBackend(
+            replay_dir=os.getenv("REPLAY_DIR", "recordings"),
+            latency=float(os.getenv("REPLAY_LATENCY", "0"))
+        )
+
+    raise ValueError(f"Unknown extraction backend: {name}")
@@ -0,0 +1,207 @@
+# services/cache.py
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+from utils import jsonlib
+
+logger = logging.getLogger("patient-care-api")
+
+def build_cache_key(image_hashes: List[str], prompt_hash: str, model_name: str, variant: str = "") -> str:
+    """
+    Build a content-addressed cache key for an extraction request
+
+    Args:
+        image_hashes: Hex SHA-256 digests of the raw images, in upload order
+        prompt_hash: Hex SHA-256 digest of the extraction prompt text
+        model_name: Gemini model name
+        variant: Extra settings that change the upstream payload, e.g. the preprocessing profile
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256()
+    for image_hash in image_hashes:
+        digest.update(bytes.fromhex(image_hash))
+    digest.update(bytes.fromhex(prompt_hash))
+    digest.update(model_name.encode("utf-8"))
+    if variant:
+        digest.update(variant.encode("utf-8"))
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Two-tier cache of successful extraction results
+
+    The memory tier is an LRU bounded by the total size of the serialized
+    results. The optional disk tier is a SQLite file whose entries expire
+    after `ttl` seconds, so hits survive restarts.
+    """
+
+    def __init__(self, max_bytes: int, db_path: Optional[str] = None, ttl: float = 86400):
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expired": 0,
+            "stores": 0
+        }
+
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result
+
+        Args:
+            key: Cache key from build_cache_key
+
+        Returns:
+            Dict: Cached result, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return jsonlib.loads(value)
+
+        if self._db is not None:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    self._memory_put(key, value)
+                return jsonlib.loads(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, result: Dict[str, Any]):
+        """
+        Store a successful extraction result
+
+        Args:
+            key: Cache key from build_cache_key
+            result: Parsed extraction result
+        """
+        value = jsonlib.dumps(result)
+        with self._lock:
+            self._stats["stores"] += 1
+            self._memory_put(key, value)
+
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters
+
+        Returns:
+            Dict: Hit, miss and eviction counters plus current memory usage
+        """
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": self._db is not None
+            }
+
+    def _memory_put(self, key: str, value: bytes):
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        if len(value) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+
+        self._entries[key] = value
+        self._size += len(value)
+
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self._stats["evictions"] += 1
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        """Read an entry from the disk tier, dropping it if expired"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if time.time() - created_at > self.ttl:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                with self._lock:
+                    self._stats["expired"] += 1
+                return None
+
+            return value
+
+    def _disk_put(self, key: str, value: bytes):
+        """Write an entry to the disk tier"""
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._db.commit()
+
+_result_cache: Optional[ResultCache] = None
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Get the process-wide extraction result cache
+
+    Returns:
+        ResultCache: Shared cache, or None if caching is disabled
+    """
+    global _result_cache
+    if os.getenv("RESULT_CACHE_ENABLED", "true").lower() != "true":
+        return None
+
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            db_path=os.getenv("RESULT_CACHE_DB_PATH") or None,
+            ttl=float(os.getenv("RESULT_CACHE_TTL", "86400"))
+        )
+        logger.info(
+            "Result cache configured: max_bytes=%s, db_path=%s, ttl=%ss",
+            _result_cache.max_bytes, _result_cache.db_path, _result_cache.ttl
+        )
+    return _result_cache
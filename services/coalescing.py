@@ -0,0 +1,109 @@
+# services/coalescing.py
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.metrics import COALESCED_REQUESTS
+
+logger = logging.getLogger("patient-care-api")
+
+@dataclass
+class _Flight:
+    """One upstream extraction and the requests waiting for it"""
+    task: asyncio.Task
+    request_id: str
+    waiters: int = 0
+
+class SingleFlight:
+    """
+    Runs at most one extraction per key at a time
+
+    Requests arriving while an extraction with the same key is running wait
+    for its result instead of starting another upstream call. The flight
+    runs as its own task, so it survives the request that started it going
+    away as long as another request still waits; it is cancelled once
+    nobody does.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def leader_of(self, key: str) -> Optional[str]:
+        """
+        Get the request that started the in-flight extraction of a key
+
+        Args:
+            key: Flight key
+
+        Returns:
+            str: Request ID, or None if nothing is in flight
+        """
+        flight = self._flights.get(key)
+        return flight.request_id if flight is not None else None
+
+    async def run(self, key: str, request_id: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        """
+        Run fn, or join the run already in flight for the same key
+
+        Args:
+            key: Flight key, e.g. the result cache key
+            request_id: Request ID of the caller
+            fn: Coroutine factory producing the result
+
+        Returns:
+            Tuple containing:
+                - Any: Result of the flight
+                - str: Request ID of the request that started the flight, or
+                  None if this caller started it
+
+        Raises:
+            Exception: Whatever the flight raised
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(task=asyncio.ensure_future(fn()), request_id=request_id)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+            leader = None
+        else:
+            COALESCED_REQUESTS.inc()
+            logger.info("[%s] Joined the in-flight extraction of request %s", request_id, flight.request_id)
+            leader = flight.request_id
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), leader
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _land(self, key: str, flight: _Flight):
+        """Forget a finished flight so later requests start a new one"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Retrieved here so an error nobody waited for is not reported as unhandled
+            flight.task.exception()
+
+_single_flight: Optional[SingleFlight] = None
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """
+    Get the process-wide group of in-flight extractions
+
+    Returns:
+        SingleFlight: Shared group, or None if coalescing is disabled
+    """
+    global _single_flight
+    if os.getenv("COALESCE_ENABLED", "true").lower() != "true":
+        return None
+
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,85 @@
+# services/context.py
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from services.memory import sample_memory
+from services.metrics import observe_stage, observe_stage_memory
+
+@dataclass
+class ExtractionContext:
+    """Per-request information collected while running an extraction"""
+    request_id: str
+    # Traffic class for the upstream scheduler: "interactive", "batch" or "job"
+    priority: str = "interactive"
+    # Input tokens the upstream request is expected to cost
+    estimated_tokens: int = 0
+    # SHA-256 of each uploaded image, in upload order
+    image_hashes: List[str] = field(default_factory=list)
+    cache_key: Optional[str] = None
+    prompt_version: Optional[str] = None
+    model_name: Optional[str] = None
+    cached: bool = False
+    near_duplicate_of: Optional[str] = None
+    # Request whose in-flight upstream call this one waited for
+    coalesced_with: Optional[str] = None
+    original_bytes: int = 0
+    sent_bytes: int = 0
+    image_bytes: List[dict] = field(default_factory=list)
+    # Seconds spent in each pipeline stage, in the order the stages ran
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Peak traced bytes of each stage above where it started, if memory accounting is on
+    memory_peaks: Dict[str, int] = field(default_factory=dict)
+    # Traced bytes when the last stage ended, the baseline of the next one
+    memory_baseline: Optional[int] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        sample = sample_memory()
+        if sample is not None:
+            self.memory_baseline = sample[0]
+
+    def record_timing(self, stage: str, seconds: float):
+        """
+        Add time spent in a pipeline stage and export it to the stage histogram
+
+        With memory accounting on, the stage's peak memory is recorded too.
+
+        Args:
+            stage: Stage name, e.g. "preprocess" or "upstream"
+            seconds: Elapsed time
+        """
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        observe_stage(stage, seconds)
+        self._record_memory(stage)
+
+    def _record_memory(self, stage: str):
+        """Attribute the traced peak since the previous stage to this one"""
+        sample = sample_memory()
+        if sample is None:
+            return
+        current, peak = sample
+        baseline = self.memory_baseline if self.memory_baseline is not None else current
+        peak_bytes = max(0, peak - baseline)
+        self.memory_peaks[stage] = max(self.memory_peaks.get(stage, 0), peak_bytes)
+        self.memory_baseline = current
+        observe_stage_memory(stage, peak_bytes)
+
+    def timings_ms(self) -> Dict[str, float]:
+        """
+        Get stage timings in milliseconds for logging
+
+        Returns:
+            Dict: Milliseconds per stage, rounded to 0.1 ms
+        """
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.timings.items()}
+
+    def log_fields(self) -> Dict[str, Dict]:
+        """
+        Get the per-stage measurements to attach to a completion log
+
+        Returns:
+            Dict: Stage timings, plus peak memory per stage if it was recorded
+        """
+        fields = {"timings_ms": self.timings_ms()}
+        if self.memory_peaks:
+            fields["memory_peak_bytes"] = dict(self.memory_peaks)
+        return fields
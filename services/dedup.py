@@ -0,0 +1,271 @@
+# services/dedup.py
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from PIL import Image
+
+from services.images import ImageEnvelope
+from services.image_pool import ImageWorkerPool
+
+logger = logging.getLogger("patient-care-api")
+
+# dHash grid size: the hash has HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+def compute_dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """
+    Compute a difference hash of an image
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and each bit records whether a pixel is brighter than its left neighbour.
+
+    Args:
+        image: Decoded image
+        hash_size: Grid size of the hash
+
+    Returns:
+        int: Hash with hash_size * hash_size bits
+    """
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+
+    thumbnail = image.resize((hash_size + 1, hash_size), Image.BOX, reducing_gap=2.0).convert("L")
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def get_dhash(envelope: ImageEnvelope) -> int:
+    """
+    Get the perceptual hash of an upload, computing it on first use
+
+    Args:
+        envelope: Decoded upload
+
+    Returns:
+        int: Difference hash of the image
+    """
+    if envelope.dhash is None:
+        envelope.dhash = compute_dhash(envelope.image)
+    return envelope.dhash
+
+async def compute_dhashes(images: List[ImageEnvelope], pool: ImageWorkerPool):
+    """
+    Hash uploads that have no perceptual hash yet, concurrently on the shared image pool
+
+    Hashing shrinks the full-resolution pixels, which is too slow for the
+    event loop; afterwards `get_dhash` returns the stored hashes.
+
+    Args:
+        images: Decoded uploads
+        pool: Shared image worker pool
+    """
+    missing = [envelope for envelope in images if envelope.dhash is None]
+    hashes = await asyncio.gather(*(pool.run(compute_dhash, envelope.image) for envelope in missing))
+    for envelope, dhash in zip(missing, hashes):
+        envelope.dhash = dhash
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    """
+    Count the differing bits between two hashes
+
+    Args:
+        hash1: First hash
+        hash2: Second hash
+
+    Returns:
+        int: Hamming distance
+    """
+    return (hash1 ^ hash2).bit_count()
+
+@dataclass
+class IndexedPair:
+    """A front/back pair that was extracted recently"""
+    front_hash: int
+    back_hash: int
+    request_id: str
+    cache_key: Optional[str]
+    created_at: float
+
+@dataclass
+class NearDuplicateMatch:
+    """A previously seen pair that matches a new submission"""
+    request_id: str
+    cache_key: Optional[str]
+    distance: int
+
+class NearDuplicateIndex:
+    """
+    Multi-index hash table of recently extracted pairs
+
+    Front-page hashes are split into `threshold + 1` disjoint bit ranges and
+    each range is indexed separately. By the pigeonhole principle, any hash
+    within `threshold` bits of a query agrees with it exactly on at least one
+    range, so candidates come from a few dictionary lookups instead of a scan.
+
+    Forms printed from the same template can sit only 40-odd bits apart, so
+    a match within `threshold` is only reported. Reusing the earlier result
+    needs the pair to be within `serve_threshold` bits over both pages,
+    which in practice means the same scan re-encoded.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        max_entries: int,
+        ttl: float,
+        hash_bits: int = HASH_BITS,
+        serve_threshold: int = 0
+    ):
+        self.threshold = threshold
+        self.serve_threshold = serve_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        chunk_count = min(threshold + 1, hash_bits)
+        bounds = [round(i * hash_bits / chunk_count) for i in range(chunk_count + 1)]
+        self._chunks = [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(chunk_count)]
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in self._chunks]
+        self._entries: "OrderedDict[int, IndexedPair]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, front_hash: int, back_hash: int, request_id: str, cache_key: Optional[str] = None):
+        """
+        Index an extracted pair
+
+        Args:
+            front_hash: Hash of the front page
+            back_hash: Hash of the back page
+            request_id: Request that extracted the pair
+            cache_key: Result cache key of the extraction
+        """
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = IndexedPair(front_hash, back_hash, request_id, cache_key, time.time())
+        for table, key in zip(self._tables, self._chunk_keys(front_hash)):
+            table.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def find(self, front_hash: int, back_hash: int) -> Optional[NearDuplicateMatch]:
+        """
+        Find the closest indexed pair within the threshold on both pages
+
+        Args:
+            front_hash: Hash of the front page
+            back_hash: Hash of the back page
+
+        Returns:
+            NearDuplicateMatch: Closest matching pair, or None
+        """
+        self._expire()
+
+        candidates: Set[int] = set()
+        for table, key in zip(self._tables, self._chunk_keys(front_hash)):
+            candidates.update(table.get(key, ()))
+
+        best = None
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            front_distance = hamming_distance(front_hash, entry.front_hash)
+            back_distance = hamming_distance(back_hash, entry.back_hash)
+            if front_distance > self.threshold or back_distance > self.threshold:
+                continue
+
+            distance = front_distance + back_distance
+            if best is None or distance < best.distance:
+                best = NearDuplicateMatch(entry.request_id, entry.cache_key, distance)
+
+        return best
+
+    def can_serve(self, match: NearDuplicateMatch) -> bool:
+        """
+        Check whether a match is close enough to reuse its result
+
+        Args:
+            match: Match returned by find
+
+        Returns:
+            bool: True if the pair is within the serve threshold over both pages
+        """
+        return match.distance <= self.serve_threshold
+
+    def _chunk_keys(self, value: int) -> List[int]:
+        """Split a hash into its indexed bit ranges"""
+        return [(value >> start) & ((1 << width) - 1) for start, width in self._chunks]
+
+    def _remove(self, entry_id: int):
+        """Remove an entry from the index"""
+        entry = self._entries.pop(entry_id)
+        for table, key in zip(self._tables, self._chunk_keys(entry.front_hash)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[key]
+
+    def _expire(self):
+        """Drop entries older than the TTL"""
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if entry.created_at >= cutoff:
+                break
+            self._remove(entry_id)
+
+def are_duplicate_images(img1: ImageEnvelope, img2: ImageEnvelope) -> Tuple[bool, int]:
+    """
+    Check if two uploads show the same page
+
+    Args:
+        img1: First decoded upload
+        img2: Second decoded upload
+
+    Returns:
+        Tuple containing:
+            - bool: True if images are likely duplicates
+            - int: Hamming distance between their perceptual hashes
+    """
+    if img1.sha256 == img2.sha256:
+        return True, 0
+
+    threshold = int(os.getenv("DUPLICATE_HASH_THRESHOLD", "48"))
+    distance = hamming_distance(get_dhash(img1), get_dhash(img2))
+    return distance <= threshold, distance
+
+def get_near_duplicate_mode() -> str:
+    """
+    Get how cross-request near-duplicates are handled
+
+    Returns:
+        str: "off", "flag" (report the earlier request) or "serve" (also reuse its
+            cached result when the match is within the serve threshold)
+    """
+    return os.getenv("NEAR_DUPLICATE_MODE", "flag").lower()
+
+_near_duplicate_index: Optional[NearDuplicateIndex] = None
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """
+    Get the process-wide index of recently extracted pairs
+
+    Returns:
+        NearDuplicateIndex: Shared index configured from environment variables
+    """
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        _near_duplicate_index = NearDuplicateIndex(
+            threshold=int(os.getenv("NEAR_DUPLICATE_THRESHOLD", "24")),
+            max_entries=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "10000")),
+            ttl=float(os.getenv("NEAR_DUPLICATE_TTL", "86400")),
+            serve_threshold=int(os.getenv("NEAR_DUPLICATE_SERVE_THRESHOLD", "4"))
+        )
+    return _near_duplicate_index
@@ -1,173 +1,727 @@
 # services/extraction.py
+import math
+import asyncio
 import logging
 import time
-from typing import List, Dict, Any
-import io
-import hashlib
-from PIL import Image, ImageEnhance
-import concurrent.futures
-
-from services.gemini import call_gemini_api, get_extraction_prompt
-from utils.helpers import encode_image
+import dataclasses
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
+
+from services.backends import call_backend, get_backend, stream_backend
+from services.gemini import parse_response_text, get_extraction_prompt_version
+from services.cache import build_cache_key, get_result_cache
+from services.coalescing import get_single_flight
+from services.registry import PromptVersion
+from services.context import ExtractionContext
+from services.images import ImageEnvelope
+from services.dedup import are_duplicate_images, compute_dhashes, get_near_duplicate_index, get_near_duplicate_mode
+from services.preprocessing import PreprocessProfile, PreprocessedImage, get_preprocess_profile, preprocess_images
+from services.image_pool import get_image_pool
+from services.limiter import get_upstream_limiter, UpstreamBusyError
+from services.scheduler import PRIORITY_INTERACTIVE, estimate_request_tokens, get_upstream_scheduler
+from services.resilience import CircuitOpenError, get_resilient_caller
+from services.metrics import QUALITY_CHECK_SECONDS, QUALITY_GATE_FAILURES, UPSTREAM_PAYLOAD_BYTES
+from services.quality import assess_images, get_quality_thresholds
+from services.response_schema import get_response_schema
+from services.sections import (
+    CONSISTENCY_SECTION, EXTRACTION_SECTIONS, first_section_error, get_extraction_mode,
+    get_section_prompts, get_section_schemas, merge_sections, section_values, sections_fingerprint
+)
+from utils.helpers import image_part
+from utils.json_stream import IncrementalJSONParser
 from utils.errors import ErrorType, get_error_message
 
 logger = logging.getLogger("patient-care-api")
 
-async def extract_patient_care_data(image_files: List[bytes], request_id: str) -> Dict[str, Any]:
+async def extract_patient_care_data(
+    images: List[ImageEnvelope],
+    request_id: str,
+    context: Optional[ExtractionContext] = None
+) -> Dict[str, Any]:
     """
     Extract data from patient care form images
     
     Args:
-        image_files: List of image bytes
+        images: Decoded uploads, front side first
         request_id: Request ID for logging
+        context: Optional context that receives per-request details such as cache hits
         
     Returns:
         Dict: Extracted data or error information
     """
+    if context is None:
+        context = ExtractionContext(request_id=request_id)
+    
     start_time = time.time()
-    logger.info(f"[{request_id}] Starting extraction from {len(image_files)} images")
+    logger.info("[%s] Starting extraction from %d images", request_id, len(images))
+    
+    prompt = get_extraction_prompt_version()
+    profile = get_preprocess_profile()
+    
+    early_result = await _check_request(images, context, prompt, profile)
+    if early_result is not None:
+        return early_result
+    
+    try:
+        # Preprocess and call the extraction backend, or join an identical call in flight
+        result, error = await _coalesced_extract(images, context, prompt, profile)
+        
+        if error:
+            return _api_error(error)
+        
+        # Log success
+        processing_time = time.time() - start_time
+        logger.info(
+            "[%s] Extraction completed in %.2fs", request_id, processing_time,
+            extra=context.log_fields()
+        )
+        
+        return result
+    
+    except UpstreamBusyError as e:
+        logger.warning("[%s] Upstream busy: %s", request_id, e)
+        return _busy_error(e.retry_after, str(e))
+    
+    except CircuitOpenError as e:
+        logger.warning("[%s] Upstream unavailable: %s", request_id, e)
+        return _unavailable_error(e.retry_after, str(e))
+    
+    except Exception as e:
+        logger.error("[%s] Error during extraction: %s", request_id, e, exc_info=True)
+        return _processing_error(str(e))
+
+async def stream_patient_care_data(
+    images: List[ImageEnvelope],
+    request_id: str,
+    context: Optional[ExtractionContext] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Extract data from patient care form images, reporting sections as they complete
+    
+    Args:
+        images: Decoded uploads, front side first
+        request_id: Request ID for logging
+        context: Optional context that receives per-request details such as cache hits
+        
+    Yields:
+        Tuple containing:
+            - str: "section" for a partial result, "result" for the final one
+            - Any: {"path": [...], "value": ...} for sections, extracted data or
+              error information for the final result
+    """
+    if context is None:
+        context = ExtractionContext(request_id=request_id)
+    
+    start_time = time.time()
+    logger.info("[%s] Starting streaming extraction from %d images", request_id, len(images))
+    
+    prompt = get_extraction_prompt_version()
+    profile = get_preprocess_profile()
+    
+    early_result = await _check_request(images, context, prompt, profile)
+    if early_result is not None:
+        yield "result", early_result
+        return
+    
+    try:
+        # A retry of a request still in flight waits for its result instead of streaming
+        single_flight = get_single_flight()
+        if single_flight is not None and single_flight.leader_of(context.cache_key) is not None:
+            result, error = await _coalesced_extract(images, context, prompt, profile)
+            yield "result", _api_error(error) if error else result
+            return
+        
+        # Sections are reported as their upstream calls complete
+        if get_extraction_mode() == "sectioned":
+            completed: asyncio.Queue = asyncio.Queue()
+            extraction = asyncio.ensure_future(
+                _coalesced_extract(images, context, prompt, profile, completed.put_nowait)
+            )
+            extraction.add_done_callback(lambda _: completed.put_nowait(None))
+            try:
+                while (values := await completed.get()) is not None:
+                    for path, value in values:
+                        yield "section", {"path": path, "value": value}
+                result, error = extraction.result()
+            finally:
+                extraction.cancel()
+            if error:
+                yield "result", _api_error(error)
+                return
+            
+            processing_time = time.time() - start_time
+            logger.info(
+                "[%s] Streaming extraction completed in %.2fs", request_id, processing_time,
+                extra=context.log_fields()
+            )
+            yield "result", result
+            return
+        
+        contents = await _build_contents(images, context, prompt, profile)
+        schema = get_response_schema()
+        
+        stage_start = time.perf_counter()
+        parser = IncrementalJSONParser()
+        chunks = []
+        async for chunk in stream_backend(contents, request_id, context, schema):
+            chunks.append(chunk)
+            for path, value in parser.feed(chunk):
+                yield "section", {"path": path, "value": value}
+        context.record_timing("upstream", time.perf_counter() - stage_start)
+        
+        stage_start = time.perf_counter()
+        if schema is not None:
+            result, error = schema.parse("".join(chunks), request_id), None
+        else:
+            result, error = parse_response_text("".join(chunks), request_id)
+        context.record_timing("parse", time.perf_counter() - stage_start)
+        if error:
+            yield "result", _api_error(error)
+            return
+        
+        await _remember_result(images, context, result)
+        
+        processing_time = time.time() - start_time
+        logger.info(
+            "[%s] Streaming extraction completed in %.2fs", request_id, processing_time,
+            extra=context.log_fields()
+        )
+        
+        yield "result", result
+    
+    except UpstreamBusyError as e:
+        logger.warning("[%s] Upstream busy: %s", request_id, e)
+        yield "result", _busy_error(e.retry_after, str(e))
+    
+    except CircuitOpenError as e:
+        logger.warning("[%s] Upstream unavailable: %s", request_id, e)
+        yield "result", _unavailable_error(e.retry_after, str(e))
+    
+    except Exception as e:
+        logger.error("[%s] Error during streaming extraction: %s", request_id, e, exc_info=True)
+        yield "result", _api_error(f"{get_backend().label} call failed: {str(e)}")
+
+async def _check_request(
+    images: List[ImageEnvelope],
+    context: ExtractionContext,
+    prompt: PromptVersion,
+    profile: PreprocessProfile
+) -> Optional[Dict[str, Any]]:
+    """
+    Run the checks that can answer a request without calling Gemini
+    
+    Args:
+        images: Decoded uploads, front side first
+        context: Per-request context
+        prompt: Extraction prompt
+        profile: Preprocessing profile
+        
+    Returns:
+        Dict: Error information or a cached result, or None to continue with the upstream call
+    """
+    request_id = context.request_id
     
     # Check number of images
-    if len(image_files) != 2:
+    if len(images) != 2:
         return {
             "error": True,
             "error_type": ErrorType.INSUFFICIENT_IMAGES,
             "error_details": {
-                "received": len(image_files),
+                "received": len(images),
                 "required": 2
             },
             "message": get_error_message(ErrorType.INSUFFICIENT_IMAGES)
         }
     
     # Check if images are duplicates
-    if _are_duplicate_images(image_files[0], image_files[1]):
+    stage_start = time.perf_counter()
+    await compute_dhashes(images, get_image_pool())
+    is_duplicate, hash_distance = are_duplicate_images(images[0], images[1])
+    context.record_timing("dedup", time.perf_counter() - stage_start)
+    if is_duplicate:
         return {
             "error": True,
             "error_type": ErrorType.DUPLICATE_IMAGES,
             "error_details": {
-                "message": "The uploaded images appear to be duplicates"
+                "message": "The uploaded images appear to be duplicates",
+                "hash_distance": hash_distance
             },
             "message": get_error_message(ErrorType.DUPLICATE_IMAGES)
         }
     
-    # Preprocess images in parallel
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-            preprocessed_images = list(executor.map(_preprocess_image, image_files))
-        
-        # Prepare request to Gemini API
-        parts = []
-        
-        # Add images
-        for img_bytes in preprocessed_images:
-            parts.append(encode_image(img_bytes))
-        
-        # Add prompt
-        parts.append({"text": get_extraction_prompt()})
-        
-        # Create request content
-        contents = [{"role": "user", "parts": parts}]
+    # Identical requests share this key for caching and coalescing
+    prompt_hash = prompt.sha256
+    if get_extraction_mode() == "sectioned":
+        prompt_hash = sections_fingerprint(get_section_prompts())
+    variant = profile.fingerprint()
+    schema = get_response_schema()
+    if schema is not None:
+        variant += f";schema={schema.fingerprint}"
+    context.image_hashes = [image.sha256 for image in images]
+    context.prompt_version = prompt_hash[:12]
+    context.model_name = get_backend().model_name
+    context.cache_key = build_cache_key(context.image_hashes, prompt_hash, context.model_name, variant)
+    
+    # Screen out unusable photos before any upstream work
+    quality_error = await _check_quality(images, context)
+    if quality_error is not None:
+        return quality_error
+    
+    # Serve identical resubmissions from the result cache
+    cache = get_result_cache()
+    if cache is not None:
+        stage_start = time.perf_counter()
+        cached_result = await cache.get(context.cache_key)
+        context.record_timing("cache", time.perf_counter() - stage_start)
+        if cached_result is not None:
+            context.cached = True
+            logger.info("[%s] Served extraction from cache", request_id)
+            return cached_result
+    
+    # Look for a near-identical pair extracted by an earlier request
+    near_duplicate_mode = get_near_duplicate_mode()
+    if near_duplicate_mode != "off":
+        stage_start = time.perf_counter()
+        near_duplicates = get_near_duplicate_index()
+        match = near_duplicates.find(images[0].dhash, images[1].dhash)
+        context.record_timing("near_duplicate", time.perf_counter() - stage_start)
+        if match is not None:
+            context.near_duplicate_of = match.request_id
+            logger.info(
+                "[%s] Near-duplicate of request %s (hash distance %d)",
+                request_id, match.request_id, match.distance
+            )
+            # Only a re-encode of the same scan may reuse a result; similar forms may be other patients
+            servable = near_duplicates.can_serve(match)
+            if near_duplicate_mode == "serve" and servable and cache is not None and match.cache_key:
+                prior_result = await cache.get(match.cache_key)
+                if prior_result is not None:
+                    context.cached = True
+                    return prior_result
+    
+    # A retry of a request still in flight needs no upstream capacity of its own
+    single_flight = get_single_flight()
+    if single_flight is not None and single_flight.leader_of(context.cache_key) is not None:
+        return None
+    
+    # Fail fast while the upstream is known to be unhealthy
+    blocked_for = await get_resilient_caller().breaker.blocked_for()
+    if blocked_for:
+        return _unavailable_error(blocked_for, "Upstream circuit is open")
+    
+    # Reject interactive callers early when the upstream queue is already full;
+    # batch and job traffic waits outside that queue instead
+    limiter = get_upstream_limiter()
+    if context.priority == PRIORITY_INTERACTIVE and await limiter.is_saturated():
+        return _busy_error(limiter.retry_after, "Upstream queue is full")
+    
+    # Or when the rate budget would not free up in time for this traffic class
+    scheduler = get_upstream_scheduler()
+    predicted_wait = scheduler.predicted_wait(context.priority)
+    if predicted_wait > scheduler.max_wait[context.priority]:
+        return _busy_error(
+            max(scheduler.retry_after, math.ceil(predicted_wait)),
+            f"Upstream rate budget exhausted, predicted wait {predicted_wait:.1f}s"
+        )
+    
+    return None
+
+async def _check_quality(images: List[ImageEnvelope], context: ExtractionContext) -> Optional[Dict[str, Any]]:
+    """
+    Run the local image-quality gate on both pages
+    
+    In shadow mode failures are only logged and counted, so thresholds can be
+    calibrated on real traffic before they are enforced.
+    
+    Args:
+        images: Decoded uploads, front side first
+        context: Per-request context
         
-        # Call Gemini API
-        result, error = call_gemini_api(contents, request_id)
+    Returns:
+        Dict: Error information for the first failing image when enforcing, otherwise None
+    """
+    thresholds = get_quality_thresholds()
+    if thresholds.mode == "off":
+        return None
+    
+    stage_start = time.perf_counter()
+    reports = await assess_images(images, thresholds, get_image_pool())
+    context.record_timing("quality", time.perf_counter() - stage_start)
+    
+    for report in reports:
+        for check, seconds in report.timings.items():
+            QUALITY_CHECK_SECONDS.labels(check).observe(seconds)
+    logger.debug(
+        "[%s] Quality gate measurements", context.request_id,
+        extra={
+            "quality": [report.metrics for report in reports],
+            "quality_timings_ms": [
+                {check: round(seconds * 1000, 2) for check, seconds in report.timings.items()}
+                for report in reports
+            ]
+        }
+    )
+    
+    for image_index, (image, report) in enumerate(zip(images, reports)):
+        for failure in report.failures:
+            QUALITY_GATE_FAILURES.labels(failure.check, thresholds.mode).inc()
+        if report.passed:
+            continue
         
-        if error:
-            return {
-                "error": True,
-                "error_type": ErrorType.API_REQUEST_FAILED,
-                "error_details": {"message": error},
-                "message": get_error_message(ErrorType.API_REQUEST_FAILED, error)
-            }
+        failure = report.failures[0]
+        if thresholds.mode == "shadow":
+            logger.warning(
+                "[%s] Quality gate (shadow) would reject image %d: %s",
+                context.request_id, image_index, "; ".join(f.message for f in report.failures)
+            )
+            continue
         
-        # Log success
-        processing_time = time.time() - start_time
-        logger.info(f"[{request_id}] Extraction completed in {processing_time:.2f}s")
-        
-        return result
-    
-    except Exception as e:
-        logger.error(f"[{request_id}] Error during extraction: {str(e)}", exc_info=True)
+        logger.info("[%s] Quality gate rejected image %d: %s", context.request_id, image_index, failure.message)
         return {
             "error": True,
-            "error_type": ErrorType.PROCESSING_ERROR,
-            "error_details": {"message": str(e)},
-            "message": get_error_message(ErrorType.PROCESSING_ERROR, str(e))
+            "error_type": failure.error_type,
+            "error_details": {
+                "message": failure.message,
+                "check": failure.check,
+                "image_index": image_index,
+                "filename": image.filename,
+                "measurements": {name: round(value, 4) for name, value in report.metrics.items()}
+            },
+            "message": get_error_message(failure.error_type)
         }
+    
+    return None
 
-def _preprocess_image(image_bytes: bytes) -> bytes:
+async def _encode_images(
+    images: List[ImageEnvelope],
+    context: ExtractionContext,
+    profile: PreprocessProfile
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, int]]]:
     """
-    Preprocess image to improve quality for extraction
+    Preprocess the images and encode them as Gemini request parts
     
     Args:
-        image_bytes: Raw image bytes
+        images: Decoded uploads, front side first
+        context: Per-request context
+        profile: Preprocessing profile
         
     Returns:
-        bytes: Processed image bytes
+        Tuple containing:
+            - List: Image parts, in upload order
+            - List: Sent (width, height) of each image
     """
-    try:
-        # Open image
-        img = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+    # Preprocess images in parallel on the shared pool
+    stage_start = time.perf_counter()
+    preprocessed_images = await preprocess_images(images, profile, get_image_pool())
+    context.record_timing("preprocess", time.perf_counter() - stage_start)
+    
+    # Decoded pixels are no longer needed once the payload is built
+    for image in images:
+        image.release()
+    
+    _record_payload_sizes(context, preprocessed_images)
+    
+    stage_start = time.perf_counter()
+    parts = [image_part(preprocessed.data, preprocessed.mime_type) for preprocessed in preprocessed_images]
+    context.record_timing("encode", time.perf_counter() - stage_start)
+    
+    return parts, [preprocessed.size for preprocessed in preprocessed_images]
+
+async def _build_contents(
+    images: List[ImageEnvelope],
+    context: ExtractionContext,
+    prompt: PromptVersion,
+    profile: PreprocessProfile
+) -> List[Dict[str, Any]]:
+    """
+    Preprocess the images and build the Gemini request contents
+    
+    Args:
+        images: Decoded uploads, front side first
+        context: Per-request context
+        prompt: Extraction prompt
+        profile: Preprocessing profile
         
-        # Enhance contrast slightly
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.2)
+    Returns:
+        List: Request contents
+    """
+    image_parts, sizes = await _encode_images(images, context, profile)
+    context.estimated_tokens = estimate_request_tokens(sizes, prompt.text)
+    
+    # Images first, then the prompt
+    return [{"role": "user", "parts": image_parts + [{"text": prompt.text}]}]
+
+async def _extract(
+    images: List[ImageEnvelope],
+    context: ExtractionContext,
+    prompt: PromptVersion,
+    profile: PreprocessProfile,
+    on_section: Optional[Callable[[List[Tuple[List[str], Any]]], None]] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Preprocess the images, call the extraction backend and remember a successful result
+    
+    Args:
+        images: Decoded uploads, front side first
+        context: Per-request context
+        prompt: Extraction prompt
+        profile: Preprocessing profile
+        on_section: Optional callback receiving the (path, value) pairs of
+            each section as it completes, in sectioned mode
         
-        # Enhance sharpness
-        enhancer = ImageEnhance.Sharpness(img)
-        img = enhancer.enhance(1.3)
+    Returns:
+        Tuple containing:
+            - Dict: Parsed JSON result if successful
+            - str: Error message if failed
+    """
+    if get_extraction_mode() == "sectioned":
+        result, error = await _extract_sectioned(images, context, profile, on_section)
+    else:
+        contents = await _build_contents(images, context, prompt, profile)
+        result, error = await call_backend(contents, context.request_id, context, get_response_schema())
+    if not error:
+        await _remember_result(images, context, result)
+    return result, error
+
+async def _extract_sectioned(
+    images: List[ImageEnvelope],
+    context: ExtractionContext,
+    profile: PreprocessProfile,
+    on_section: Optional[Callable[[List[Tuple[List[str], Any]]], None]] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Run the consistency check and every field section as concurrent upstream calls
+    
+    All calls send both pages, since the side a field is printed on is not
+    known from the upload order. A consistency error, or a call that fails,
+    ends the extraction and cancels the calls still running; otherwise the
+    first error reported by a field section is returned, or the sections
+    are merged into the shape of a single-call result.
+    
+    Args:
+        images: Decoded uploads, front side first
+        context: Per-request context
+        profile: Preprocessing profile
+        on_section: Optional callback receiving the (path, value) pairs of
+            each field section as it completes
         
-        # Adjust brightness if needed
-        # enhancer = ImageEnhance.Brightness(img)
-        # img = enhancer.enhance(1.1)
+    Returns:
+        Tuple containing:
+            - Dict: Merged result or the error reported by the model
+            - str: Error message if a call failed
+    """
+    prompts = get_section_prompts()
+    schemas = get_section_schemas()
+    image_parts, sizes = await _encode_images(images, context, profile)
+    section_tokens = {name: estimate_request_tokens(sizes, prompt.text) for name, prompt in prompts.items()}
+    context.estimated_tokens = sum(section_tokens.values())
+    sections = {section.name: section for section in EXTRACTION_SECTIONS}
+    section_timings: Dict[str, Dict[str, float]] = {}
+    
+    async def run_section(name: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+        # Each call is scheduled and timed on its own; the parent records the wall time
+        section_context = dataclasses.replace(
+            context, estimated_tokens=section_tokens[name], timings={}, memory_peaks={}
+        )
+        contents = [{"role": "user", "parts": image_parts + [{"text": prompts[name].text}]}]
+        result, error = await call_backend(
+            contents, f"{context.request_id}:{name}", section_context, schemas[name]
+        )
+        section_timings[name] = section_context.timings_ms()
+        return name, result, error
+    
+    stage_start = time.perf_counter()
+    tasks = [asyncio.ensure_future(run_section(name)) for name in prompts]
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, result, error = await next_done
+            if error:
+                return None, f"Section {name}: {error}"
+            if name == CONSISTENCY_SECTION and result.get("error"):
+                return result, None
+            results[name] = result
+            if on_section is not None and name in sections and not result.get("error"):
+                on_section(section_values(sections[name], result))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        context.record_timing("sections", time.perf_counter() - stage_start)
+        logger.info(
+            "[%s] Sectioned extraction ran %d calls", context.request_id, len(section_timings),
+            extra={"section_timings_ms": section_timings}
+        )
+    
+    error_result = first_section_error(results)
+    if error_result is not None:
+        return error_result, None
+    return merge_sections(results), None
+
+async def _coalesced_extract(
+    images: List[ImageEnvelope],
+    context: ExtractionContext,
+    prompt: PromptVersion,
+    profile: PreprocessProfile,
+    on_section: Optional[Callable[[List[Tuple[List[str], Any]]], None]] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Run _extract, or wait for an identical extraction already in flight
+    
+    Args:
+        images: Decoded uploads, front side first
+        context: Per-request context; records the request it was coalesced with
+        prompt: Extraction prompt
+        profile: Preprocessing profile
+        on_section: Optional section callback, only used when this request
+            starts the extraction
         
-        # Convert back to bytes
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=95)
-        return output.getvalue()
+    Returns:
+        Tuple containing:
+            - Dict: Parsed JSON result if successful
+            - str: Error message if failed
+    """
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return await _extract(images, context, prompt, profile, on_section)
     
-    except Exception as e:
-        logger.warning(f"Image preprocessing failed: {str(e)}, using original image")
-        return image_bytes
+    stage_start = time.perf_counter()
+    (result, error), leader = await single_flight.run(
+        context.cache_key, context.request_id, lambda: _extract(images, context, prompt, profile, on_section)
+    )
+    if leader is not None:
+        context.coalesced_with = leader
+        context.record_timing("coalesced", time.perf_counter() - stage_start)
+        for image in images:
+            image.release()
+    return result, error
 
-def _are_duplicate_images(img1_bytes: bytes, img2_bytes: bytes) -> bool:
+async def _remember_result(images: List[ImageEnvelope], context: ExtractionContext, result: Dict[str, Any]):
     """
-    Check if two images are duplicates
+    Cache a successful extraction and index its pages for near-duplicate lookups
     
     Args:
-        img1_bytes: First image bytes
-        img2_bytes: Second image bytes
+        images: Decoded uploads, front side first
+        context: Per-request context
+        result: Parsed extraction result
+    """
+    # Cache only successful extractions, not errors reported by the model
+    if result.get("error"):
+        return
+    
+    cache = get_result_cache()
+    if cache is not None:
+        await cache.put(context.cache_key, result)
+    
+    if get_near_duplicate_mode() != "off":
+        get_near_duplicate_index().add(images[0].dhash, images[1].dhash, context.request_id, context.cache_key)
+
+def _api_error(error: str) -> Dict[str, Any]:
+    """
+    Build the error result for a failed upstream call
+    
+    Args:
+        error: Error message from the upstream call
         
     Returns:
-        bool: True if images are likely duplicates
+        Dict: Error information
+    """
+    return {
+        "error": True,
+        "error_type": ErrorType.API_REQUEST_FAILED,
+        "error_details": {"message": error},
+        "message": get_error_message(ErrorType.API_REQUEST_FAILED, error)
+    }
+
+def _processing_error(error: str) -> Dict[str, Any]:
     """
-    # Calculate image hashes
-    hash1 = hashlib.md5(img1_bytes).hexdigest()
-    hash2 = hashlib.md5(img2_bytes).hexdigest()
+    Build the error result for an unexpected failure
     
-    # If hashes match exactly, images are identical
-    if hash1 == hash2:
-        return True
+    Args:
+        error: Error message
+        
+    Returns:
+        Dict: Error information
+    """
+    return {
+        "error": True,
+        "error_type": ErrorType.PROCESSING_ERROR,
+        "error_details": {"message": error},
+        "message": get_error_message(ErrorType.PROCESSING_ERROR, error)
+    }
+
+def _busy_error(retry_after: int, message: str) -> Dict[str, Any]:
+    """
+    Build the error result returned when upstream capacity is exhausted
     
-    # Try more sophisticated comparison if needed
-    try:
-        # Compare image dimensions and basic features
-        img1 = Image.open(io.BytesIO(img1_bytes))
-        img2 = Image.open(io.BytesIO(img2_bytes))
+    Args:
+        retry_after: Seconds the client should wait before retrying
+        message: Reason for the rejection
         
-        # If images have very similar dimensions and file sizes,
-        # they might be duplicates or very similar images
-        size_similarity = abs(len(img1_bytes) - len(img2_bytes)) / max(len(img1_bytes), len(img2_bytes))
-        dimension_match = img1.size == img2.size
+    Returns:
+        Dict: Error information
+    """
+    return {
+        "error": True,
+        "error_type": ErrorType.SERVICE_BUSY,
+        "error_details": {
+            "message": message,
+            "retry_after": retry_after
+        },
+        "message": get_error_message(ErrorType.SERVICE_BUSY)
+    }
+
+def _unavailable_error(retry_after: int, message: str) -> Dict[str, Any]:
+    """
+    Build the error result returned while the upstream circuit is open
+    
+    Args:
+        retry_after: Seconds until the upstream is tried again
+        message: Reason for the rejection
         
-        # If dimensions match exactly and size is within 5%, likely duplicates
-        if dimension_match and size_similarity < 0.05:
-            return True
+    Returns:
+        Dict: Error information
+    """
+    return {
+        "error": True,
+        "error_type": ErrorType.UPSTREAM_UNAVAILABLE,
+        "error_details": {
+            "message": message,
+            "retry_after": retry_after
+        },
+        "message": get_error_message(ErrorType.UPSTREAM_UNAVAILABLE)
+    }
+
+def _record_payload_sizes(context: ExtractionContext, preprocessed_images: List[PreprocessedImage]):
+    """
+    Record original and sent payload sizes on the context and log them
     
-    except Exception as e:
-        logger.warning(f"Error during duplicate image detection: {str(e)}")
+    Args:
+        context: Per-request context
+        preprocessed_images: Encoded payloads
+    """
+    context.image_bytes = [
+        {
+            "original_bytes": preprocessed.original_bytes,
+            "sent_bytes": preprocessed.sent_bytes,
+            "size": list(preprocessed.size),
+            "quality": preprocessed.quality,
+            "kept_original": preprocessed.kept_original
+        }
+        for preprocessed in preprocessed_images
+    ]
+    context.original_bytes = sum(preprocessed.original_bytes for preprocessed in preprocessed_images)
+    context.sent_bytes = sum(preprocessed.sent_bytes for preprocessed in preprocessed_images)
+    UPSTREAM_PAYLOAD_BYTES.labels("original").observe(context.original_bytes)
+    UPSTREAM_PAYLOAD_BYTES.labels("sent").observe(context.sent_bytes)
+    
+    # Uploads sent as-is because re-encoding them would have made them larger
+    kept_bytes = sum(preprocessed.sent_bytes for preprocessed in preprocessed_images if preprocessed.kept_original)
+    if kept_bytes:
+        UPSTREAM_PAYLOAD_BYTES.labels("kept_original").observe(kept_bytes)
     
-    return False
\ No newline at end of file
+    ratio = context.sent_bytes / context.original_bytes if context.original_bytes else 0
+    logger.info(
+        "[%s] Payload size: original %d bytes, sent %d bytes (%.0f%%), qualities %s",
+        context.request_id, context.original_bytes, context.sent_bytes, ratio * 100,
+        [preprocessed.quality for preprocessed in preprocessed_images]
+    )
@@ -1,13 +1,11 @@
 # services/gemini.py
 import os
 import logging
-import google.generativeai as genai
-from typing import List, Dict, Any, Tuple, Optional
-import time
-from concurrent.futures import ThreadPoolExecutor
-import json
+from typing import Dict, Tuple, Optional
 
-from utils.helpers import extract_json_from_text, is_valid_json
+from services.registry import DEFAULT_MODEL_NAME, PromptVersion, get_registry
+from utils import jsonlib
+from utils.helpers import extract_json_from_text, scan_json_object
 
 logger = logging.getLogger("patient-care-api")
 
@@ -27,26 +25,23 @@ def validate_gemini_api_key() -> str:
         raise EnvironmentError("GEMINI_API_KEY must be set in environment variables")
     return api_key
 
+def get_model_name() -> str:
+    """
+    Get configured Gemini model name
+    
+    Returns:
+        str: Gemini model name
+    """
+    return os.getenv("GEMINI_MODEL", DEFAULT_MODEL_NAME)
+
 def get_gemini_model():
     """
     Get configured Gemini model
     
     Returns:
-        GenerativeModel: Gemini model instance
+        GenerativeModel: Shared Gemini model instance from the registry
     """
-    model_name = os.getenv("GEMINI_MODEL", "gemini-2.0-pro-exp-02-05")
-    
-    # Get model with appropriate settings
-    model = genai.GenerativeModel(
-        model_name,
-        generation_config={
-            "temperature": 0,  # Lower temperature for more deterministic responses
-            "top_p": 0.95,
-            "top_k": 0,
-        }
-    )
-    
-    return model
+    return get_registry().get_model(get_model_name())
 
 def get_extraction_prompt() -> str:
     """
@@ -55,22 +50,23 @@ def get_extraction_prompt() -> str:
     Returns:
         str: Extraction prompt
     """
-    prompt_path = os.getenv("PROMPT_PATH", "prompt.txt")
-    try:
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            prompt = f.read()
-        logger.info(f"Successfully loaded prompt from {prompt_path}")
-        return prompt
-    except Exception as e:
-        logger.error(f"Failed to load prompt from {prompt_path}: {str(e)}")
-        return """Bạn là một trợ lý AI chuyên trích xuất thông tin từ hình ảnh phiếu chăm sóc bệnh nhân..."""
+    return get_registry().get_prompt("extraction").text
+
+def get_extraction_prompt_version() -> PromptVersion:
+    """
+    Get the active revision of the extraction prompt
+    
+    Returns:
+        PromptVersion: Prompt text with its hash and version
+    """
+    return get_registry().get_prompt("extraction")
 
-def call_gemini_api(contents: List[Dict], request_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+def parse_response_text(response_text: str, request_id: str) -> Tuple[Optional[Dict], Optional[str]]:
     """
-    Call Gemini API with the provided contents
+    Parse the JSON document out of the model's response text
     
     Args:
-        contents: Request contents
+        response_text: Full text returned by the model
         request_id: Request ID for logging
         
     Returns:
@@ -78,34 +74,28 @@ def call_gemini_api(contents: List[Dict], request_id: str) -> Tuple[Optional[Dic
             - Dict: Parsed JSON result if successful
             - str: Error message if failed
     """
-    start_time = time.time()
-    model = get_gemini_model()
-    
-    try:
-        logger.info(f"[{request_id}] Calling Gemini API")
-        response = model.generate_content(contents)
-        
-        # Extract response text
-        response_text = response.text
-        
-        # Try to extract JSON from response
-        json_str = extract_json_from_text(response_text)
-        
-        # Parse JSON
+    # Fast path: the object usually spans from the first '{' to the last '}'
+    start = response_text.find("{")
+    end = response_text.rfind("}") + 1
+    if start != -1 and end > start:
         try:
-            result = json.loads(json_str)
-            
-            # Log success
-            processing_time = time.time() - start_time
-            logger.info(f"[{request_id}] Gemini API call successful in {processing_time:.2f}s")
-            
-            return result, None
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"[{request_id}] Failed to parse JSON: {str(e)}")
-            return None, f"Failed to parse Gemini response as JSON: {str(e)}. Response text: {response_text[:500]}..."
+            return jsonlib.loads(response_text[start:end]), None
+        except jsonlib.JSONDecodeError:
+            pass
     
-    except Exception as e:
-        processing_time = time.time() - start_time
-        logger.error(f"[{request_id}] Gemini API call failed after {processing_time:.2f}s: {str(e)}")
-        return None, f"Gemini API call failed: {str(e)}"
\ No newline at end of file
+    # Otherwise locate the first balanced object in a single pass
+    start, end, complete = scan_json_object(response_text)
+    if start != -1 and not complete:
+        logger.error("[%s] Model output ended inside the JSON object", request_id)
+        return None, (
+            f"Gemini response was truncated before the JSON object was complete. "
+            f"Response text ends with: ...{response_text[-200:]}"
+        )
+    json_str = response_text[start:end] if start != -1 else extract_json_from_text(response_text)
+    
+    # Parse JSON
+    try:
+        return jsonlib.loads(json_str), None
+    except jsonlib.JSONDecodeError as e:
+        logger.error("[%s] Failed to parse JSON: %s", request_id, e)
+        return None, f"Failed to parse Gemini response as JSON: {str(e)}. Response text: {response_text[:500]}..."
@@ -0,0 +1,90 @@
+# services/image_pool.py
+import os
+import asyncio
+import logging
+import functools
+import concurrent.futures
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("patient-care-api")
+
+class ImageWorkerPool:
+    """
+    Long-lived executor for CPU-bound image work, shared by all requests
+
+    Thread mode suits Pillow and NumPy, which release the GIL in their inner
+    loops. Process mode sidesteps the GIL entirely, at the cost of pickling
+    pixels across the process boundary, so only functions that take and
+    return plain data should be sent to it.
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None):
+        if mode not in ("thread", "process"):
+            raise ValueError("IMAGE_WORKER_MODE must be 'thread' or 'process'")
+        self.mode = mode
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        if mode == "process":
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="image-worker"
+            )
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a function on the pool without blocking the event loop
+
+        Args:
+            fn: Function to run; picklable with its arguments in process mode
+            *args: Positional arguments
+            **kwargs: Keyword arguments
+
+        Returns:
+            Any: Return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the workers
+
+        Args:
+            wait: Wait for running tasks to finish
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+_image_pool: Optional[ImageWorkerPool] = None
+
+def start_image_pool() -> ImageWorkerPool:
+    """
+    Create the process-wide image pool, normally once at startup
+
+    Returns:
+        ImageWorkerPool: Shared pool
+    """
+    global _image_pool
+    if _image_pool is None:
+        workers = os.getenv("IMAGE_WORKERS")
+        _image_pool = ImageWorkerPool(
+            mode=os.getenv("IMAGE_WORKER_MODE", "thread").lower(),
+            max_workers=int(workers) if workers else None
+        )
+        logger.info("Started image pool: mode=%s, workers=%s", _image_pool.mode, _image_pool.max_workers)
+    return _image_pool
+
+def get_image_pool() -> ImageWorkerPool:
+    """
+    Get the process-wide image pool, creating it if startup has not run
+
+    Returns:
+        ImageWorkerPool: Shared pool
+    """
+    return _image_pool or start_image_pool()
+
+def stop_image_pool():
+    """Shut the image pool down, waiting for running tasks"""
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown()
+        _image_pool = None
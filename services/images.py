@@ -0,0 +1,77 @@
+# services/images.py
+import io
+import mmap
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from PIL import Image
+
+logger = logging.getLogger("patient-care-api")
+
+@dataclass
+class ImageEnvelope:
+    """
+    An uploaded image, decoded once and carried through the whole pipeline
+
+    Validation, duplicate detection, preprocessing and encoding all read from
+    this object instead of parsing the raw bytes again. `data` is a read-only
+    memory map for uploads spooled to disk.
+    """
+    data: bytes
+    image: Optional[Image.Image]
+    format: str
+    size: Tuple[int, int]
+    sha256: str
+    exif: Optional[Image.Exif] = None
+    filename: Optional[str] = None
+    dhash: Optional[int] = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes, filename: Optional[str] = None) -> "ImageEnvelope":
+        """
+        Decode uploaded bytes into an envelope
+
+        Args:
+            data: Raw image bytes, or a memory map of them
+            filename: Original upload file name
+
+        Returns:
+            ImageEnvelope: Decoded image with its metadata
+
+        Raises:
+            Exception: If the bytes are not a decodable image
+        """
+        if isinstance(data, mmap.mmap):
+            # Decode from the mapping instead of copying it into a BytesIO
+            data.seek(0)
+            image = Image.open(data)
+        else:
+            image = Image.open(io.BytesIO(data))
+        image.load()
+
+        return cls(
+            data=data,
+            image=image,
+            format=image.format or "JPEG",
+            size=image.size,
+            sha256=hashlib.sha256(data).hexdigest(),
+            exif=image.getexif(),
+            filename=filename
+        )
+
+    @property
+    def mime_type(self) -> str:
+        """MIME type of the original upload"""
+        return Image.MIME.get(self.format, f"image/{self.format.lower()}")
+
+    @property
+    def byte_size(self) -> int:
+        """Size of the original upload in bytes"""
+        return len(self.data)
+
+    def release(self):
+        """Drop the decoded pixels once they are no longer needed"""
+        if self.image is not None:
+            self.image.close()
+            self.image = None
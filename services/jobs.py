@@ -0,0 +1,579 @@
+# services/jobs.py
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import ipaddress
+import asyncio
+import logging
+import threading
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from services.shared_state import get_shared_store, get_worker_id, live_worker_ids
+from utils.errors import ErrorType, get_error_message
+
+logger = logging.getLogger("patient-care-api")
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Results worth another attempt later: SERVICE_BUSY and UPSTREAM_UNAVAILABLE
+TRANSIENT_STATUS_CODES = (429, 503)
+
+# Runs one extraction: (uploads, request_id, timestamp) -> (status_code, content, headers)
+JobHandler = Callable[[List[Tuple[Optional[str], bytes]], str, str], Awaitable[Tuple[int, Dict[str, Any], Dict[str, str]]]]
+
+class JobStore:
+    """
+    Durable SQLite store of extraction jobs and their images
+
+    Images are kept until the job finishes, so queued work survives restarts.
+    Each running job records the worker that claimed it; jobs whose worker
+    is gone are requeued by `recover`, while jobs of live workers sharing
+    the file are left alone. Jobs requeued after a transient error are not
+    claimed again before their `run_after` time.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, callback_url TEXT, filenames TEXT NOT NULL, "
+            "status_code INTEGER, result TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "callback_status TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        if "run_after" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN run_after REAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_images ("
+            "job_id TEXT NOT NULL, position INTEGER NOT NULL, data BLOB NOT NULL, "
+            "PRIMARY KEY (job_id, position))"
+        )
+
+    def recover(self, live_owners: Set[str]) -> int:
+        """
+        Requeue running jobs whose worker has stopped
+
+        Args:
+            live_owners: IDs of the workers still running; their jobs are kept
+
+        Returns:
+            int: Number of requeued jobs
+        """
+        owners = list(live_owners)
+        placeholders = ", ".join("?" for _ in owners)
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, owner = NULL "
+                f"WHERE status = ? AND (owner IS NULL OR owner NOT IN ({placeholders}))",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, *owners)
+            )
+            return cursor.rowcount
+
+    def release_owned(self, owner: str) -> int:
+        """
+        Requeue the running jobs of a worker that is shutting down
+
+        The interrupted attempt is not counted, so rolling restarts cannot
+        push a healthy job past the attempt limit.
+
+        Args:
+            owner: Worker ID
+
+        Returns:
+            int: Number of requeued jobs
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, owner = NULL, attempts = MAX(attempts - 1, 0) "
+                "WHERE status = ? AND owner = ?",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, owner)
+            )
+            return cursor.rowcount
+
+    def create(self, uploads: List[Tuple[Optional[str], bytes]], callback_url: Optional[str] = None) -> str:
+        """
+        Store a new job and its images
+
+        Args:
+            uploads: (filename, content) of each image, front side first
+            callback_url: URL notified when the job finishes
+
+        Returns:
+            str: Job ID
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        filenames = json.dumps([filename for filename, _ in uploads])
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO jobs (id, status, created_at, updated_at, callback_url, filenames) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, JOB_QUEUED, now, now, callback_url, filenames)
+                )
+                self._db.executemany(
+                    "INSERT INTO job_images (job_id, position, data) VALUES (?, ?, ?)",
+                    [(job_id, position, content) for position, (_, content) in enumerate(uploads)]
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        return job_id
+
+    def claim_next(self, owner: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move the oldest queued job that is due to running
+
+        Args:
+            owner: ID of the claiming worker
+
+        Returns:
+            Dict: Claimed job with its uploads, or None if the queue is empty
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND (run_after IS NULL OR run_after <= ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (JOB_QUEUED, time.time())
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, attempts = attempts + 1, owner = ? WHERE id = ?",
+                    (JOB_RUNNING, time.time(), owner, row["id"])
+                )
+                images = self._db.execute(
+                    "SELECT data FROM job_images WHERE job_id = ? ORDER BY position", (row["id"],)
+                ).fetchall()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        job = dict(row)
+        filenames = json.loads(job["filenames"])
+        job["uploads"] = [(filename, image["data"]) for filename, image in zip(filenames, images)]
+        return job
+
+    def complete(self, job_id: str, status_code: int, content: Dict[str, Any]):
+        """
+        Store the result of a job and drop its images
+
+        Args:
+            job_id: Job ID
+            status_code: HTTP status code of the extraction result
+            content: Response body of the extraction
+        """
+        status = JOB_COMPLETED if status_code == 200 else JOB_FAILED
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, status_code = ?, result = ? WHERE id = ?",
+                    (status, time.time(), status_code, json.dumps(content, ensure_ascii=False), job_id)
+                )
+                self._db.execute("DELETE FROM job_images WHERE job_id = ?", (job_id,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def requeue(self, job_id: str, delay: float, status_code: int, content: Dict[str, Any]):
+        """
+        Put a job back in the queue after a transient error, keeping its images
+
+        Args:
+            job_id: Job ID
+            delay: Seconds before the job may be claimed again
+            status_code: HTTP status code of the failed attempt
+            content: Response body of the failed attempt, kept until the next one
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, owner = NULL, run_after = ?, "
+                "status_code = ?, result = ? WHERE id = ? AND status = ?",
+                (JOB_QUEUED, now, now + delay, status_code, json.dumps(content, ensure_ascii=False), job_id, JOB_RUNNING)
+            )
+
+    def set_callback_status(self, job_id: str, callback_status: str):
+        """
+        Record the outcome of the completion callback
+
+        Args:
+            job_id: Job ID
+            callback_status: Short description of the callback outcome
+        """
+        with self._lock:
+            self._db.execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Dict: Job status and result, or None if unknown
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, created_at, updated_at, status_code, result, attempts, callback_status "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "created_at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+            "updated_at": datetime.fromtimestamp(row["updated_at"]).isoformat(),
+            "status_code": row["status_code"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "attempts": row["attempts"],
+            "callback_status": row["callback_status"]
+        }
+
+    def queue_depth(self) -> int:
+        """
+        Count jobs waiting to run
+
+        Returns:
+            int: Number of queued jobs
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (JOB_QUEUED,)).fetchone()[0]
+
+class JobWorkerPool:
+    """
+    Fixed-size pool of asyncio workers that drain the job store
+
+    A job that ends in a transient error (busy or unavailable upstream) or
+    crashes its worker is requeued with exponential backoff. After
+    `max_attempts` claims it fails for good, so a poison job cannot loop
+    forever.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: JobHandler,
+        size: int,
+        poll_interval: float = 1.0,
+        recover_interval: float = 30.0,
+        max_attempts: int = 5,
+        retry_delay: float = 5.0,
+        retry_max_delay: float = 300.0
+    ):
+        self.store = store
+        self.handler = handler
+        self.size = size
+        self.poll_interval = poll_interval
+        self.recover_interval = recover_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self._last_recover = 0.0
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        """Requeue interrupted jobs and start the workers"""
+        self._recover()
+
+        self._workers = [asyncio.create_task(self._work(i)) for i in range(self.size)]
+        logger.info("Started %d job workers", self.size)
+
+    async def stop(self):
+        """Stop the workers; a job that is cut short is requeued on the next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Hand cut-short jobs back now rather than when this worker is found dead
+        released = await asyncio.to_thread(self.store.release_owned, get_worker_id())
+        if released:
+            logger.info("Requeued %d jobs interrupted by shutdown", released)
+
+    def notify(self):
+        """Wake idle workers after a job is submitted"""
+        self._wakeup.set()
+
+    async def _work(self, worker_index: int):
+        """Claim and run jobs until cancelled"""
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim_next, get_worker_id())
+            except Exception as e:
+                logger.error("Job worker %d failed to claim a job: %s", worker_index, e)
+                job = None
+
+            if job is None:
+                if (worker_index == 0 and get_shared_store() is not None
+                        and time.monotonic() - self._last_recover >= self.recover_interval):
+                    # Pick up jobs of workers that died while this one keeps running
+                    await asyncio.to_thread(self._recover)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error("[%s] Job worker %d failed: %s", job['id'], worker_index, e, exc_info=True)
+                content = _job_error_content(job["id"], f"Job worker failed: {str(e)}")
+                try:
+                    await self._retry_or_fail(job, 500, content, {}, transient=True)
+                except Exception as store_error:
+                    logger.error("[%s] Failed to requeue job: %s", job['id'], store_error)
+
+    def _recover(self):
+        """Requeue running jobs whose worker is no longer alive"""
+        self._last_recover = time.monotonic()
+        try:
+            recovered = self.store.recover(live_worker_ids())
+        except Exception as e:
+            logger.error("Failed to recover interrupted jobs: %s", e)
+            return
+        if recovered:
+            logger.info("Requeued %d interrupted jobs", recovered)
+
+    async def _run(self, job: Dict[str, Any]):
+        """Run one claimed job, then store its result or requeue it"""
+        job_id = job["id"]
+        attempt = job["attempts"] + 1
+        if attempt > self.max_attempts:
+            # Claimed too often without finishing, e.g. it keeps taking its worker down
+            logger.error("[%s] Job gave up after %d attempts", job_id, job['attempts'])
+            content = _job_error_content(job_id, f"Job did not finish after {job['attempts']} attempts")
+            await self._finish(job, 500, content)
+            return
+
+        logger.info("[%s] Running job (attempt %d/%d)", job_id, attempt, self.max_attempts)
+        timestamp = datetime.now().isoformat()
+
+        status_code, content, headers = await self.handler(job["uploads"], job_id, timestamp)
+        await self._retry_or_fail(job, status_code, content, headers, status_code in TRANSIENT_STATUS_CODES)
+
+    async def _retry_or_fail(
+        self,
+        job: Dict[str, Any],
+        status_code: int,
+        content: Dict[str, Any],
+        headers: Dict[str, str],
+        transient: bool
+    ):
+        """Requeue a transient failure while attempts remain, otherwise store the result"""
+        attempt = job["attempts"] + 1
+        if transient and attempt < self.max_attempts:
+            delay = self._retry_delay(attempt, headers.get("Retry-After"))
+            await asyncio.to_thread(self.store.requeue, job["id"], delay, status_code, content)
+            logger.warning(
+                "[%s] Job attempt %d/%d ended with status %d, retrying in %.0fs",
+                job['id'], attempt, self.max_attempts, status_code, delay
+            )
+            return
+        await self._finish(job, status_code, content)
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Exponential backoff with jitter, at least the upstream's Retry-After"""
+        delay = min(self.retry_max_delay, self.retry_delay * 2 ** (attempt - 1))
+        try:
+            delay = max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            pass
+        # Spread out jobs that failed together in one saturation spike
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _finish(self, job: Dict[str, Any], status_code: int, content: Dict[str, Any]):
+        """Store the final result of a job and notify the callback URL"""
+        job_id = job["id"]
+        await asyncio.to_thread(self.store.complete, job_id, status_code, content)
+        logger.info("[%s] Job finished with status %d", job_id, status_code)
+
+        if job["callback_url"]:
+            payload = {"job_id": job_id, "status_code": status_code, "result": content}
+            callback_status = await asyncio.to_thread(_post_callback, job["callback_url"], payload, job_id)
+            await asyncio.to_thread(self.store.set_callback_status, job_id, callback_status)
+
+def _job_error_content(job_id: str, message: str) -> Dict[str, Any]:
+    """Build an error result, in the shape of ErrorResponse, for a job that could not run"""
+    return {
+        "request_id": job_id,
+        "timestamp": datetime.now().isoformat(),
+        "status": "error",
+        "error": {
+            "type": ErrorType.PROCESSING_ERROR,
+            "message": get_error_message(ErrorType.PROCESSING_ERROR, message),
+            "details": {}
+        }
+    }
+
+def check_callback_url(url: str):
+    """
+    Refuse callback URLs that could reach internal services
+
+    Hosts listed in JOB_CALLBACK_ALLOWED_HOSTS are accepted as they are, so
+    an internal receiver can be allowed explicitly. Any other host must
+    resolve only to public addresses.
+
+    Args:
+        url: Callback URL
+
+    Raises:
+        ValueError: If the URL is not an allowed http(s) URL
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+
+    host = parsed.hostname.lower()
+    allowed_hosts = {
+        allowed.strip().lower()
+        for allowed in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",")
+        if allowed.strip()
+    }
+    if host in allowed_hosts:
+        return
+    if allowed_hosts:
+        raise ValueError(f"callback_url host {host} is not in JOB_CALLBACK_ALLOWED_HOSTS")
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"callback_url host {host} cannot be resolved: {e}")
+    for address in addresses:
+        # Drop an IPv6 zone such as %eth0 before parsing
+        if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Refuse redirects, which could send the result to a host that was never checked"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+def _post_callback(url: str, payload: Dict[str, Any], job_id: str) -> str:
+    """
+    POST a finished job to its callback URL
+
+    The URL is checked again before sending, since its host may resolve
+    differently than when the job was submitted. Redirects are not followed.
+
+    Args:
+        url: Callback URL
+        payload: JSON body
+        job_id: Job ID for logging
+
+    Returns:
+        str: Callback outcome, e.g. "200" or "error: ..."
+    """
+    try:
+        check_callback_url(url)
+    except ValueError as e:
+        logger.warning("[%s] Callback refused: %s", job_id, e)
+        return f"refused: {e}"
+
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        timeout = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+        with _callback_opener.open(request, timeout=timeout) as response:
+            return str(response.status)
+    except Exception as e:
+        logger.warning("[%s] Callback to %s failed: %s", job_id, url, e)
+        return f"error: {str(e)}"
+
+_job_store: Optional[JobStore] = None
+_job_pool: Optional[JobWorkerPool] = None
+
+def get_job_store() -> JobStore:
+    """
+    Get the process-wide job store
+
+    Returns:
+        JobStore: Store opened from JOBS_DB_PATH
+    """
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(os.getenv("JOBS_DB_PATH", "jobs/jobs.db"))
+    return _job_store
+
+def start_job_workers(handler: JobHandler) -> JobWorkerPool:
+    """
+    Start the job worker pool
+
+    Args:
+        handler: Coroutine that runs one extraction
+
+    Returns:
+        JobWorkerPool: Running pool
+    """
+    global _job_pool
+    _job_pool = JobWorkerPool(
+        store=get_job_store(),
+        handler=handler,
+        size=int(os.getenv("JOB_WORKERS", "2")),
+        poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "1")),
+        recover_interval=float(os.getenv("JOB_RECOVER_INTERVAL", "30")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5")),
+        retry_delay=float(os.getenv("JOB_RETRY_DELAY", "5")),
+        retry_max_delay=float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+    )
+    _job_pool.start()
+    return _job_pool
+
+async def stop_job_workers():
+    """Stop the job worker pool if it is running"""
+    global _job_pool
+    if _job_pool is not None:
+        await _job_pool.stop()
+        _job_pool = None
+
+def notify_job_workers():
+    """Wake the job workers after a submission"""
+    if _job_pool is not None:
+        _job_pool.notify()
@@ -0,0 +1,359 @@
+# services/limiter.py
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from services.shared_state import SharedStateStore, get_shared_store, get_worker_id
+
+logger = logging.getLogger("patient-care-api")
+
+class UpstreamBusyError(Exception):
+    """Raised when no upstream slot can be obtained in time"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ConcurrencyLimiter:
+    """
+    Bounded in-flight limiter for upstream calls
+
+    At most `max_concurrency` calls run at once, at most `max_queue` callers
+    wait for a slot, and a waiter gives up after `queue_timeout` seconds.
+    Callers beyond the queue bound are rejected immediately. Background
+    callers stay outside the bounded queue: they take a slot only when no
+    queued caller wants it, and wait as long as their own deadline allows.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int,
+        poll_interval: float = 0.05
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._released = asyncio.Event()
+        self._in_flight = 0
+        self._waiting = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of upstream calls currently running"""
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers waiting for a slot"""
+        return self._waiting
+
+    async def is_saturated(self) -> bool:
+        """
+        Check whether a new caller would be rejected right now
+
+        Returns:
+            bool: True if all slots are taken and the wait queue is full
+        """
+        return self._in_flight >= self.max_concurrency and self._waiting >= self.max_queue
+
+    async def acquire(self):
+        """
+        Acquire an upstream slot
+
+        Raises:
+            UpstreamBusyError: If the wait queue is full or the wait times out
+        """
+        if not self._semaphore.locked():
+            # A slot is free, so this completes without suspending
+            await self._semaphore.acquire()
+        else:
+            if self._waiting >= self.max_queue:
+                raise UpstreamBusyError(
+                    f"Upstream queue is full ({self._in_flight} in flight, {self._waiting} waiting)",
+                    self.retry_after
+                )
+
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise UpstreamBusyError(
+                    f"Timed out after {self.queue_timeout:g}s waiting for an upstream slot",
+                    self.retry_after
+                )
+            finally:
+                self._waiting -= 1
+
+        self._in_flight += 1
+
+    async def acquire_background(self, timeout: float):
+        """
+        Acquire an upstream slot behind every queued caller
+
+        The caller is never rejected for a full queue; it polls for a slot
+        no queued caller is waiting for, and is woken early when a slot in
+        this process is released.
+
+        Args:
+            timeout: Seconds to wait at most
+
+        Raises:
+            UpstreamBusyError: If no slot frees up in time
+        """
+        deadline = time.monotonic() + timeout
+        while not await self.try_acquire():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise UpstreamBusyError(
+                    f"Timed out after {timeout:g}s waiting for an upstream slot",
+                    self.retry_after
+                )
+            self._released.clear()
+            try:
+                await asyncio.wait_for(
+                    self._released.wait(),
+                    timeout=min(remaining, self.poll_interval * random.uniform(0.5, 1.5))
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def try_acquire(self) -> bool:
+        """
+        Acquire an upstream slot only if one is free and no queued caller wants it
+
+        Returns:
+            bool: True if a slot was acquired
+        """
+        if self._semaphore.locked():
+            return False
+        await self._semaphore.acquire()
+        self._in_flight += 1
+        return True
+
+    async def release(self):
+        """Release a previously acquired upstream slot"""
+        self._in_flight -= 1
+        self._semaphore.release()
+        self._released.set()
+
+    @asynccontextmanager
+    async def slot(self, background_timeout: Optional[float] = None):
+        """
+        Hold an upstream slot for the duration of the block
+
+        Args:
+            background_timeout: Wait as a background caller for up to this many
+                seconds, instead of in the bounded queue
+        """
+        if background_timeout is None:
+            await self.acquire()
+        else:
+            await self.acquire_background(background_timeout)
+        try:
+            yield
+        finally:
+            await self.release()
+
+class SharedConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    ConcurrencyLimiter whose slots and wait queue are shared by all worker processes
+
+    Slots and waiters are rows in the shared state store, so the limits hold
+    for the whole host however many workers serve requests. Waiters poll for
+    a free slot with a short jittered interval and are woken at once when a
+    slot is released in the same process; the wait is not strictly FIFO.
+    Store access from coroutines runs in a thread, since a transaction can
+    wait on other workers for up to the busy timeout.
+    """
+
+    def __init__(
+        self,
+        store: SharedStateStore,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int,
+        poll_interval: float = 0.05
+    ):
+        super().__init__(max_concurrency, max_queue, queue_timeout, retry_after, poll_interval)
+        self.store = store
+        self.name = name
+        self._holders: List[str] = []
+
+    @property
+    def in_flight(self) -> int:
+        """Number of upstream calls currently running in all workers"""
+        return self.store.query("SELECT COUNT(*) FROM leases WHERE name = ?", (self.name,))[0][0]
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers waiting for a slot in all workers"""
+        return self.store.query("SELECT COUNT(*) FROM waiters WHERE name = ?", (self.name,))[0][0]
+
+    async def is_saturated(self) -> bool:
+        """
+        Check whether a new caller would be rejected right now
+
+        Returns:
+            bool: True if all slots are taken and the wait queue is full
+        """
+        return await asyncio.to_thread(
+            lambda: self.in_flight >= self.max_concurrency and self.waiting >= self.max_queue
+        )
+
+    async def acquire(self):
+        """
+        Acquire an upstream slot
+
+        Raises:
+            UpstreamBusyError: If the wait queue is full or the wait times out
+        """
+        holder = uuid.uuid4().hex
+        outcome = await self._take_async(holder, True)
+
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while outcome != "acquired":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise UpstreamBusyError(
+                        f"Timed out after {self.queue_timeout:g}s waiting for an upstream slot",
+                        self.retry_after
+                    )
+                self._released.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._released.wait(),
+                        timeout=min(remaining, self.poll_interval * random.uniform(0.5, 1.5))
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                outcome = await self._take_async(holder, True)
+        except BaseException:
+            if outcome != "acquired":
+                await asyncio.shield(asyncio.to_thread(self._forget, holder))
+            raise
+
+        self._holders.append(holder)
+
+    async def try_acquire(self) -> bool:
+        """
+        Acquire an upstream slot only if one is free right now
+
+        Returns:
+            bool: True if a slot was acquired
+        """
+        holder = uuid.uuid4().hex
+        if await self._take_async(holder, False) != "acquired":
+            return False
+        self._holders.append(holder)
+        return True
+
+    async def release(self):
+        """Release a slot previously acquired by this process"""
+        holder = self._holders.pop()
+        # Shielded, so a cancelled caller still gives its slot back
+        await asyncio.shield(asyncio.to_thread(self._forget, holder))
+        self._released.set()
+
+    async def _take_async(self, holder: str, queue: bool) -> str:
+        """Run _take off the event loop; if the caller is cancelled, undo whatever it took"""
+        task = asyncio.ensure_future(asyncio.to_thread(self._take, holder, queue))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            task.add_done_callback(
+                lambda _: asyncio.get_running_loop().run_in_executor(None, self._forget, holder)
+            )
+            raise
+
+    def _take(self, holder: str, queue: bool) -> str:
+        """
+        Take a free slot, or join the wait queue
+
+        Without `queue`, a free slot is only taken while nobody is queued.
+
+        Returns:
+            str: "acquired", "queued", or "full" when there is no free slot and `queue` is not set
+
+        Raises:
+            UpstreamBusyError: If `queue` is set and the wait queue is full
+        """
+        with self.store.transaction() as db:
+            in_flight = db.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (self.name,)).fetchone()[0]
+            free = in_flight < self.max_concurrency
+            if free and not queue:
+                # Leave the slot to a queued caller, who will poll for it shortly
+                free = db.execute("SELECT 1 FROM waiters WHERE name = ? LIMIT 1", (self.name,)).fetchone() is None
+            if free:
+                db.execute(
+                    "INSERT INTO leases (name, holder, worker_id, acquired_at) VALUES (?, ?, ?, ?)",
+                    (self.name, holder, get_worker_id(), time.time())
+                )
+                db.execute("DELETE FROM waiters WHERE holder = ?", (holder,))
+                return "acquired"
+            if not queue:
+                return "full"
+
+            if db.execute("SELECT 1 FROM waiters WHERE holder = ?", (holder,)).fetchone():
+                return "queued"
+            waiting = db.execute("SELECT COUNT(*) FROM waiters WHERE name = ?", (self.name,)).fetchone()[0]
+            if waiting >= self.max_queue:
+                # Raised here, with the counts this transaction saw, rather than queried again on the loop
+                raise UpstreamBusyError(
+                    f"Upstream queue is full ({in_flight} in flight, {waiting} waiting)",
+                    self.retry_after
+                )
+            db.execute(
+                "INSERT INTO waiters (name, holder, worker_id, queued_at) VALUES (?, ?, ?, ?)",
+                (self.name, holder, get_worker_id(), time.time())
+            )
+            return "queued"
+
+    def _forget(self, holder: str):
+        """Drop the slot or the place in the queue of a caller that gave up"""
+        with self.store.transaction() as db:
+            db.execute("DELETE FROM leases WHERE holder = ?", (holder,))
+            db.execute("DELETE FROM waiters WHERE holder = ?", (holder,))
+
+_upstream_limiter: Optional[ConcurrencyLimiter] = None
+
+def get_upstream_limiter() -> ConcurrencyLimiter:
+    """
+    Get the process-wide limiter for upstream Gemini calls
+
+    Returns:
+        ConcurrencyLimiter: Shared limiter configured from environment variables
+    """
+    global _upstream_limiter
+    if _upstream_limiter is None:
+        settings = dict(
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT", "30")),
+            retry_after=int(os.getenv("GEMINI_RETRY_AFTER", "5"))
+        )
+        store = get_shared_store()
+        if store is not None:
+            # One budget for every worker process on the host
+            _upstream_limiter = SharedConcurrencyLimiter(store, "upstream", **settings)
+        else:
+            _upstream_limiter = ConcurrencyLimiter(**settings)
+        logger.info(
+            "Upstream limiter configured: max_concurrency=%d, max_queue=%d, queue_timeout=%ss, shared=%s",
+            _upstream_limiter.max_concurrency, _upstream_limiter.max_queue, _upstream_limiter.queue_timeout,
+            store is not None
+        )
+    return _upstream_limiter
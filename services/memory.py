@@ -0,0 +1,51 @@
+# services/memory.py
+import os
+import logging
+import tracemalloc
+from typing import Optional, Tuple
+
+logger = logging.getLogger("patient-care-api")
+
+def memory_profiling_enabled() -> bool:
+    """
+    Check whether per-stage memory accounting is switched on
+
+    Returns:
+        bool: True if MEMORY_PROFILE_ENABLED is "true"
+    """
+    return os.getenv("MEMORY_PROFILE_ENABLED", "false").lower() == "true"
+
+def start_memory_profiling():
+    """
+    Start tracing Python allocations if memory accounting is enabled
+
+    Tracing slows every allocation down, so it is meant for sizing runs
+    rather than for production traffic.
+    """
+    if not memory_profiling_enabled() or tracemalloc.is_tracing():
+        return
+    tracemalloc.start(int(os.getenv("MEMORY_PROFILE_FRAMES", "1")))
+    logger.info("Memory accounting enabled, tracing Python allocations")
+
+def stop_memory_profiling():
+    """Stop tracing Python allocations"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def sample_memory() -> Optional[Tuple[int, int]]:
+    """
+    Read traced memory and start a new peak window
+
+    Traced memory is process-wide: with one request in flight the peak
+    belongs to that request, under concurrency it covers all of them.
+    Buffers Pillow allocates for decoded pixels are not traced; the bytes
+    and numpy arrays around them are.
+
+    Returns:
+        Tuple: (current, peak) bytes since the last sample, or None if not tracing
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    return current, peak
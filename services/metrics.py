@@ -0,0 +1,271 @@
+# services/metrics.py
+import os
+import logging
+from typing import Callable, Dict, Optional, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger("patient-care-api")
+
+# Stage buckets span sub-millisecond checks up to multi-second upstream calls
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+REQUEST_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120, 300)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 524288, 1048576, 2097152, 4194304, 8388608, 16777216, 33554432)
+
+STAGE_SECONDS = Histogram(
+    "extraction_stage_seconds",
+    "Time spent in each extraction pipeline stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+STAGE_PEAK_BYTES = Histogram(
+    "extraction_stage_peak_memory_bytes",
+    "Peak traced Python memory above the stage's starting point, when memory accounting is enabled",
+    ["stage"],
+    buckets=BYTE_BUCKETS + (67108864, 134217728, 268435456)
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration until the response is fully sent",
+    ["method", "handler", "status"],
+    buckets=REQUEST_BUCKETS
+)
+
+HTTP_REQUEST_BYTES = Histogram(
+    "http_request_size_bytes",
+    "HTTP request body size",
+    ["method", "handler"],
+    buckets=BYTE_BUCKETS
+)
+
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size",
+    ["method", "handler"],
+    buckets=BYTE_BUCKETS
+)
+
+# Summed over the live workers in multiprocess mode
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", multiprocess_mode="livesum"
+)
+
+UPSTREAM_PAYLOAD_BYTES = Histogram(
+    "upstream_payload_bytes",
+    "Image bytes per extraction: uploaded, sent, and sent as the original upload",
+    ["kind"],
+    buckets=BYTE_BUCKETS
+)
+
+SCHEDULE_WAIT_SECONDS = Histogram(
+    "upstream_schedule_wait_seconds",
+    "Time spent waiting for the upstream rate budget, by traffic class",
+    ["priority"],
+    buckets=STAGE_BUCKETS
+)
+
+UPSTREAM_ESTIMATED_TOKENS = Counter(
+    "upstream_estimated_tokens_total",
+    "Estimated input tokens of admitted upstream requests, by traffic class",
+    ["priority"]
+)
+
+class QueueGaugeCollector:
+    """
+    Gauges read from their sources at scrape time
+
+    The sources (limiter, scheduler, job store) already hold host-wide
+    values when workers share state, so they are read directly instead of
+    going through per-process gauge files, which cannot hold callbacks.
+    Sources of labelled gauges return a dict of label value to gauge value.
+    """
+
+    GAUGES = {
+        "upstream_requests_in_flight": "Upstream calls currently holding a limiter slot",
+        "upstream_queue_depth": "Callers waiting for an upstream limiter slot",
+        "job_queue_depth": "Extraction jobs waiting for a worker"
+    }
+
+    LABELLED_GAUGES = {
+        "upstream_predicted_wait_seconds": (
+            "Predicted wait for the upstream rate budget of a new request, by traffic class", "priority"
+        ),
+        "upstream_schedule_queue_depth": ("Callers waiting for the upstream rate budget, by traffic class", "priority"),
+        "upstream_rate_budget_remaining": ("Quota left in each upstream rate bucket", "bucket")
+    }
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], float]] = {}
+
+    def bind(self, name: str, source: Callable[[], float]):
+        """Set the function that reads a gauge"""
+        self._sources[name] = source
+
+    def describe(self):
+        families = [GaugeMetricFamily(name, documentation) for name, documentation in self.GAUGES.items()]
+        families.extend(
+            GaugeMetricFamily(name, documentation, labels=[label])
+            for name, (documentation, label) in self.LABELLED_GAUGES.items()
+        )
+        return families
+
+    def collect(self):
+        for name, documentation in self.GAUGES.items():
+            source = self._sources.get(name)
+            if source is None:
+                continue
+            try:
+                value = float(source())
+            except Exception as e:
+                logger.warning("Failed to read gauge %s: %s", name, e)
+                value = float("nan")
+            yield GaugeMetricFamily(name, documentation, value=value)
+
+        for name, (documentation, label) in self.LABELLED_GAUGES.items():
+            source = self._sources.get(name)
+            if source is None:
+                continue
+            family = GaugeMetricFamily(name, documentation, labels=[label])
+            try:
+                for label_value, value in source().items():
+                    family.add_metric([label_value], float(value))
+            except Exception as e:
+                logger.warning("Failed to read gauge %s: %s", name, e)
+            yield family
+
+QUEUE_GAUGES = QueueGaugeCollector()
+REGISTRY.register(QUEUE_GAUGES)
+
+UPSTREAM_ATTEMPTS = Counter(
+    "upstream_attempts_total",
+    "Upstream attempts by outcome (success or exception class)",
+    ["outcome"]
+)
+
+QUALITY_CHECK_SECONDS = Histogram(
+    "quality_check_seconds",
+    "Time spent in each check of the local image-quality gate, per image",
+    ["check"],
+    buckets=STAGE_BUCKETS
+)
+
+QUALITY_GATE_FAILURES = Counter(
+    "quality_gate_failures_total",
+    "Images failing a quality gate check; mode \"shadow\" only logged them",
+    ["check", "mode"]
+)
+
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total",
+    "Requests served by joining an identical extraction already in flight"
+)
+
+RESULT_STORE_WRITES = Counter(
+    "result_store_writes_total",
+    "Extraction results handed to the result store, by outcome (written, dropped or failed)",
+    ["outcome"]
+)
+
+EXTRACTION_ERRORS = Counter(
+    "extraction_errors_total",
+    "Extraction requests that ended in an error, by ErrorType",
+    ["error_type"]
+)
+
+def observe_stage(stage: str, seconds: float):
+    """
+    Record the duration of one pipeline stage
+
+    Args:
+        stage: Stage name, e.g. "preprocess" or "upstream"
+        seconds: Elapsed time
+    """
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+def observe_stage_memory(stage: str, peak_bytes: int):
+    """
+    Record the peak memory of one pipeline stage
+
+    Args:
+        stage: Stage name, e.g. "preprocess" or "upstream"
+        peak_bytes: Peak traced bytes above the start of the stage
+    """
+    STAGE_PEAK_BYTES.labels(stage).observe(peak_bytes)
+
+def count_error(error_type: str):
+    """
+    Count an extraction that ended in an error
+
+    Args:
+        error_type: ErrorType of the result
+    """
+    EXTRACTION_ERRORS.labels(str(getattr(error_type, "value", error_type))).inc()
+
+def count_upstream_attempt(outcome: str):
+    """
+    Count one upstream attempt
+
+    Args:
+        outcome: "success" or the exception class name
+    """
+    UPSTREAM_ATTEMPTS.labels(outcome).inc()
+
+def bind_gauges(limiter, scheduler, job_store_getter):
+    """
+    Read queue gauges from their sources at scrape time
+
+    Args:
+        limiter: Upstream ConcurrencyLimiter
+        scheduler: Upstream UpstreamScheduler
+        job_store_getter: Callable returning the JobStore
+    """
+    QUEUE_GAUGES.bind("upstream_requests_in_flight", lambda: limiter.in_flight)
+    QUEUE_GAUGES.bind("upstream_queue_depth", lambda: limiter.waiting)
+    QUEUE_GAUGES.bind(
+        "upstream_predicted_wait_seconds",
+        lambda: {priority: scheduler.predicted_wait(priority) for priority in scheduler.max_wait}
+    )
+    QUEUE_GAUGES.bind(
+        "upstream_schedule_queue_depth",
+        lambda: {priority: scheduler.queue_depth(priority) for priority in scheduler.max_wait}
+    )
+    QUEUE_GAUGES.bind("upstream_rate_budget_remaining", scheduler.budget.remaining)
+    QUEUE_GAUGES.bind("job_queue_depth", lambda: job_store_getter().queue_depth())
+
+def multiprocess_dir() -> Optional[str]:
+    """
+    Get the directory where worker processes write their metric files
+
+    Returns:
+        str: PROMETHEUS_MULTIPROC_DIR, or None in single-process mode
+    """
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format
+
+    In multiprocess mode the counters and histograms of every worker are
+    merged from their metric files, so any worker can answer a scrape.
+
+    Returns:
+        Tuple containing:
+            - bytes: Exposition body
+            - str: Content type
+    """
+    if multiprocess_dir() is None:
+        return generate_latest(), CONTENT_TYPE_LATEST
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(QUEUE_GAUGES)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_worker_dead():
+    """Drop this worker's live gauges from the merged metrics when it exits"""
+    if multiprocess_dir() is not None:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,425 @@
+# services/preprocessing.py
+import io
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+from services.images import ImageEnvelope
+from services.image_pool import ImageWorkerPool
+
+logger = logging.getLogger("patient-care-api")
+
+OUTPUT_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp"
+}
+
+ENHANCE_KERNELS = ("numpy", "pillow")
+
+# Rows per band of the fused kernel; small enough for the band to stay in cache
+ENHANCE_BAND_ROWS = 64
+
+# EXIF tag holding the camera orientation; 1 means upright
+EXIF_ORIENTATION = 0x0112
+
+# Upload formats the upstream accepts as they are
+PASSTHROUGH_FORMATS = ("JPEG", "PNG", "WEBP")
+
+@dataclass(frozen=True)
+class PreprocessProfile:
+    """Settings that control how uploads are turned into the upstream payload"""
+    max_long_edge: int = 2048
+    grayscale: bool = False
+    output_format: str = "JPEG"
+    max_bytes: int = 600 * 1024
+    min_quality: int = 50
+    max_quality: int = 90
+    contrast: float = 1.2
+    sharpness: float = 1.3
+    auto_rotate: bool = True
+    enhance_kernel: str = "numpy"
+
+    @classmethod
+    def from_env(cls) -> "PreprocessProfile":
+        """
+        Build a profile from environment variables
+
+        Returns:
+            PreprocessProfile: Configured profile
+        """
+        output_format = os.getenv("PREPROCESS_FORMAT", cls.output_format).upper()
+        if output_format not in OUTPUT_MIME_TYPES:
+            raise ValueError(f"PREPROCESS_FORMAT must be one of {', '.join(OUTPUT_MIME_TYPES)}")
+
+        enhance_kernel = os.getenv("PREPROCESS_ENHANCE_KERNEL", cls.enhance_kernel).lower()
+        if enhance_kernel not in ENHANCE_KERNELS:
+            raise ValueError(f"PREPROCESS_ENHANCE_KERNEL must be one of {', '.join(ENHANCE_KERNELS)}")
+
+        return cls(
+            max_long_edge=int(os.getenv("PREPROCESS_MAX_LONG_EDGE", str(cls.max_long_edge))),
+            grayscale=os.getenv("PREPROCESS_GRAYSCALE", "false").lower() == "true",
+            output_format=output_format,
+            max_bytes=int(os.getenv("PREPROCESS_MAX_BYTES", str(cls.max_bytes))),
+            min_quality=int(os.getenv("PREPROCESS_MIN_QUALITY", str(cls.min_quality))),
+            max_quality=int(os.getenv("PREPROCESS_MAX_QUALITY", str(cls.max_quality))),
+            contrast=float(os.getenv("PREPROCESS_CONTRAST", str(cls.contrast))),
+            sharpness=float(os.getenv("PREPROCESS_SHARPNESS", str(cls.sharpness))),
+            auto_rotate=os.getenv("PREPROCESS_AUTO_ROTATE", "true").lower() == "true",
+            enhance_kernel=enhance_kernel
+        )
+
+    @property
+    def mime_type(self) -> str:
+        """MIME type of the encoded output"""
+        return OUTPUT_MIME_TYPES[self.output_format]
+
+    def fingerprint(self) -> str:
+        """
+        Get a short digest of the profile, used to keep cache entries per profile
+
+        Returns:
+            str: Hex digest of the profile settings
+        """
+        settings = json.dumps(asdict(self), sort_keys=True)
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+
+@dataclass
+class PreprocessedImage:
+    """Encoded upstream payload for one image"""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    size: Tuple[int, int]
+    quality: Optional[int] = None
+    kept_original: bool = False
+
+    @property
+    def sent_bytes(self) -> int:
+        """Size of the encoded payload in bytes"""
+        return len(self.data)
+
+_profile: Optional[PreprocessProfile] = None
+
+def get_preprocess_profile() -> PreprocessProfile:
+    """
+    Get the process-wide preprocessing profile
+
+    Returns:
+        PreprocessProfile: Profile loaded from environment variables
+    """
+    global _profile
+    if _profile is None:
+        _profile = PreprocessProfile.from_env()
+        logger.info("Preprocessing profile: %s", asdict(_profile))
+    return _profile
+
+def preprocess_image(envelope: ImageEnvelope, profile: PreprocessProfile) -> PreprocessedImage:
+    """
+    Preprocess image to improve quality for extraction and fit the payload budget
+
+    Args:
+        envelope: Decoded upload
+        profile: Preprocessing settings
+
+    Returns:
+        PreprocessedImage: Encoded payload, or the original upload if preprocessing fails
+            or the original is the smaller payload
+    """
+    try:
+        data, quality, size = render_payload(envelope.image, profile)
+    except Exception as e:
+        return _passthrough(envelope, e)
+
+    return _smaller_payload(envelope, profile, data, quality, size)
+
+async def preprocess_images(
+    images: List[ImageEnvelope],
+    profile: PreprocessProfile,
+    pool: ImageWorkerPool
+) -> List[PreprocessedImage]:
+    """
+    Preprocess several images concurrently on the shared image pool
+
+    Only the decoded pixels are sent to the pool, so this also works with a
+    process pool; a failed image falls back to its original upload, and so
+    does one whose original is smaller than the re-encoded payload.
+
+    Args:
+        images: Decoded uploads
+        profile: Preprocessing settings
+        pool: Shared image worker pool
+
+    Returns:
+        List: Encoded payloads, in the order of `images`
+    """
+    outcomes = await asyncio.gather(
+        *(pool.run(render_payload, envelope.image, profile) for envelope in images),
+        return_exceptions=True
+    )
+
+    preprocessed = []
+    for envelope, outcome in zip(images, outcomes):
+        if isinstance(outcome, Exception):
+            preprocessed.append(_passthrough(envelope, outcome))
+            continue
+        data, quality, size = outcome
+        preprocessed.append(_smaller_payload(envelope, profile, data, quality, size))
+    return preprocessed
+
+def render_payload(img: Image.Image, profile: PreprocessProfile) -> Tuple[bytes, int, Tuple[int, int]]:
+    """
+    Turn decoded pixels into the encoded upstream payload
+
+    The image is auto-rotated from EXIF, downscaled to the profile's long edge,
+    optionally converted to grayscale, enhanced, and then encoded at the highest
+    quality that fits `profile.max_bytes`.
+
+    Args:
+        img: Decoded image
+        profile: Preprocessing settings
+
+    Returns:
+        Tuple containing:
+            - bytes: Encoded image
+            - int: Quality used
+            - Tuple: Size of the encoded image
+    """
+    # Apply EXIF orientation so the model sees the form upright
+    if profile.auto_rotate:
+        img = ImageOps.exif_transpose(img)
+
+    # Downscale before enhancing so the filters run on fewer pixels
+    img = _limit_long_edge(img, profile.max_long_edge)
+
+    # Forms are black and white, so colour carries little information
+    target_mode = 'L' if profile.grayscale else 'RGB'
+    if img.mode != target_mode:
+        img = img.convert(target_mode)
+
+    # Enhance contrast slightly, then sharpness
+    if profile.enhance_kernel == "numpy":
+        img = enhance_contrast_sharpness(img, profile.contrast, profile.sharpness)
+    else:
+        img = ImageEnhance.Contrast(img).enhance(profile.contrast)
+        img = ImageEnhance.Sharpness(img).enhance(profile.sharpness)
+
+    data, quality = _encode_within_budget(img, profile)
+
+    # Shrink further if even the lowest quality does not fit
+    attempts = 0
+    while len(data) > profile.max_bytes and attempts < 3:
+        img = img.resize((max(1, img.width * 3 // 4), max(1, img.height * 3 // 4)), Image.LANCZOS)
+        data, quality = _encode_within_budget(img, profile)
+        attempts += 1
+
+    return data, quality, img.size
+
+def enhance_contrast_sharpness(img: Image.Image, contrast: float, sharpness: float) -> Image.Image:
+    """
+    Apply Pillow's Contrast and then Sharpness enhancement in one fused pass
+
+    Both enhancers are blends: Contrast with the mean grey level, Sharpness
+    with the image smoothed by the 3x3 SMOOTH kernel (weights 1, centre 5,
+    sum 13). Since the smoothing is linear, the chain reduces to
+
+        out = a * x + b * kernel_sum(x) + d
+
+    which is evaluated band by band, so no full-size intermediate image is
+    allocated. Results differ from the Pillow chain by a few grey levels at
+    most, since Pillow truncates and clips after each step while this rounds
+    once at the end.
+
+    Args:
+        img: Image in mode "L" or "RGB"
+        contrast: Contrast factor, 1.0 for unchanged
+        sharpness: Sharpness factor, 1.0 for unchanged
+
+    Returns:
+        Image.Image: Enhanced image
+    """
+    if img.mode not in ("L", "RGB"):
+        return ImageEnhance.Sharpness(ImageEnhance.Contrast(img).enhance(contrast)).enhance(sharpness)
+
+    # Same grey level ImageEnhance.Contrast blends with
+    histogram = (img if img.mode == "L" else img.convert("L")).histogram()
+    mean = int(sum(level * count for level, count in enumerate(histogram)) / sum(histogram) + 0.5)
+
+    a = np.float32(contrast * sharpness)
+    b = np.float32(contrast * (1 - sharpness) / 13)
+    # +0.5 so the truncating cast back to uint8 rounds
+    d = np.float32(mean * (1 - contrast) + 0.5)
+
+    pixels = np.asarray(img)
+    height = pixels.shape[0]
+    output = np.empty_like(pixels)
+    pad_width = ((1, 1), (1, 1)) + ((0, 0),) * (pixels.ndim - 2)
+
+    for top in range(0, height, ENHANCE_BAND_ROWS):
+        bottom = min(top + ENHANCE_BAND_ROWS, height)
+
+        # Band with one neighbouring row on each side, edges replicated
+        band = np.pad(pixels[max(top - 1, 0):bottom + 1], pad_width, mode="edge").astype(np.uint16)
+        if top > 0:
+            band = band[1:]
+        if bottom < height:
+            band = band[:-1]
+
+        # 3x3 kernel sum, at most 13 * 255, so uint16 does not overflow
+        rows = band[:-2] + band[1:-1]
+        rows += band[2:]
+        kernel_sum = rows[:, :-2] + rows[:, 1:-1]
+        kernel_sum += rows[:, 2:]
+        center = band[1:-1, 1:-1]
+        kernel_sum += center << 2
+
+        result = kernel_sum.astype(np.float32)
+        result *= b
+        result += center * a
+        result += d
+        np.clip(result, 0, 255, out=result)
+        output[top:bottom] = result
+
+    # Pillow's filter leaves the outermost pixels unsmoothed, so only contrast applies there
+    for edge in (np.s_[0], np.s_[-1], np.s_[:, 0], np.s_[:, -1]):
+        output[edge] = np.clip(pixels[edge] * np.float32(contrast) + d, 0, 255)
+
+    return Image.fromarray(output, img.mode)
+
+def _smaller_payload(
+    envelope: ImageEnvelope,
+    profile: PreprocessProfile,
+    data: bytes,
+    quality: int,
+    size: Tuple[int, int]
+) -> PreprocessedImage:
+    """
+    Pick the re-encoded payload, or the original upload if that is smaller and fits the budget
+
+    Re-encoding an already compressed scan at high quality can produce more
+    bytes than the upload itself. The original is only kept when the profile
+    would not have changed its pixels, so the image-token cost and the model's
+    view of the form stay what the profile asks for.
+
+    Args:
+        envelope: Decoded upload
+        profile: Preprocessing settings
+        data: Re-encoded image
+        quality: Quality used for `data`
+        size: Size of the re-encoded image
+
+    Returns:
+        PreprocessedImage: Payload to send upstream
+    """
+    if _needs_no_preprocessing(envelope, profile) and envelope.byte_size <= min(len(data), profile.max_bytes):
+        return PreprocessedImage(
+            data=envelope.data,
+            mime_type=envelope.mime_type,
+            original_bytes=envelope.byte_size,
+            size=envelope.size,
+            kept_original=True
+        )
+
+    return PreprocessedImage(
+        data=data,
+        mime_type=profile.mime_type,
+        original_bytes=envelope.byte_size,
+        size=size,
+        quality=quality
+    )
+
+def _needs_no_preprocessing(envelope: ImageEnvelope, profile: PreprocessProfile) -> bool:
+    """
+    Check whether the profile would leave an upload's pixels as they are
+
+    Args:
+        envelope: Decoded upload
+        profile: Preprocessing settings
+
+    Returns:
+        bool: True if the upload is in an accepted format, upright, within the long
+            edge, already grey when grayscale is asked for, and enhancement is off
+    """
+    if envelope.format not in PASSTHROUGH_FORMATS or envelope.image is None:
+        return False
+    if profile.max_long_edge and max(envelope.size) > profile.max_long_edge:
+        return False
+    if profile.grayscale and envelope.image.mode != "L":
+        return False
+    if profile.contrast != 1.0 or profile.sharpness != 1.0:
+        return False
+    # The model would otherwise see the form sideways
+    return not profile.auto_rotate or not envelope.exif or envelope.exif.get(EXIF_ORIENTATION, 1) == 1
+
+def _passthrough(envelope: ImageEnvelope, error: Exception) -> PreprocessedImage:
+    """Fall back to the original upload when preprocessing fails"""
+    logger.warning("Image preprocessing failed: %s, using original image", error)
+    return PreprocessedImage(
+        data=envelope.data,
+        mime_type=envelope.mime_type,
+        original_bytes=envelope.byte_size,
+        size=envelope.size
+    )
+
+def _limit_long_edge(img: Image.Image, max_long_edge: int) -> Image.Image:
+    """
+    Downscale an image so its longest side is at most `max_long_edge`
+
+    Args:
+        img: Image to resize
+        max_long_edge: Maximum length of the longest side, 0 to disable
+
+    Returns:
+        Image.Image: Resized image, or the input if it is already small enough
+    """
+    long_edge = max(img.size)
+    if not max_long_edge or long_edge <= max_long_edge:
+        return img
+
+    scale = max_long_edge / long_edge
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+def _encode(img: Image.Image, output_format: str, quality: int) -> bytes:
+    """Encode an image at the given quality"""
+    output = io.BytesIO()
+    img.save(output, format=output_format, quality=quality)
+    return output.getvalue()
+
+def _encode_within_budget(img: Image.Image, profile: PreprocessProfile) -> Tuple[bytes, int]:
+    """
+    Binary search for the highest quality whose output fits the byte budget
+
+    Args:
+        img: Image to encode
+        profile: Preprocessing settings
+
+    Returns:
+        Tuple containing:
+            - bytes: Encoded image
+            - int: Quality used
+    """
+    data = _encode(img, profile.output_format, profile.max_quality)
+    if len(data) <= profile.max_bytes:
+        return data, profile.max_quality
+
+    best_data, best_quality = None, None
+    low, high = profile.min_quality, profile.max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(img, profile.output_format, quality)
+        if len(data) <= profile.max_bytes:
+            best_data, best_quality = data, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    # Nothing fits: the last attempt was at the minimum quality
+    if best_data is None:
+        return data, profile.min_quality
+    return best_data, best_quality
@@ -0,0 +1,237 @@
+# services/quality.py
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from PIL import Image
+
+from services.image_pool import ImageWorkerPool
+from services.images import ImageEnvelope
+from utils.errors import ErrorType
+
+logger = logging.getLogger("patient-care-api")
+
+QUALITY_GATE_MODES = ("off", "shadow", "enforce")
+
+# Checks in the order they run; the first failure decides the error
+QUALITY_CHECKS = ("size", "exposure", "blank", "blur", "document")
+
+# Grey-level step between neighbours that counts as an edge
+EDGE_STEP = 24
+# An edge is axis-aligned when one gradient component is this many times the other
+AXIS_RATIO = 2
+# Grey level from which a pixel counts as clipped
+CLIP_LEVEL = 250
+# Clipped pixels must be this much brighter than the paper to count as glare
+PAPER_TOLERANCE = 12
+
+@dataclass(frozen=True)
+class QualityThresholds:
+    """Limits of the local image-quality gate, in units of the analysis copy"""
+    mode: str = "shadow"
+    analysis_size: int = 1024
+    min_short_edge: int = 480
+    min_brightness: float = 40.0
+    max_clipped_fraction: float = 0.25
+    min_contrast: float = 8.0
+    min_sharpness: float = 50.0
+    max_edge_density: float = 0.4
+    min_axis_fraction: float = 0.35
+
+    @classmethod
+    def from_env(cls) -> "QualityThresholds":
+        """
+        Build thresholds from environment variables
+
+        Returns:
+            QualityThresholds: Configured thresholds
+        """
+        mode = os.getenv("QUALITY_GATE_MODE", cls.mode).lower()
+        if mode not in QUALITY_GATE_MODES:
+            raise ValueError(f"QUALITY_GATE_MODE must be one of {', '.join(QUALITY_GATE_MODES)}")
+
+        return cls(
+            mode=mode,
+            analysis_size=int(os.getenv("QUALITY_ANALYSIS_SIZE", str(cls.analysis_size))),
+            min_short_edge=int(os.getenv("QUALITY_MIN_SHORT_EDGE", str(cls.min_short_edge))),
+            min_brightness=float(os.getenv("QUALITY_MIN_BRIGHTNESS", str(cls.min_brightness))),
+            max_clipped_fraction=float(os.getenv("QUALITY_MAX_CLIPPED_FRACTION", str(cls.max_clipped_fraction))),
+            min_contrast=float(os.getenv("QUALITY_MIN_CONTRAST", str(cls.min_contrast))),
+            min_sharpness=float(os.getenv("QUALITY_MIN_SHARPNESS", str(cls.min_sharpness))),
+            max_edge_density=float(os.getenv("QUALITY_MAX_EDGE_DENSITY", str(cls.max_edge_density))),
+            min_axis_fraction=float(os.getenv("QUALITY_MIN_AXIS_FRACTION", str(cls.min_axis_fraction)))
+        )
+
+@dataclass
+class QualityFailure:
+    """A check an image did not pass"""
+    check: str
+    error_type: ErrorType
+    message: str
+
+@dataclass
+class QualityReport:
+    """Measurements and verdict of the quality gate for one image"""
+    metrics: Dict[str, float] = field(default_factory=dict)
+    failures: List[QualityFailure] = field(default_factory=list)
+    # Seconds spent in each check, plus "downscale" for the analysis copy
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def passed(self) -> bool:
+        """Whether every check passed"""
+        return not self.failures
+
+def analysis_copy(img: Image.Image, size: int) -> np.ndarray:
+    """
+    Downscale an image to a small grayscale array for the checks
+
+    Args:
+        img: Decoded image
+        size: Long edge of the copy
+
+    Returns:
+        np.ndarray: 2-D uint8 array
+    """
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    scale = size / max(img.size)
+    if scale >= 1:
+        return np.asarray(img.convert("L"))
+
+    # Integer reduction first, so the exact resize runs on few grey pixels
+    factor = int(1 / scale)
+    if factor > 1:
+        img = img.reduce(factor)
+    target = (max(1, round(img.width * scale * factor)), max(1, round(img.height * scale * factor)))
+    return np.asarray(img.convert("L").resize(target, Image.BOX))
+
+def assess_image(img: Image.Image, thresholds: QualityThresholds) -> QualityReport:
+    """
+    Screen one image for problems that make extraction pointless
+
+    The size check uses the original dimensions; all other checks run on a
+    grayscale copy whose long edge is `thresholds.analysis_size`:
+        - exposure: mean brightness, and the share of clipped highlights
+          brighter than the paper (glare); white paper itself is not
+          counted, so clean scans pass
+        - blank: grey-level spread
+        - blur: variance of the Laplacian
+        - document: forms have a moderate share of edges, mostly
+          horizontal or vertical (text lines, table rules)
+
+    Args:
+        img: Decoded image
+        thresholds: Gate limits
+
+    Returns:
+        QualityReport: Measurements, failures and per-check timings
+    """
+    report = QualityReport()
+    metrics = report.metrics
+
+    def timed(check: str, start_time: float):
+        report.timings[check] = time.perf_counter() - start_time
+
+    def fail(check: str, error_type: ErrorType, message: str):
+        report.failures.append(QualityFailure(check, error_type, message))
+
+    stage_start = time.perf_counter()
+    metrics["short_edge"] = min(img.size)
+    if metrics["short_edge"] < thresholds.min_short_edge:
+        fail("size", ErrorType.INVALID_IMAGES,
+             f"Image is {img.width}x{img.height}, the short edge must be at least {thresholds.min_short_edge}px")
+    timed("size", stage_start)
+
+    stage_start = time.perf_counter()
+    gray = analysis_copy(img, thresholds.analysis_size)
+    timed("downscale", stage_start)
+
+    stage_start = time.perf_counter()
+    metrics["brightness"] = float(gray.mean())
+    # Forms are mostly paper, so the median is the paper level; when the paper
+    # itself is clipped (a scan, or a bright but intact capture) nothing counts
+    metrics["paper_level"] = float(np.median(gray))
+    glare_level = max(CLIP_LEVEL, metrics["paper_level"] + PAPER_TOLERANCE)
+    metrics["clipped_fraction"] = float(np.count_nonzero(gray >= glare_level)) / gray.size
+    if metrics["brightness"] < thresholds.min_brightness:
+        fail("exposure", ErrorType.IMAGE_QUALITY_ISSUE,
+             f"Image is too dark (mean brightness {metrics['brightness']:.0f} < {thresholds.min_brightness:g})")
+    elif metrics["clipped_fraction"] > thresholds.max_clipped_fraction:
+        fail("exposure", ErrorType.IMAGE_QUALITY_ISSUE,
+             f"Image is overexposed ({metrics['clipped_fraction']:.0%} of the page is clipped glare)")
+    timed("exposure", stage_start)
+
+    stage_start = time.perf_counter()
+    metrics["contrast"] = float(gray.std())
+    if metrics["contrast"] < thresholds.min_contrast:
+        fail("blank", ErrorType.INVALID_IMAGES,
+             f"Image looks blank (contrast {metrics['contrast']:.1f} < {thresholds.min_contrast:g})")
+    timed("blank", stage_start)
+
+    stage_start = time.perf_counter()
+    pixels = gray.astype(np.int16)
+    laplacian = (
+        pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:] - 4 * pixels[1:-1, 1:-1]
+    )
+    metrics["sharpness"] = float(laplacian.var()) if laplacian.size else 0.0
+    if metrics["sharpness"] < thresholds.min_sharpness:
+        fail("blur", ErrorType.IMAGE_QUALITY_ISSUE,
+             f"Image is blurred (sharpness {metrics['sharpness']:.1f} < {thresholds.min_sharpness:g})")
+    timed("blur", stage_start)
+
+    stage_start = time.perf_counter()
+    gx = np.abs(pixels[:-1, 1:] - pixels[:-1, :-1])
+    gy = np.abs(pixels[1:, :-1] - pixels[:-1, :-1])
+    edges = np.maximum(gx, gy) >= EDGE_STEP
+    edge_count = int(np.count_nonzero(edges))
+    metrics["edge_density"] = edge_count / edges.size if edges.size else 0.0
+    gx_edges = gx[edges]
+    gy_edges = gy[edges]
+    axis_aligned = (gx_edges >= AXIS_RATIO * gy_edges) | (gy_edges >= AXIS_RATIO * gx_edges)
+    metrics["axis_fraction"] = float(np.count_nonzero(axis_aligned)) / edge_count if edge_count else 0.0
+    if metrics["edge_density"] > thresholds.max_edge_density:
+        fail("document", ErrorType.INVALID_IMAGES,
+             f"Image does not look like a form (edge density {metrics['edge_density']:.2f})")
+    elif edge_count and metrics["axis_fraction"] < thresholds.min_axis_fraction:
+        fail("document", ErrorType.INVALID_IMAGES,
+             f"Image does not look like a form (only {metrics['axis_fraction']:.0%} of edges are straight lines)")
+    timed("document", stage_start)
+
+    return report
+
+async def assess_images(
+    images: List[ImageEnvelope],
+    thresholds: QualityThresholds,
+    pool: ImageWorkerPool
+) -> List[QualityReport]:
+    """
+    Screen several images concurrently on the shared image pool
+
+    Args:
+        images: Decoded uploads
+        thresholds: Gate limits
+        pool: Shared image worker pool
+
+    Returns:
+        List: Reports, in the order of `images`
+    """
+    return await asyncio.gather(*(pool.run(assess_image, envelope.image, thresholds) for envelope in images))
+
+_thresholds: Optional[QualityThresholds] = None
+
+def get_quality_thresholds() -> QualityThresholds:
+    """
+    Get the process-wide quality gate limits
+
+    Returns:
+        QualityThresholds: Thresholds loaded from environment variables
+    """
+    global _thresholds
+    if _thresholds is None:
+        _thresholds = QualityThresholds.from_env()
+        logger.info("Quality gate: %s", _thresholds)
+    return _thresholds
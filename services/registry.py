@@ -0,0 +1,244 @@
+# services/registry.py
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("patient-care-api")
+
+# Used when the prompt file cannot be read
+FALLBACK_PROMPT = """Bạn là một trợ lý AI chuyên trích xuất thông tin từ hình ảnh phiếu chăm sóc bệnh nhân..."""
+
+# Model used when GEMINI_MODEL is not set
+DEFAULT_MODEL_NAME = "gemini-2.0-pro-exp-02-05"
+
+# Generation settings shared by every model client
+GENERATION_CONFIG = {
+    "temperature": 0,  # Lower temperature for more deterministic responses
+    "top_p": 0.95,
+    "top_k": 0,
+}
+
+@dataclass(frozen=True)
+class PromptVersion:
+    """One loaded revision of a prompt file"""
+    name: str
+    path: str
+    text: str
+    sha256: str
+    revision: int
+    mtime: float
+    loaded_at: float
+
+    @property
+    def version(self) -> str:
+        """Short content-derived version label"""
+        return self.sha256[:12]
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Describe the prompt without its text
+
+        Returns:
+            Dict: Name, path, hash, version and revision
+        """
+        return {
+            "name": self.name,
+            "path": self.path,
+            "sha256": self.sha256,
+            "version": self.version,
+            "revision": self.revision,
+            "loaded_at": self.loaded_at
+        }
+
+class ModelRegistry:
+    """
+    Process-wide registry of Gemini model clients and prompts
+
+    Model clients are built once per model name and prompts are read once
+    per file change, so the request path does no file I/O or client
+    construction. `watch` polls the prompt files' mtimes and swaps in new
+    revisions without a restart.
+    """
+
+    def __init__(self, reload_interval: float = 5.0):
+        self.reload_interval = reload_interval
+        self._prompt_paths: Dict[str, str] = {}
+        self._prompts: Dict[str, PromptVersion] = {}
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register_prompt(self, name: str, path: str) -> PromptVersion:
+        """
+        Register a prompt file and load it
+
+        Args:
+            name: Prompt name used by callers
+            path: Path of the prompt file
+
+        Returns:
+            PromptVersion: Loaded prompt
+        """
+        self._prompt_paths[name] = path
+        return self._load_prompt(name, path)
+
+    def get_prompt(self, name: str = "extraction") -> PromptVersion:
+        """
+        Get the active revision of a prompt
+
+        Args:
+            name: Prompt name
+
+        Returns:
+            PromptVersion: Active prompt
+
+        Raises:
+            KeyError: If the prompt was never registered
+        """
+        return self._prompts[name]
+
+    def get_model(self, model_name: str):
+        """
+        Get a model client, building it on first use
+
+        The first call imports the Gemini SDK, which the warmup does before
+        the worker reports ready.
+
+        Args:
+            model_name: Gemini model name
+
+        Returns:
+            GenerativeModel: Shared model client
+        """
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    genai = _import_genai()
+                    model = genai.GenerativeModel(model_name, generation_config=GENERATION_CONFIG)
+                    self._models[model_name] = model
+                    logger.info("Built Gemini model client for %s", model_name)
+        return model
+
+    def reload_changed(self) -> int:
+        """
+        Reload every prompt file whose mtime changed
+
+        Returns:
+            int: Number of reloaded prompts
+        """
+        reloaded = 0
+        for name, path in list(self._prompt_paths.items()):
+            current = self._prompts.get(name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+
+            if current is None or mtime != current.mtime:
+                previous_hash = current.sha256 if current else None
+                prompt = self._load_prompt(name, path)
+                if prompt.sha256 != previous_hash:
+                    reloaded += 1
+        return reloaded
+
+    async def watch(self):
+        """Poll prompt files and hot-reload changes until cancelled"""
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await asyncio.to_thread(self.reload_changed)
+            except Exception as e:
+                logger.error("Prompt reload failed: %s", e)
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Describe the active prompts and model clients
+
+        Returns:
+            Dict: Prompt versions and model names
+        """
+        return {
+            "prompts": {name: prompt.describe() for name, prompt in self._prompts.items()},
+            "models": sorted(self._models)
+        }
+
+    def _load_prompt(self, name: str, path: str) -> PromptVersion:
+        """Read a prompt file and make it the active revision"""
+        current = self._prompts.get(name)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except Exception as e:
+            logger.error("Failed to load prompt from %s: %s", path, e)
+            if current is not None:
+                return current
+            mtime, text = 0.0, FALLBACK_PROMPT
+
+        sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if current is not None and current.sha256 == sha256:
+            # Touched but unchanged: keep the revision, remember the new mtime
+            prompt = PromptVersion(name, path, text, sha256, current.revision, mtime, current.loaded_at)
+        else:
+            revision = current.revision + 1 if current else 1
+            prompt = PromptVersion(name, path, text, sha256, revision, mtime, time.time())
+            logger.info("Loaded prompt '%s' from %s (version %s, revision %s)", name, path, prompt.version, revision)
+
+        self._prompts[name] = prompt
+        return prompt
+
+_genai = None
+
+def _import_genai():
+    """
+    Import and configure the Gemini SDK on first use
+
+    Importing google.generativeai takes about a second, and the offline
+    backends never need it, so it is kept off the module import path.
+
+    Returns:
+        module: The configured google.generativeai module
+    """
+    global _genai
+    if _genai is None:
+        import_start = time.perf_counter()
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        logger.info("Imported google.generativeai in %.2fs", time.perf_counter() - import_start)
+        _genai = genai
+    return _genai
+
+_registry: Optional[ModelRegistry] = None
+
+def get_registry() -> ModelRegistry:
+    """
+    Get the process-wide model and prompt registry, initializing it on first use
+
+    Returns:
+        ModelRegistry: Shared registry
+    """
+    global _registry
+    if _registry is None:
+        _registry = init_registry()
+    return _registry
+
+def init_registry() -> ModelRegistry:
+    """
+    Build the registry and load the prompts
+
+    Model clients are built by the warmup, or on first use.
+
+    Returns:
+        ModelRegistry: Initialized registry
+    """
+    global _registry
+    registry = ModelRegistry(reload_interval=float(os.getenv("PROMPT_RELOAD_INTERVAL", "5")))
+    registry.register_prompt("extraction", os.getenv("PROMPT_PATH", "prompt.txt"))
+    _registry = registry
+    return registry
@@ -0,0 +1,532 @@
+# services/resilience.py
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+from google.api_core import exceptions as api_exceptions
+
+from services.limiter import ConcurrencyLimiter
+from services.metrics import count_upstream_attempt
+from services.shared_state import SharedStateStore, get_shared_store, get_worker_id
+
+logger = logging.getLogger("patient-care-api")
+
+T = TypeVar("T")
+
+class ResponseParseError(Exception):
+    """Raised when the model's response cannot be parsed as JSON"""
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker rejects a call"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Errors worth another attempt
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    ResponseParseError,
+    api_exceptions.ServerError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.Aborted
+)
+
+# Errors that indicate the upstream itself is unhealthy
+UPSTREAM_FAILURES = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    api_exceptions.ServerError
+)
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    After `failure_threshold` consecutive upstream failures the circuit opens
+    and calls fail fast for `recovery_time` seconds. A single trial call is
+    then let through; its outcome closes or reopens the circuit. `check`
+    hands the trial call a token, and only results reported with that token
+    settle the half-open state, so calls admitted before the circuit opened
+    cannot close it or take the trial's place.
+
+    The public methods are coroutines so that subclasses can keep their
+    state outside the process without blocking the event loop; this
+    in-process breaker completes them without suspending.
+    """
+
+    def __init__(self, failure_threshold: int, recovery_time: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        """Current state: "closed", "open" or "half_open\""""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.recovery_time:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> int:
+        """Seconds until the circuit lets a trial call through"""
+        if self._opened_at is None:
+            return 0
+        return max(1, int(self.recovery_time - (time.monotonic() - self._opened_at)) + 1)
+
+    async def blocked_for(self) -> int:
+        """
+        Check whether calls are currently being rejected
+
+        Returns:
+            int: Seconds to wait before retrying, or 0 if calls are let through
+        """
+        return await self._run(self._blocked_for)
+
+    async def check(self) -> Optional[str]:
+        """
+        Admit a call or fail fast
+
+        Returns:
+            str: Trial token if this call is the half-open trial, else None;
+                pass it back with the call's outcome
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        return await self._run(self._check)
+
+    async def record_success(self, trial: Optional[str] = None):
+        """Close the circuit after a successful trial call, or reset the failure count"""
+        await self._run(self._record_success, trial)
+
+    async def abandon(self, trial: Optional[str] = None):
+        """Forget a call that ended without telling anything about the upstream"""
+        await self._run(self._abandon, trial)
+
+    async def record_failure(self, trial: Optional[str] = None):
+        """Count an upstream failure; reopen after a failed trial or open at the threshold"""
+        await self._run(self._record_failure, trial)
+
+    async def _run(self, operation: Callable[..., T], *args) -> T:
+        """Run a state operation; in-process state needs no I/O"""
+        return operation(*args)
+
+    def _blocked_for(self) -> int:
+        """Retry-after while open, or while half-open with a trial call running"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial is not None):
+            return self.retry_after()
+        return 0
+
+    def _check(self) -> Optional[str]:
+        state = self.state
+        if state == "closed":
+            return None
+        if state == "half_open" and self._trial is None:
+            self._trial = uuid.uuid4().hex
+            return self._trial
+        raise CircuitOpenError(
+            f"Circuit open after {self._failures} consecutive upstream failures",
+            self.retry_after()
+        )
+
+    def _is_trial(self, trial: Optional[str]) -> bool:
+        return trial is not None and trial == self._trial
+
+    def _record_success(self, trial: Optional[str]):
+        if self._is_trial(trial):
+            logger.info("Upstream circuit closed")
+            self._opened_at = None
+            self._trial = None
+        if self._opened_at is None:
+            self._failures = 0
+
+    def _abandon(self, trial: Optional[str]):
+        if self._is_trial(trial):
+            self._trial = None
+
+    def _record_failure(self, trial: Optional[str]):
+        if self._is_trial(trial):
+            self._failures += 1
+            self._trial = None
+            logger.warning("Upstream circuit reopened after its trial call failed")
+            self._opened_at = time.monotonic()
+        elif self._opened_at is None:
+            # Once open, only the trial call's outcome moves the circuit
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                logger.warning("Upstream circuit opened after %d consecutive failures", self._failures)
+                self._opened_at = time.monotonic()
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """
+    CircuitBreaker whose state is shared by all worker processes
+
+    Failures counted by any worker trip the circuit for all of them, and
+    only one worker on the host gets the half-open trial call. Times are
+    wall-clock, since monotonic clocks are not comparable across processes.
+    A trial held by a worker that dies is released with its other shared state.
+    State operations are SQLite transactions that may wait on other
+    workers, so they run in a thread instead of on the event loop.
+    """
+
+    def __init__(self, store: SharedStateStore, name: str, failure_threshold: int, recovery_time: float):
+        super().__init__(failure_threshold, recovery_time)
+        self.store = store
+        self.name = name
+        with store.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO breakers (name, failures) VALUES (?, 0)", (name,))
+
+    def _row(self):
+        """Current (failures, opened_at, trial_worker)"""
+        return self.store.query(
+            "SELECT failures, opened_at, trial_worker FROM breakers WHERE name = ?", (self.name,)
+        )[0]
+
+    def _state_of(self, opened_at: Optional[float]) -> str:
+        if opened_at is None:
+            return "closed"
+        if time.time() - opened_at < self.recovery_time:
+            return "open"
+        return "half_open"
+
+    def _retry_after_of(self, opened_at: Optional[float]) -> int:
+        if opened_at is None:
+            return 0
+        return max(1, int(self.recovery_time - (time.time() - opened_at)) + 1)
+
+    @property
+    def state(self) -> str:
+        """Current state: "closed", "open" or "half_open\""""
+        return self._state_of(self._row()[1])
+
+    def retry_after(self) -> int:
+        """Seconds until the circuit lets a trial call through"""
+        return self._retry_after_of(self._row()[1])
+
+    async def check(self) -> Optional[str]:
+        """
+        Admit a call or fail fast
+
+        Returns:
+            str: Trial token if this call is the half-open trial, else None;
+                pass it back with the call's outcome
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        task = asyncio.ensure_future(asyncio.to_thread(self._check))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # The caller is gone; hand back a trial call the thread may still take
+            task.add_done_callback(self._abandon_taken_trial)
+            raise
+
+    def _abandon_taken_trial(self, task: asyncio.Future):
+        if task.cancelled() or task.exception() or task.result() is None:
+            return
+        asyncio.get_running_loop().run_in_executor(None, self._abandon, task.result())
+
+    async def _run(self, operation: Callable[..., T], *args) -> T:
+        """Run a state operation in a thread, letting it finish even if the caller is cancelled"""
+        return await asyncio.shield(asyncio.to_thread(operation, *args))
+
+    def _blocked_for(self) -> int:
+        _, opened_at, trial_worker = self._row()
+        state = self._state_of(opened_at)
+        if state == "open" or (state == "half_open" and trial_worker is not None):
+            return self._retry_after_of(opened_at)
+        return 0
+
+    def _check(self) -> Optional[str]:
+        with self.store.transaction() as db:
+            failures, opened_at, trial_worker = db.execute(
+                "SELECT failures, opened_at, trial_worker FROM breakers WHERE name = ?", (self.name,)
+            ).fetchone()
+            state = self._state_of(opened_at)
+            if state == "closed":
+                return None
+            if state == "half_open" and trial_worker is None:
+                trial = uuid.uuid4().hex
+                db.execute(
+                    "UPDATE breakers SET trial_worker = ?, trial_at = ?, trial_token = ? WHERE name = ?",
+                    (get_worker_id(), time.time(), trial, self.name)
+                )
+                return trial
+        raise CircuitOpenError(
+            f"Circuit open after {failures} consecutive upstream failures",
+            self._retry_after_of(opened_at)
+        )
+
+    def _record_success(self, trial: Optional[str]):
+        with self.store.transaction() as db:
+            if trial is not None:
+                cursor = db.execute(
+                    "UPDATE breakers SET failures = 0, opened_at = NULL, "
+                    "trial_worker = NULL, trial_at = NULL, trial_token = NULL "
+                    "WHERE name = ? AND trial_token = ? AND trial_worker IS NOT NULL",
+                    (self.name, trial)
+                )
+                if cursor.rowcount:
+                    logger.info("Upstream circuit closed")
+            else:
+                db.execute(
+                    "UPDATE breakers SET failures = 0 WHERE name = ? AND opened_at IS NULL AND failures != 0",
+                    (self.name,)
+                )
+
+    def _abandon(self, trial: Optional[str]):
+        if trial is None:
+            return
+        with self.store.transaction() as db:
+            db.execute(
+                "UPDATE breakers SET trial_worker = NULL, trial_at = NULL, trial_token = NULL "
+                "WHERE name = ? AND trial_token = ?",
+                (self.name, trial)
+            )
+
+    def _record_failure(self, trial: Optional[str]):
+        with self.store.transaction() as db:
+            failures, opened_at, trial_worker, trial_token = db.execute(
+                "SELECT failures + 1, opened_at, trial_worker, trial_token FROM breakers WHERE name = ?",
+                (self.name,)
+            ).fetchone()
+            if trial is not None and trial == trial_token and trial_worker is not None:
+                logger.warning("Upstream circuit reopened after its trial call failed")
+                db.execute(
+                    "UPDATE breakers SET failures = ?, opened_at = ?, "
+                    "trial_worker = NULL, trial_at = NULL, trial_token = NULL WHERE name = ?",
+                    (failures, time.time(), self.name)
+                )
+            elif opened_at is None:
+                # Once open, only the trial call's outcome moves the circuit
+                if failures >= self.failure_threshold:
+                    logger.warning("Upstream circuit opened after %d consecutive failures", failures)
+                    opened_at = time.time()
+                db.execute(
+                    "UPDATE breakers SET failures = ?, opened_at = ? WHERE name = ?",
+                    (failures, opened_at, self.name)
+                )
+
+class LatencyTracker:
+    """Sliding window of recent successful attempt latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        """Add a latency sample"""
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Get a latency quantile of the window
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            float: Latency in seconds, or None without samples
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ResilientCaller:
+    """
+    Runs upstream attempts with deadlines, jittered retries, hedging and a circuit breaker
+    """
+
+    def __init__(
+        self,
+        attempt_timeout: float,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        breaker: CircuitBreaker,
+        hedge_enabled: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 1.0
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = LatencyTracker()
+
+    async def call(
+        self,
+        attempt_fn: Callable[[], Awaitable[T]],
+        request_id: str,
+        limiter: Optional[ConcurrencyLimiter] = None
+    ) -> T:
+        """
+        Run attempts until one succeeds or the error is final
+
+        Args:
+            attempt_fn: Coroutine factory making one upstream attempt
+            request_id: Request ID for logging
+            limiter: Limiter to take an extra slot from for hedged attempts
+
+        Returns:
+            T: Result of the first successful attempt
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            Exception: The last attempt's error if it is not retryable or attempts run out
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            trial = await self.breaker.check()
+            start_time = time.monotonic()
+            try:
+                result = await self._hedged_attempt(attempt_fn, request_id, attempt, limiter)
+            except asyncio.CancelledError:
+                await self.breaker.abandon(trial)
+                raise
+            except Exception as e:
+                elapsed = time.monotonic() - start_time
+                retryable = isinstance(e, RETRYABLE_ERRORS)
+                count_upstream_attempt(type(e).__name__)
+                if isinstance(e, UPSTREAM_FAILURES):
+                    await self.breaker.record_failure(trial)
+                else:
+                    # Says nothing about upstream health, so neither close nor trip the circuit
+                    await self.breaker.abandon(trial)
+
+                logger.warning(
+                    "[%s] Upstream attempt %d/%d failed after %.2fs (%s, %s): %.200s",
+                    request_id, attempt, self.max_attempts, elapsed, type(e).__name__,
+                    "retryable" if retryable else "final", e
+                )
+                if not retryable or attempt == self.max_attempts:
+                    raise
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                logger.info("[%s] Retrying upstream call in %.2fs", request_id, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            await self.breaker.record_success(trial)
+            count_upstream_attempt("success")
+            logger.info(
+                "[%s] Upstream attempt %d/%d succeeded in %.2fs",
+                request_id, attempt, self.max_attempts, time.monotonic() - start_time
+            )
+            return result
+
+    async def _timed_attempt(self, attempt_fn: Callable[[], Awaitable[T]]) -> T:
+        """Run one attempt under the per-attempt deadline and record its latency"""
+        start_time = time.monotonic()
+        result = await asyncio.wait_for(attempt_fn(), timeout=self.attempt_timeout)
+        self.latencies.record(time.monotonic() - start_time)
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Delay before firing a hedged attempt, or None if hedging is off or not yet calibrated"""
+        if not self.hedge_enabled or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latencies.quantile(self.hedge_quantile))
+
+    async def _hedged_attempt(
+        self,
+        attempt_fn: Callable[[], Awaitable[T]],
+        request_id: str,
+        attempt: int,
+        limiter: Optional[ConcurrencyLimiter]
+    ) -> T:
+        """
+        Run one attempt, firing a second request if the first is slower than the hedge delay
+
+        The first of the two to succeed wins and the other is cancelled. The
+        hedged request needs a free limiter slot; without one it is skipped.
+        """
+        primary = asyncio.create_task(self._timed_attempt(attempt_fn))
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        if limiter is not None and not await limiter.try_acquire():
+            logger.info("[%s] No free slot for a hedged request, waiting for attempt %d", request_id, attempt)
+            return await primary
+
+        logger.info("[%s] Attempt %d slower than %.2fs, sending hedged request", request_id, attempt, hedge_delay)
+        hedge = asyncio.create_task(self._timed_attempt(attempt_fn))
+        tasks = {primary: "primary", hedge: "hedged"}
+        pending = set(tasks)
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        logger.info("[%s] The %s request of attempt %d won", request_id, tasks[task], attempt)
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if limiter is not None:
+                await limiter.release()
+
+_caller: Optional[ResilientCaller] = None
+
+def get_resilient_caller() -> ResilientCaller:
+    """
+    Get the process-wide resilience policy for upstream calls
+
+    Returns:
+        ResilientCaller: Shared caller configured from environment variables
+    """
+    global _caller
+    if _caller is None:
+        breaker_settings = dict(
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURE_THRESHOLD", "5")),
+            recovery_time=float(os.getenv("GEMINI_BREAKER_RECOVERY_TIME", "30"))
+        )
+        store = get_shared_store()
+        if store is not None:
+            # Failures seen by any worker trip the circuit for all of them
+            breaker = SharedCircuitBreaker(store, "upstream", **breaker_settings)
+        else:
+            breaker = CircuitBreaker(**breaker_settings)
+        _caller = ResilientCaller(
+            attempt_timeout=float(os.getenv("GEMINI_ATTEMPT_TIMEOUT", "90")),
+            max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8")),
+            breaker=breaker,
+            hedge_enabled=os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() == "true",
+            hedge_quantile=float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95")),
+            hedge_min_samples=int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20")),
+            hedge_min_delay=float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "1"))
+        )
+    return _caller
@@ -0,0 +1,348 @@
+# services/response_schema.py
+import os
+import hashlib
+import logging
+from typing import Any, Dict, List, Literal, Optional, Sequence, Type, get_args, get_origin
+
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError, create_model, model_validator
+
+from utils import jsonlib
+from utils.errors import ErrorType, get_error_message
+
+logger = logging.getLogger("patient-care-api")
+
+# Top-level keys of an error document; everything else is the result
+ERROR_FIELDS = {"error", "error_type", "error_details", "message"}
+
+# Field errors reported back to the client at most
+MAX_REPORTED_ERRORS = 20
+
+class FormModel(BaseModel):
+    """Base of the form models: JSON keys are the aliases, unknown keys are dropped"""
+    model_config = ConfigDict(populate_by_name=True, extra="ignore")
+
+class BenhKemTheo(FormModel):
+    khong: Optional[bool] = None
+    huyet_ap: Optional[bool] = None
+    tieu_duong: Optional[bool] = None
+    viem_khop: Optional[bool] = None
+    tim_mach: Optional[bool] = None
+    hen_suyen: Optional[bool] = None
+    dong_kinh: Optional[bool] = None
+    alzheimer: Optional[bool] = None
+    parkinson: Optional[bool] = None
+    khac: Optional[str] = None
+
+class SaSutTriTue(FormModel):
+    khong: Optional[bool] = None
+    co_nhe: Optional[bool] = None
+    co_nang: Optional[bool] = None
+
+class TriGiac(FormModel):
+    tinh_tao: Optional[bool] = None
+    lo_mo: Optional[bool] = None
+    hon_me: Optional[bool] = None
+
+class TheTrang(FormModel):
+    trung_binh: Optional[bool] = None
+    gay: Optional[bool] = None
+    thua_can: Optional[bool] = None
+
+class HoHap(FormModel):
+    binh_thuong: Optional[bool] = None
+    tho_oxy: Optional[bool] = None
+    tho_qua_ong: Optional[bool] = None
+
+class DinhDuong(FormModel):
+    tu_an: Optional[bool] = None
+    dut_an: Optional[bool] = None
+    an_qua_ong: Optional[bool] = None
+
+class VanDong(FormModel):
+    binh_thuong: Optional[bool] = None
+    han_che: Optional[bool] = None
+    liet_nua_nguoi: Optional[bool] = Field(None, alias="liet_1/2_nguoi")
+    liet_toan_than: Optional[bool] = None
+
+class VetThuong(FormModel):
+    khong: Optional[bool] = None
+    co: Optional[bool] = None
+    vi_tri: Optional[str] = None
+
+class VeSinhCaNhan(FormModel):
+    tieu_tieu_binh_thuong: Optional[bool] = None
+    tieu_qua_bo: Optional[bool] = None
+    tieu_tieu_qua_ta: Optional[bool] = None
+    tieu_qua_ong: Optional[bool] = None
+    hau_mon_nhan_tao: Optional[bool] = None
+
+class CongViec(FormModel):
+    cong_viec: Optional[str] = None
+    gio_thuc_hien: Optional[str] = None
+
+class PhieuChamSoc(FormModel):
+    """The patient care form, in the key order of the extraction prompt's template"""
+    ho_ten_benh_nhan: Optional[str] = Field(None, alias="1_ho_ten_benh_nhan")
+    tuoi: Optional[str] = Field(None, alias="2_tuoi")
+    gioi_tinh: Optional[str] = Field(None, alias="3_gioi_tinh")
+    chan_doan: Optional[str] = Field(None, alias="4_chan_doan")
+    benh_kem_theo: Optional[BenhKemTheo] = Field(None, alias="5_benh_kem_theo")
+    so_dien_thoai_lien_he: Optional[str] = Field(None, alias="6_so_dien_thoai_lien_he")
+    ten_nguoi_than: Optional[str] = None
+    sa_sut_tri_tue: Optional[SaSutTriTue] = Field(None, alias="7_sa_sut_tri_tue")
+    tri_giac: Optional[TriGiac] = Field(None, alias="8_tri_giac")
+    the_trang: Optional[TheTrang] = Field(None, alias="9_the_trang")
+    ho_hap: Optional[HoHap] = Field(None, alias="10_ho_hap")
+    dinh_duong: Optional[DinhDuong] = Field(None, alias="11_dinh_duong")
+    van_dong: Optional[VanDong] = Field(None, alias="12_van_dong")
+    vet_thuong_vet_mo_vet_loet: Optional[VetThuong] = Field(None, alias="13_vet_thuong_vet_mo_vet_loet")
+    ve_sinh_ca_nhan: Optional[VeSinhCaNhan] = Field(None, alias="14_ve_sinh_ca_nhan")
+    noi_dung_cong_viec_va_gio_thuc_hien: Optional[List[CongViec]] = None
+    ngay_giao_ca: Optional[str] = None
+    ngay_nhan_ca: Optional[str] = None
+    csv_giao_ca: Optional[str] = None
+    csv_nhan_ca: Optional[str] = None
+    dia_diem: Optional[str] = None
+    so_pyc: Optional[str] = None
+    ma_kh: Optional[str] = None
+
+def _confidence_model(model: Type[FormModel]) -> Type[FormModel]:
+    """Mirror a form model with a 0-100 score in place of every leaf value"""
+    fields: Dict[str, Any] = {}
+    for name, field in model.model_fields.items():
+        # Every form field is Optional[X]
+        inner = get_args(field.annotation)[0]
+        if get_origin(inner) is list:
+            annotation = Optional[List[_confidence_model(get_args(inner)[0])]]
+        elif isinstance(inner, type) and issubclass(inner, FormModel):
+            annotation = Optional[_confidence_model(inner)]
+        else:
+            annotation = Optional[int]
+            fields[name] = (annotation, Field(None, alias=field.alias, ge=0, le=100))
+            continue
+        fields[name] = (annotation, Field(None, alias=field.alias))
+    return create_model(f"{model.__name__}Confidence", __base__=FormModel, **fields)
+
+ConfidenceScores = _confidence_model(PhieuChamSoc)
+
+class FormExtraction(FormModel):
+    """A successful extraction"""
+    phieu_cham_soc: PhieuChamSoc
+    confidence_scores: Optional[ConfidenceScores] = None
+
+class ErrorDetails(FormModel):
+    image_1: Optional[str] = None
+    image_2: Optional[str] = None
+
+class ModelOutput(FormModel):
+    """Error fields the model fills in instead of a result"""
+    error: Optional[bool] = None
+    error_type: Optional[Literal[
+        "INSUFFICIENT_IMAGES",
+        "INVALID_IMAGES",
+        "IMAGE_QUALITY_ISSUE",
+        "INCONSISTENT_INFORMATION",
+        "DUPLICATE_IMAGES"
+    ]] = None
+    error_details: Optional[ErrorDetails] = None
+    message: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _error_has_type(self):
+        if self.error and self.error_type is None:
+            raise ValueError("error_type is required when error is true")
+        return self
+
+class ExtractionOutput(ModelOutput):
+    """Response of the extraction prompt: the form, or an error"""
+    phieu_cham_soc: Optional[PhieuChamSoc] = None
+    confidence_scores: Optional[ConfidenceScores] = None
+
+    @model_validator(mode="after")
+    def _result_has_form(self):
+        if not self.error and self.phieu_cham_soc is None:
+            raise ValueError("phieu_cham_soc is required unless error is true")
+        return self
+
+class ConsistencyOutput(ModelOutput):
+    """Response of the consistency check of sectioned extraction"""
+    ok: Optional[bool] = None
+
+def _subset_model(model: Type[FormModel], keys: Sequence[str], suffix: str) -> Type[FormModel]:
+    """Copy of a form model with only the fields whose JSON keys are listed"""
+    fields = {
+        name: (field.annotation, field)
+        for name, field in model.model_fields.items()
+        if (field.alias or name) in keys
+    }
+    return create_model(f"{model.__name__}_{suffix}", __base__=FormModel, **fields)
+
+def extraction_output_model(name: str, keys: Sequence[str]) -> Type[ExtractionOutput]:
+    """
+    Build the response model of a prompt that extracts some of the form fields
+
+    Args:
+        name: Suffix of the model name, e.g. the section name
+        keys: JSON keys of phieu_cham_soc to keep
+
+    Returns:
+        Type: ExtractionOutput restricted to those fields
+    """
+    form = _subset_model(PhieuChamSoc, keys, name)
+    scores = _subset_model(ConfidenceScores, keys, name)
+    return create_model(
+        f"ExtractionOutput_{name}",
+        __base__=ExtractionOutput,
+        phieu_cham_soc=(Optional[form], None),
+        confidence_scores=(Optional[scores], None)
+    )
+
+def to_gemini_schema(json_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a pydantic JSON schema to the OpenAPI subset Gemini accepts
+
+    References are inlined, Optional[X] becomes X with nullable set, and
+    keywords Gemini does not know (titles, defaults, bounds) are dropped.
+
+    Args:
+        json_schema: Output of model_json_schema(by_alias=True)
+
+    Returns:
+        Dict: Schema for GenerationConfig.response_schema
+    """
+    definitions = json_schema.get("$defs", {})
+
+    def convert(node: Dict[str, Any]) -> Dict[str, Any]:
+        if "$ref" in node:
+            return convert(definitions[node["$ref"].rsplit("/", 1)[-1]])
+        if "anyOf" in node:
+            variants = [variant for variant in node["anyOf"] if variant.get("type") != "null"]
+            schema = convert(variants[0])
+            if len(variants) < len(node["anyOf"]):
+                schema["nullable"] = True
+            return schema
+
+        schema: Dict[str, Any] = {"type": node["type"]}
+        if "enum" in node:
+            schema["format"] = "enum"
+            schema["enum"] = list(node["enum"])
+        if node["type"] == "object":
+            schema["properties"] = {key: convert(value) for key, value in node.get("properties", {}).items()}
+            if node.get("required"):
+                schema["required"] = list(node["required"])
+        elif node["type"] == "array":
+            schema["items"] = convert(node["items"])
+        return schema
+
+    return convert(json_schema)
+
+class ResponseSchema:
+    """
+    A response model compiled once for generation and validation
+
+    The Gemini form of the schema is sent with every request so the model
+    answers with JSON of exactly this shape, and the pydantic validator
+    parses and checks that JSON in one pass.
+    """
+
+    def __init__(self, name: str, model: Type[ModelOutput]):
+        self.name = name
+        self.model = model
+        self.adapter = TypeAdapter(model)
+        self.gemini_schema = to_gemini_schema(model.model_json_schema(by_alias=True))
+        self.fingerprint = hashlib.sha256(jsonlib.dumps(self.gemini_schema)).hexdigest()[:16]
+
+    @property
+    def generation_config(self) -> Dict[str, Any]:
+        """Per-request generation settings that constrain the output"""
+        return {"response_mime_type": "application/json", "response_schema": self.gemini_schema}
+
+    def parse(self, response_text: str, request_id: str) -> Dict[str, Any]:
+        """
+        Validate the model's response text
+
+        Args:
+            response_text: Full text returned by the model
+            request_id: Request ID for logging
+
+        Returns:
+            Dict: The result, the error the model reported, or a
+            JSON_PARSING_ERROR listing the fields that failed validation
+        """
+        # JSON mode answers with the bare object; recorded or fake responses may be fenced
+        if not response_text.startswith("{"):
+            start = response_text.find("{")
+            end = response_text.rfind("}") + 1
+            if start != -1 and end > start:
+                response_text = response_text[start:end]
+
+        try:
+            output = self.adapter.validate_json(response_text)
+        except ValidationError as e:
+            logger.error("[%s] Response failed %s schema validation: %d errors", request_id, self.name, e.error_count())
+            return schema_error(e, response_text)
+
+        if output.error:
+            result = output.model_dump(by_alias=True, include=ERROR_FIELDS)
+            result["message"] = result["message"] or get_error_message(output.error_type)
+            return result
+        return output.model_dump(by_alias=True, exclude=ERROR_FIELDS)
+
+def schema_error(error: ValidationError, response_text: str) -> Dict[str, Any]:
+    """
+    Build the error result for a response that does not match its schema
+
+    Args:
+        error: Validation error raised by the compiled validator
+        response_text: Text that was validated
+
+    Returns:
+        Dict: JSON_PARSING_ERROR with one entry per failing field
+    """
+    errors = [
+        {
+            "field": ".".join(str(part) for part in detail["loc"]),
+            "type": detail["type"],
+            "message": detail["msg"]
+        }
+        for detail in error.errors(include_url=False)[:MAX_REPORTED_ERRORS]
+    ]
+    return {
+        "error": True,
+        "error_type": ErrorType.JSON_PARSING_ERROR,
+        "error_details": {
+            "message": f"Model response does not match the schema ({error.error_count()} errors)",
+            "errors": errors,
+            "response_text": response_text[:500]
+        },
+        "message": get_error_message(ErrorType.JSON_PARSING_ERROR)
+    }
+
+_schemas: Dict[str, ResponseSchema] = {}
+
+def get_response_schema(name: str = "extraction", keys: Optional[Sequence[str]] = None) -> Optional[ResponseSchema]:
+    """
+    Get a compiled response schema, building it on first use
+
+    Args:
+        name: "extraction" for the full form, "consistency" for the
+            consistency check, or the name of a field section
+        keys: JSON keys of phieu_cham_soc a field section extracts
+
+    Returns:
+        ResponseSchema: Shared schema, or None if GEMINI_RESPONSE_SCHEMA is disabled
+    """
+    if os.getenv("GEMINI_RESPONSE_SCHEMA", "true").lower() != "true":
+        return None
+
+    schema = _schemas.get(name)
+    if schema is None:
+        if name == "extraction":
+            model = ExtractionOutput
+        elif name == "consistency":
+            model = ConsistencyOutput
+        else:
+            model = extraction_output_model(name, keys)
+        schema = ResponseSchema(name, model)
+        _schemas[name] = schema
+    return schema
@@ -0,0 +1,347 @@
+# services/results.py
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.context import ExtractionContext
+from services.metrics import RESULT_STORE_WRITES
+from utils import jsonlib
+
+logger = logging.getLogger("patient-care-api")
+
+# Columns returned for every stored result, besides its data
+RESULT_COLUMNS = (
+    "seq", "request_id", "created_at", "status", "status_code", "error_type", "priority",
+    "image_1_sha256", "image_2_sha256", "cache_key", "prompt_version", "model_name",
+    "cached", "coalesced_with", "near_duplicate_of", "timings"
+)
+
+class ResultStore:
+    """
+    Append-only SQLite store of extraction results
+
+    Rows are only ever inserted, in batches, so one transaction covers many
+    results. Lookups use indexes on the request ID, the image and cache-key
+    hashes, and (created_at, seq); listings page with a keyset cursor
+    instead of OFFSET, so every page costs the same.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, request_id TEXT NOT NULL, created_at REAL NOT NULL, "
+            "status TEXT NOT NULL, status_code INTEGER NOT NULL, error_type TEXT, priority TEXT, "
+            "image_1_sha256 TEXT, image_2_sha256 TEXT, cache_key TEXT, prompt_version TEXT, "
+            "model_name TEXT, cached INTEGER NOT NULL DEFAULT 0, coalesced_with TEXT, "
+            "near_duplicate_of TEXT, timings TEXT, data TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_request_id ON results (request_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created_at, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_image_1 ON results (image_1_sha256)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_image_2 ON results (image_2_sha256)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_cache_key ON results (cache_key)")
+
+    def append_many(self, rows: List[Dict[str, Any]]):
+        """
+        Insert results in one transaction
+
+        Args:
+            rows: Results as built by `result_row`
+        """
+        columns = [column for column in RESULT_COLUMNS if column != "seq"] + ["data"]
+        sql = (
+            f"INSERT INTO results ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(sql, [tuple(row[column] for column in columns) for row in rows])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def by_request_id(self, request_id: str) -> List[Dict[str, Any]]:
+        """
+        Get every result stored for a request, newest first
+
+        A job retried after a restart can have more than one.
+
+        Args:
+            request_id: Request or job ID
+
+        Returns:
+            List: Stored results
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM results WHERE request_id = ? ORDER BY seq DESC", (request_id,)
+            ).fetchall()
+        return [_describe_row(row) for row in rows]
+
+    def page(
+        self,
+        content_hash: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        cursor: Optional[Tuple[float, int]] = None,
+        limit: int = 100
+    ) -> List[sqlite3.Row]:
+        """
+        Get one page of results, newest first
+
+        Args:
+            content_hash: SHA-256 of either image, or the result cache key
+            since: Earliest creation time, as a Unix timestamp
+            until: Creation time to stop before, as a Unix timestamp
+            cursor: (created_at, seq) of the last row of the previous page
+            limit: Page size
+
+        Returns:
+            List: Raw rows, with the data column still JSON text
+        """
+        clauses, params = [], []
+        if content_hash:
+            clauses.append("(image_1_sha256 = ? OR image_2_sha256 = ? OR cache_key = ?)")
+            params.extend([content_hash] * 3)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("(created_at, seq) < (?, ?)")
+            params.extend(cursor)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            return self._db.execute(
+                f"SELECT * FROM results {where}ORDER BY created_at DESC, seq DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+
+    def count(self) -> int:
+        """
+        Count stored results
+
+        Returns:
+            int: Number of rows
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+class ResultWriter:
+    """
+    Write-behind queue in front of the result store
+
+    Requests only append to an in-memory queue; a background task drains
+    it and commits up to `batch_size` results per transaction, waiting at
+    most `flush_interval` seconds for a batch to fill. When the queue is
+    full, results are dropped and counted rather than slowing requests down.
+    """
+
+    def __init__(self, store: ResultStore, batch_size: int = 100, flush_interval: float = 0.5, max_queue: int = 10000):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the background writer"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer after committing everything queued before the call"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(self, row: Dict[str, Any]):
+        """
+        Queue a result for writing without waiting
+
+        Args:
+            row: Result as built by `result_row`
+        """
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            RESULT_STORE_WRITES.labels("dropped").inc()
+            logger.warning("[%s] Result store queue is full, result not persisted", row['request_id'])
+
+    async def _run(self):
+        """Commit queued results in batches until the stop marker arrives"""
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                # Wait indefinitely for the first result, then up to the flush interval
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        """Commit one batch; a failed batch is logged and counted, not retried"""
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self.store.append_many, batch)
+        except Exception as e:
+            RESULT_STORE_WRITES.labels("failed").inc(len(batch))
+            logger.error("Failed to persist %d results: %s", len(batch), e)
+            return
+        RESULT_STORE_WRITES.labels("written").inc(len(batch))
+
+def result_row(status_code: int, content: Dict[str, Any], context: ExtractionContext) -> Dict[str, Any]:
+    """
+    Build the stored form of an extraction response
+
+    Args:
+        status_code: HTTP status code of the response
+        content: Response body
+        context: Per-request context of the extraction
+
+    Returns:
+        Dict: Column values
+    """
+    image_hashes = context.image_hashes + [None] * (2 - len(context.image_hashes))
+    error = content.get("error") if status_code != 200 else None
+    return {
+        "request_id": context.request_id,
+        "created_at": time.time(),
+        "status": content.get("status", "error"),
+        "status_code": status_code,
+        "error_type": error.get("type") if error else None,
+        "priority": context.priority,
+        "image_1_sha256": image_hashes[0],
+        "image_2_sha256": image_hashes[1],
+        "cache_key": context.cache_key,
+        "prompt_version": context.prompt_version,
+        "model_name": context.model_name,
+        "cached": int(context.cached),
+        "coalesced_with": context.coalesced_with,
+        "near_duplicate_of": context.near_duplicate_of,
+        "timings": jsonlib.dumps(context.timings_ms()).decode("utf-8"),
+        "data": jsonlib.dumps(content["data"] if status_code == 200 else error).decode("utf-8")
+    }
+
+def encode_row(row: sqlite3.Row) -> bytes:
+    """
+    Serialize a stored result for a listing
+
+    The data column is already JSON, so it is spliced in as is instead of
+    being parsed and serialized again.
+
+    Args:
+        row: Raw row
+
+    Returns:
+        bytes: JSON object
+    """
+    head = jsonlib.dumps(_describe_row(row, with_data=False))
+    return head[:-1] + b',"data":' + row["data"].encode("utf-8") + b"}"
+
+def _describe_row(row: sqlite3.Row, with_data: bool = True) -> Dict[str, Any]:
+    """Turn a raw row into the API form of a stored result"""
+    result = {column: row[column] for column in RESULT_COLUMNS}
+    result["created_at"] = datetime.fromtimestamp(row["created_at"]).isoformat()
+    result["cached"] = bool(row["cached"])
+    result["timings"] = jsonlib.loads(row["timings"]) if row["timings"] else {}
+    if with_data:
+        result["data"] = jsonlib.loads(row["data"])
+    return result
+
+_result_store: Optional[ResultStore] = None
+_result_writer: Optional[ResultWriter] = None
+
+def get_result_store() -> Optional[ResultStore]:
+    """
+    Get the process-wide result store
+
+    Returns:
+        ResultStore: Store opened from RESULT_STORE_PATH, or None if disabled
+    """
+    global _result_store
+    if os.getenv("RESULT_STORE_ENABLED", "true").lower() != "true":
+        return None
+
+    if _result_store is None:
+        _result_store = ResultStore(os.getenv("RESULT_STORE_PATH", "results/results.db"))
+    return _result_store
+
+def start_result_writer() -> Optional[ResultWriter]:
+    """
+    Start the background result writer
+
+    Returns:
+        ResultWriter: Running writer, or None if the result store is disabled
+    """
+    global _result_writer
+    store = get_result_store()
+    if store is None:
+        return None
+
+    _result_writer = ResultWriter(
+        store,
+        batch_size=int(os.getenv("RESULT_STORE_BATCH_SIZE", "100")),
+        flush_interval=float(os.getenv("RESULT_STORE_FLUSH_INTERVAL", "0.5")),
+        max_queue=int(os.getenv("RESULT_STORE_MAX_QUEUE", "10000"))
+    )
+    _result_writer.start()
+    return _result_writer
+
+async def stop_result_writer():
+    """Stop the result writer, committing the results still queued"""
+    global _result_writer
+    writer, _result_writer = _result_writer, None
+    if writer is not None:
+        await writer.stop()
+
+def record_result(status_code: int, content: Dict[str, Any], context: ExtractionContext):
+    """
+    Queue an extraction response for persistence, if the writer is running
+
+    Args:
+        status_code: HTTP status code of the response
+        content: Response body
+        context: Per-request context of the extraction
+    """
+    if _result_writer is None:
+        return
+    try:
+        _result_writer.submit(result_row(status_code, content, context))
+    except Exception as e:
+        logger.error("[%s] Failed to queue result for persistence: %s", context.request_id, e)
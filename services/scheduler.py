@@ -0,0 +1,428 @@
+# services/scheduler.py
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.limiter import UpstreamBusyError
+from services.metrics import SCHEDULE_WAIT_SECONDS, UPSTREAM_ESTIMATED_TOKENS
+from services.shared_state import SharedStateStore, get_shared_store
+
+logger = logging.getLogger("patient-care-api")
+
+# Traffic classes, most urgent first
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_JOB = "job"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_JOB)
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+# Gemini bills small images as one tile and larger ones per 768x768 tile
+IMAGE_TILE_PIXELS = 768
+IMAGE_SMALL_PIXELS = 384
+TOKENS_PER_IMAGE_TILE = 258
+# Vietnamese text with diacritics runs at roughly three characters per token
+CHARS_PER_TOKEN = 3
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    Estimate the input tokens Gemini charges for one image
+
+    Args:
+        width: Width of the image as sent
+        height: Height of the image as sent
+
+    Returns:
+        int: Estimated tokens
+    """
+    if width <= IMAGE_SMALL_PIXELS and height <= IMAGE_SMALL_PIXELS:
+        return TOKENS_PER_IMAGE_TILE
+    tiles = math.ceil(width / IMAGE_TILE_PIXELS) * math.ceil(height / IMAGE_TILE_PIXELS)
+    return tiles * TOKENS_PER_IMAGE_TILE
+
+def estimate_request_tokens(image_sizes: Iterable[Tuple[int, int]], prompt_text: str) -> int:
+    """
+    Estimate the input tokens of one extraction request
+
+    Args:
+        image_sizes: (width, height) of each image as sent
+        prompt_text: Extraction prompt
+
+    Returns:
+        int: Estimated tokens
+    """
+    image_tokens = sum(estimate_image_tokens(width, height) for width, height in image_sizes)
+    return image_tokens + math.ceil(len(prompt_text) / CHARS_PER_TOKEN)
+
+class RateBudget:
+    """
+    Requests-per-minute and tokens-per-minute token buckets, checked together
+
+    Each bucket holds up to one minute of quota and refills continuously.
+    A limit of 0 leaves that bucket unbounded. A request is admitted only
+    when both buckets can pay for it, so neither quota is overrun by bursts.
+    """
+
+    def __init__(self, rpm_limit: float, tpm_limit: float):
+        self.limits = {"requests": float(rpm_limit), "tokens": float(tpm_limit)}
+        self._levels = dict(self.limits)
+        self._updated_at = self._clock()
+
+    @property
+    def unlimited(self) -> bool:
+        """Whether no bucket is bounded"""
+        return all(limit <= 0 for limit in self.limits.values())
+
+    def _clock(self) -> float:
+        return time.monotonic()
+
+    def _refilled(self, bucket: str, level: float, elapsed: float) -> float:
+        """Add the quota earned over `elapsed` seconds, up to one minute's worth"""
+        limit = self.limits[bucket]
+        if limit <= 0:
+            return level
+        return min(limit, level + max(0.0, elapsed) * limit / 60)
+
+    @contextmanager
+    def _held_levels(self) -> Iterator[Dict[str, float]]:
+        """Current bucket levels; changes made to the dict are kept"""
+        now = self._clock()
+        for bucket, level in self._levels.items():
+            self._levels[bucket] = self._refilled(bucket, level, now - self._updated_at)
+        self._updated_at = now
+        yield self._levels
+
+    def _peek_levels(self) -> Dict[str, float]:
+        """Bucket levels as of now, refilled from the last known state without changing it"""
+        elapsed = self._clock() - self._updated_at
+        return {bucket: self._refilled(bucket, level, elapsed) for bucket, level in self._levels.items()}
+
+    async def _run(self, operation, *args):
+        """Run a bucket operation from a coroutine"""
+        return operation(*args)
+
+    def _wait(self, levels: Dict[str, float], amounts: Dict[str, float]) -> float:
+        """Seconds until every bucket holds its amount"""
+        wait = 0.0
+        for bucket, limit in self.limits.items():
+            deficit = amounts[bucket] - levels[bucket]
+            if limit > 0 and deficit > 0:
+                wait = max(wait, deficit / (limit / 60))
+        return wait
+
+    def cap_tokens(self, tokens: float) -> float:
+        """Clamp a request's tokens to the bucket size, so an oversized request can still run"""
+        limit = self.limits["tokens"]
+        return min(tokens, limit) if limit > 0 else tokens
+
+    async def try_take(self, requests: float, tokens: float) -> float:
+        """
+        Pay for a request if both buckets can afford it
+
+        Args:
+            requests: Requests to take
+            tokens: Tokens to take
+
+        Returns:
+            float: 0 if taken, otherwise seconds until the buckets can afford it
+        """
+        return await self._run(self._try_take, requests, tokens)
+
+    def _try_take(self, requests: float, tokens: float) -> float:
+        amounts = {"requests": requests, "tokens": tokens}
+        with self._held_levels() as levels:
+            wait = self._wait(levels, amounts)
+            if wait == 0:
+                for bucket, limit in self.limits.items():
+                    if limit > 0:
+                        levels[bucket] -= amounts[bucket]
+            return wait
+
+    async def debit(self, requests: float, tokens: float):
+        """Charge usage that was not admitted through try_take, such as retries; levels may go negative"""
+        await self._run(self._debit, requests, tokens)
+
+    def _debit(self, requests: float, tokens: float):
+        amounts = {"requests": requests, "tokens": tokens}
+        with self._held_levels() as levels:
+            for bucket, limit in self.limits.items():
+                if limit > 0:
+                    levels[bucket] -= amounts[bucket]
+
+    async def drain(self):
+        """Empty the buckets after the upstream reported its quota exhausted"""
+        await self._run(self._drain)
+
+    def _drain(self):
+        with self._held_levels() as levels:
+            for bucket in levels:
+                levels[bucket] = min(levels[bucket], 0.0)
+
+    def estimate_wait(self, requests: float, tokens: float) -> float:
+        """
+        Predict how long the buckets need to afford an amount, without taking it
+
+        Args:
+            requests: Requests
+            tokens: Tokens
+
+        Returns:
+            float: Seconds
+        """
+        return self._wait(self._peek_levels(), {"requests": requests, "tokens": tokens})
+
+    def remaining(self) -> Dict[str, float]:
+        """
+        Get the quota left in each bounded bucket
+
+        Returns:
+            Dict: Bucket name to level
+        """
+        levels = self._peek_levels()
+        return {bucket: levels[bucket] for bucket, limit in self.limits.items() if limit > 0}
+
+class SharedRateBudget(RateBudget):
+    """
+    RateBudget whose buckets are shared by all worker processes
+
+    The quota is per API project, so every worker pays from the same
+    buckets, kept as rows of the shared state store. Times are wall-clock,
+    since monotonic clocks are not comparable across processes. Bucket
+    transactions run in a thread, since they can wait on other workers for
+    up to the busy timeout; estimates read the levels this worker last saw.
+    """
+
+    def __init__(self, store: SharedStateStore, name: str, rpm_limit: float, tpm_limit: float):
+        self.store = store
+        self.name = name
+        super().__init__(rpm_limit, tpm_limit)
+        with store.transaction() as db:
+            for bucket, limit in self.limits.items():
+                db.execute(
+                    "INSERT OR IGNORE INTO rate_buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                    (f"{name}:{bucket}", limit, self._updated_at)
+                )
+            self._remember(db)
+
+    def _clock(self) -> float:
+        return time.time()
+
+    @contextmanager
+    def _held_levels(self) -> Iterator[Dict[str, float]]:
+        with self.store.transaction() as db:
+            now = self._clock()
+            levels = {}
+            for bucket in self.limits:
+                level, updated_at = db.execute(
+                    "SELECT level, updated_at FROM rate_buckets WHERE name = ?", (f"{self.name}:{bucket}",)
+                ).fetchone()
+                levels[bucket] = self._refilled(bucket, level, now - updated_at)
+            yield levels
+            for bucket, level in levels.items():
+                db.execute(
+                    "UPDATE rate_buckets SET level = ?, updated_at = ? WHERE name = ?",
+                    (level, now, f"{self.name}:{bucket}")
+                )
+            self._levels, self._updated_at = dict(levels), now
+
+    def _remember(self, db):
+        """Cache the stored levels, refilled to a common time, for estimates"""
+        now = self._clock()
+        for bucket in self.limits:
+            level, updated_at = db.execute(
+                "SELECT level, updated_at FROM rate_buckets WHERE name = ?", (f"{self.name}:{bucket}",)
+            ).fetchone()
+            self._levels[bucket] = self._refilled(bucket, level, now - updated_at)
+        self._updated_at = now
+
+    async def _run(self, operation, *args):
+        # Shielded, so a cancelled caller does not abandon a transaction half way
+        return await asyncio.shield(asyncio.to_thread(operation, *args))
+
+@dataclass
+class _Waiter:
+    """A request queued for the rate budget"""
+    priority: str
+    tokens: float
+    future: asyncio.Future
+
+class UpstreamScheduler:
+    """
+    Admits upstream calls against the rate budget in priority order
+
+    Interactive requests are admitted before batch pairs, and batch pairs
+    before background jobs; within a class the order is first come, first
+    served. A caller whose predicted wait exceeds the limit for its class
+    is rejected at once rather than queued. With shared state, the budget
+    is shared by all workers but the priority order holds within each one.
+    """
+
+    def __init__(self, budget: RateBudget, max_wait: Dict[str, float], retry_after: int):
+        self.budget = budget
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def queue_depth(self, priority: str) -> int:
+        """Number of callers of a class waiting for the budget"""
+        return sum(1 for _, _, waiter in self._queue if waiter.priority == priority and not waiter.future.done())
+
+    def predicted_wait(self, priority: str, tokens: float = 0) -> float:
+        """
+        Predict how long a new caller would wait for the budget
+
+        The caller waits for everything queued in its class or a more
+        urgent one, plus its own request.
+
+        Args:
+            priority: Traffic class of the caller
+            tokens: Estimated tokens of the caller's request
+
+        Returns:
+            float: Seconds
+        """
+        if self.budget.unlimited:
+            return 0.0
+        rank = PRIORITY_RANK[priority]
+        ahead = [
+            waiter for waiter_rank, _, waiter in self._queue
+            if waiter_rank <= rank and not waiter.future.done()
+        ]
+        return self.budget.estimate_wait(
+            len(ahead) + 1, sum(waiter.tokens for waiter in ahead) + self.budget.cap_tokens(tokens)
+        )
+
+    async def admit(self, priority: str, tokens: float) -> float:
+        """
+        Wait until the budget can pay for one upstream request
+
+        Args:
+            priority: Traffic class, one of PRIORITIES
+            tokens: Estimated tokens of the request
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            UpstreamBusyError: If the predicted wait is too long or the wait times out
+        """
+        estimated_tokens = tokens
+        tokens = self.budget.cap_tokens(tokens)
+        if not self._queue and await self.budget.try_take(1, tokens) == 0:
+            SCHEDULE_WAIT_SECONDS.labels(priority).observe(0)
+            UPSTREAM_ESTIMATED_TOKENS.labels(priority).inc(estimated_tokens)
+            return 0.0
+
+        max_wait = self.max_wait[priority]
+        predicted = self.predicted_wait(priority, tokens)
+        if predicted > max_wait:
+            raise UpstreamBusyError(
+                f"Upstream rate budget exhausted, predicted wait {predicted:.1f}s for {priority} traffic",
+                max(self.retry_after, math.ceil(predicted))
+            )
+
+        start_time = time.monotonic()
+        waiter = _Waiter(priority, tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (PRIORITY_RANK[priority], next(self._sequence), waiter))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=max_wait)
+        except asyncio.TimeoutError:
+            raise UpstreamBusyError(
+                f"Timed out after {max_wait:g}s waiting for the upstream rate budget",
+                self.retry_after
+            )
+        finally:
+            if not waiter.future.done():
+                waiter.future.cancel()
+
+        waited = time.monotonic() - start_time
+        SCHEDULE_WAIT_SECONDS.labels(priority).observe(waited)
+        UPSTREAM_ESTIMATED_TOKENS.labels(priority).inc(estimated_tokens)
+        return waited
+
+    async def charge(self, tokens: float):
+        """Pay for an extra upstream request of an admitted call, such as a retry or a hedge"""
+        await self.budget.debit(1, self.budget.cap_tokens(tokens))
+
+    async def throttle(self):
+        """Hold back new requests after the upstream rejected one for quota"""
+        if not self.budget.unlimited:
+            logger.warning("Upstream reported its quota exhausted, draining the rate budget")
+            await self.budget.drain()
+
+    def _dispatch(self):
+        """Wake the dispatcher to look at a new caller, starting it if needed"""
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._run_dispatcher())
+
+    async def _run_dispatcher(self):
+        """Admit queued callers in order while the budget allows, sleeping until it refills"""
+        while self._queue:
+            self._wakeup.clear()
+            entry = self._queue[0]
+            waiter = entry[2]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = await self.budget.try_take(1, waiter.tokens)
+            if wait > 0:
+                # A more urgent caller arriving meanwhile wakes us early
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # The queue may have changed while the budget was being taken
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+
+_scheduler: Optional[UpstreamScheduler] = None
+
+def get_upstream_scheduler() -> UpstreamScheduler:
+    """
+    Get the process-wide scheduler for upstream Gemini calls
+
+    Returns:
+        UpstreamScheduler: Scheduler configured from environment variables
+    """
+    global _scheduler
+    if _scheduler is None:
+        limits = dict(
+            rpm_limit=float(os.getenv("GEMINI_RPM_LIMIT", "0")),
+            tpm_limit=float(os.getenv("GEMINI_TPM_LIMIT", "0"))
+        )
+        store = get_shared_store()
+        if store is not None:
+            # The quota belongs to the API project, not to one worker
+            budget = SharedRateBudget(store, "upstream", **limits)
+        else:
+            budget = RateBudget(**limits)
+        interactive_wait = float(os.getenv("GEMINI_RATE_MAX_WAIT", "30"))
+        background_wait = float(os.getenv("GEMINI_RATE_BACKGROUND_MAX_WAIT", "300"))
+        _scheduler = UpstreamScheduler(
+            budget,
+            max_wait={
+                PRIORITY_INTERACTIVE: interactive_wait,
+                PRIORITY_BATCH: background_wait,
+                PRIORITY_JOB: background_wait
+            },
+            retry_after=int(os.getenv("GEMINI_RETRY_AFTER", "5"))
+        )
+        logger.info(
+            "Upstream scheduler configured: rpm_limit=%g, tpm_limit=%g, shared=%s",
+            limits['rpm_limit'], limits['tpm_limit'], store is not None
+        )
+    return _scheduler
@@ -0,0 +1,194 @@
+# services/sections.py
+import os
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.registry import PromptVersion, get_registry
+from services.response_schema import ResponseSchema, get_response_schema
+
+logger = logging.getLogger("patient-care-api")
+
+EXTRACTION_MODES = ("single", "sectioned")
+
+# The section that checks the pages belong together; it extracts no fields
+CONSISTENCY_SECTION = "consistency"
+
+# Top-level objects of an extraction result that are split across sections
+SECTIONED_ROOTS = ("phieu_cham_soc", "confidence_scores")
+
+@dataclass(frozen=True)
+class ExtractionSection:
+    """A group of form fields extracted by one upstream call"""
+    name: str
+    # Keys of phieu_cham_soc this section owns, in template order
+    fields: Tuple[str, ...]
+
+# In template order, so merged results keep the key order of a single call
+EXTRACTION_SECTIONS = (
+    ExtractionSection("patient_info", (
+        "1_ho_ten_benh_nhan",
+        "2_tuoi",
+        "3_gioi_tinh",
+        "4_chan_doan",
+        "5_benh_kem_theo",
+        "6_so_dien_thoai_lien_he",
+        "ten_nguoi_than"
+    )),
+    ExtractionSection("condition", (
+        "7_sa_sut_tri_tue",
+        "8_tri_giac",
+        "9_the_trang",
+        "10_ho_hap",
+        "11_dinh_duong",
+        "12_van_dong",
+        "13_vet_thuong_vet_mo_vet_loet",
+        "14_ve_sinh_ca_nhan"
+    )),
+    ExtractionSection("care_log", (
+        "noi_dung_cong_viec_va_gio_thuc_hien",
+        "ngay_giao_ca",
+        "ngay_nhan_ca",
+        "csv_giao_ca",
+        "csv_nhan_ca",
+        "dia_diem",
+        "so_pyc",
+        "ma_kh"
+    ))
+)
+
+def get_extraction_mode() -> str:
+    """
+    Get how extractions call the upstream
+
+    "single" sends the whole prompt in one call; "sectioned" runs the
+    consistency check and each field section as concurrent calls.
+
+    Returns:
+        str: Extraction mode
+
+    Raises:
+        ValueError: If EXTRACTION_MODE is not a known mode
+    """
+    mode = os.getenv("EXTRACTION_MODE", "single").lower()
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"EXTRACTION_MODE must be one of {', '.join(EXTRACTION_MODES)}")
+    return mode
+
+def section_names() -> List[str]:
+    """
+    Get the names of all sectioned calls, consistency check first
+
+    Returns:
+        List: Section names
+    """
+    return [CONSISTENCY_SECTION] + [section.name for section in EXTRACTION_SECTIONS]
+
+def get_section_prompts() -> Dict[str, PromptVersion]:
+    """
+    Get the active prompt of every section, registering them on first use
+
+    Section prompts are read from SECTION_PROMPT_DIR and hot-reloaded by the
+    registry like the main prompt.
+
+    Returns:
+        Dict: Prompt per section name, consistency check first
+    """
+    registry = get_registry()
+    prompt_dir = os.getenv("SECTION_PROMPT_DIR", "prompt/sections")
+    prompts = {}
+    for name in section_names():
+        try:
+            prompts[name] = registry.get_prompt(f"section_{name}")
+        except KeyError:
+            prompts[name] = registry.register_prompt(f"section_{name}", os.path.join(prompt_dir, f"{name}.txt"))
+    return prompts
+
+def get_section_schemas() -> Dict[str, Optional[ResponseSchema]]:
+    """
+    Get the response schema of every section
+
+    Field sections are constrained to the fields they own.
+
+    Returns:
+        Dict: Schema per section name, or None values if schemas are disabled
+    """
+    schemas = {CONSISTENCY_SECTION: get_response_schema(CONSISTENCY_SECTION)}
+    for section in EXTRACTION_SECTIONS:
+        schemas[section.name] = get_response_schema(section.name, section.fields)
+    return schemas
+
+def sections_fingerprint(prompts: Dict[str, PromptVersion]) -> str:
+    """
+    Hash the section prompts together, for cache keys of sectioned extractions
+
+    Args:
+        prompts: Prompt per section name
+
+    Returns:
+        str: Hex digest that changes when any section prompt changes
+    """
+    digest = hashlib.sha256(b"sectioned")
+    for name, prompt in prompts.items():
+        digest.update(f"\0{name}:{prompt.sha256}".encode("utf-8"))
+    return digest.hexdigest()
+
+def first_section_error(results: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Find the error reported by the model in the earliest section
+
+    Args:
+        results: Parsed result per section name
+
+    Returns:
+        Dict: The error result, or None if every section succeeded
+    """
+    for name in section_names():
+        result = results.get(name)
+        if result is not None and result.get("error"):
+            return result
+    return None
+
+def section_values(section: ExtractionSection, result: Dict[str, Any]) -> List[Tuple[List[str], Any]]:
+    """
+    Pick the fields a section owns out of its result
+
+    Fields the model left out become None; fields owned by other sections
+    are ignored.
+
+    Args:
+        section: Section that produced the result
+        result: Parsed section result
+
+    Returns:
+        List: (path, value) pairs, e.g. (["phieu_cham_soc", "2_tuoi"], "60")
+    """
+    values = []
+    for root in SECTIONED_ROOTS:
+        part = result.get(root)
+        if not isinstance(part, dict):
+            part = {}
+        for field_name in section.fields:
+            values.append(([root, field_name], part.get(field_name)))
+    return values
+
+def merge_sections(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge the results of the field sections into the shape of a single call
+
+    The merge only depends on the section definitions, not on the order the
+    calls completed in, so the same section results always give the same
+    document.
+
+    Args:
+        results: Parsed result per section name, all without errors
+
+    Returns:
+        Dict: {"phieu_cham_soc": {...}, "confidence_scores": {...}}
+    """
+    merged: Dict[str, Dict[str, Any]] = {root: {} for root in SECTIONED_ROOTS}
+    for section in EXTRACTION_SECTIONS:
+        for (root, field_name), value in section_values(section, results[section.name]):
+            merged[root][field_name] = value
+    return merged
@@ -0,0 +1,234 @@
+# services/shared_state.py
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Set
+
+logger = logging.getLogger("patient-care-api")
+
+_worker_id: Optional[str] = None
+_worker_pid: Optional[int] = None
+
+def get_worker_id() -> str:
+    """
+    Get the ID of this worker process, unique across restarts
+
+    Returns:
+        str: "<host>:<pid>:<random>"
+    """
+    global _worker_id, _worker_pid
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_id = f"{socket.gethostname()}:{_worker_pid}:{uuid.uuid4().hex[:8]}"
+    return _worker_id
+
+class SharedStateStore:
+    """
+    SQLite file holding the state that must agree across worker processes
+
+    Workers register themselves and heartbeat; rows owned by a worker whose
+    heartbeat went stale (a crashed or killed process) are ignored and
+    purged, so a dead worker never keeps an upstream slot or a breaker
+    trial forever. Every transaction is short, and the file is in WAL mode
+    so readers never wait for writers.
+    """
+
+    def __init__(self, db_path: str, heartbeat_interval: float = 2.0):
+        self.db_path = db_path
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = heartbeat_interval * 5
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "worker_id TEXT PRIMARY KEY, pid INTEGER NOT NULL, started_at REAL NOT NULL, heartbeat_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "name TEXT NOT NULL, holder TEXT PRIMARY KEY, worker_id TEXT NOT NULL, acquired_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS leases_name ON leases (name)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS waiters ("
+            "name TEXT NOT NULL, holder TEXT PRIMARY KEY, worker_id TEXT NOT NULL, queued_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS waiters_name ON waiters (name)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS breakers ("
+            "name TEXT PRIMARY KEY, failures INTEGER NOT NULL DEFAULT 0, opened_at REAL, "
+            "trial_worker TEXT, trial_at REAL, trial_token TEXT)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(breakers)")}
+        if "trial_token" not in columns:
+            self._db.execute("ALTER TABLE breakers ADD COLUMN trial_token TEXT")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run statements in one write transaction
+
+        Yields:
+            sqlite3.Connection: Connection to run statements on
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        """
+        Run a read-only query
+
+        Args:
+            sql: SELECT statement
+            params: Statement parameters
+
+        Returns:
+            list: Result rows
+        """
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def register_worker(self):
+        """Announce this worker and drop the rows of workers that stopped heartbeating"""
+        now = time.time()
+        with self.transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                (get_worker_id(), os.getpid(), now, now)
+            )
+            self._purge_stale(db, now)
+
+    def heartbeat(self):
+        """Mark this worker as alive and purge stale ones"""
+        now = time.time()
+        with self.transaction() as db:
+            db.execute("UPDATE workers SET heartbeat_at = ? WHERE worker_id = ?", (now, get_worker_id()))
+            self._purge_stale(db, now)
+
+    def unregister_worker(self):
+        """Remove this worker and everything it still holds"""
+        worker_id = get_worker_id()
+        with self.transaction() as db:
+            db.execute("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+            db.execute("DELETE FROM waiters WHERE worker_id = ?", (worker_id,))
+            db.execute(
+                "UPDATE breakers SET trial_worker = NULL, trial_at = NULL, trial_token = NULL WHERE trial_worker = ?",
+                (worker_id,)
+            )
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def live_workers(self) -> Set[str]:
+        """
+        Get the workers with a recent heartbeat
+
+        Returns:
+            Set: Worker IDs
+        """
+        cutoff = time.time() - self.stale_after
+        rows = self.query("SELECT worker_id FROM workers WHERE heartbeat_at >= ?", (cutoff,))
+        return {row[0] for row in rows}
+
+    def _purge_stale(self, db: sqlite3.Connection, now: float):
+        """Delete workers that stopped heartbeating, with their leases, waits and trials (transaction held)"""
+        cutoff = now - self.stale_after
+        stale = [row[0] for row in db.execute("SELECT worker_id FROM workers WHERE heartbeat_at < ?", (cutoff,))]
+        for worker_id in stale:
+            logger.warning("Worker %s stopped heartbeating, releasing its shared state", worker_id)
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+        live = "SELECT worker_id FROM workers"
+        db.execute(f"DELETE FROM leases WHERE worker_id NOT IN ({live})")
+        db.execute(f"DELETE FROM waiters WHERE worker_id NOT IN ({live})")
+        db.execute(
+            "UPDATE breakers SET trial_worker = NULL, trial_at = NULL, trial_token = NULL "
+            f"WHERE trial_worker NOT IN ({live})"
+        )
+
+    async def run_heartbeat(self):
+        """Heartbeat until cancelled"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await asyncio.to_thread(self.heartbeat)
+            except Exception as e:
+                logger.warning("Shared state heartbeat failed: %s", e)
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._db.close()
+
+_shared_store: Optional[SharedStateStore] = None
+_heartbeat_task: Optional[asyncio.Task] = None
+
+def get_shared_store() -> Optional[SharedStateStore]:
+    """
+    Get the store shared by the worker processes
+
+    Returns:
+        SharedStateStore: Store opened from SHARED_STATE_PATH, or None when
+            running as a single process without shared state
+    """
+    global _shared_store
+    db_path = os.getenv("SHARED_STATE_PATH")
+    if not db_path:
+        return None
+
+    if _shared_store is None:
+        _shared_store = SharedStateStore(
+            db_path,
+            heartbeat_interval=float(os.getenv("SHARED_STATE_HEARTBEAT_INTERVAL", "2"))
+        )
+        _shared_store.register_worker()
+        logger.info("Shared state at %s, worker %s", db_path, get_worker_id())
+    return _shared_store
+
+def start_shared_state():
+    """Register this worker and start its heartbeat, if shared state is enabled"""
+    global _heartbeat_task
+    store = get_shared_store()
+    if store is not None and _heartbeat_task is None:
+        _heartbeat_task = asyncio.create_task(store.run_heartbeat())
+
+async def stop_shared_state():
+    """Stop the heartbeat and release everything this worker holds"""
+    global _heartbeat_task, _shared_store
+    if _heartbeat_task is not None:
+        _heartbeat_task.cancel()
+        await asyncio.gather(_heartbeat_task, return_exceptions=True)
+        _heartbeat_task = None
+    if _shared_store is not None:
+        await asyncio.to_thread(_shared_store.unregister_worker)
+        _shared_store.close()
+        _shared_store = None
+
+def live_worker_ids() -> Set[str]:
+    """
+    Get the workers whose in-progress work must not be taken over
+
+    Returns:
+        Set: Live worker IDs; only this worker without shared state
+    """
+    store = get_shared_store()
+    if store is None:
+        return {get_worker_id()}
+    return store.live_workers() | {get_worker_id()}
@@ -0,0 +1,153 @@
+# services/warmup.py
+import io
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict
+
+from PIL import Image, ImageDraw
+
+from services.backends import get_backend
+from services.cache import get_result_cache
+from services.images import ImageEnvelope
+from services.image_pool import get_image_pool
+from services.jobs import get_job_store
+from services.limiter import get_upstream_limiter
+from services.preprocessing import get_preprocess_profile, preprocess_images
+from services.quality import assess_images, get_quality_thresholds
+from services.registry import get_registry
+from services.resilience import get_resilient_caller
+from services.response_schema import get_response_schema
+from services.scheduler import get_upstream_scheduler
+from services.sections import get_extraction_mode, get_section_prompts, get_section_schemas
+
+logger = logging.getLogger("patient-care-api")
+
+# Upload formats whose codecs are loaded before the first request
+WARMUP_FORMATS = ("JPEG", "PNG", "WEBP")
+
+_ready = False
+_startup_timings: Dict[str, Any] = {}
+
+def _warm_codecs():
+    """Register the upload formats' plugins and run each codec once"""
+    # preinit() covers JPEG and PNG; an unregistered format would make Pillow import every plugin
+    Image.preinit()
+    from PIL import WebPImagePlugin  # noqa: F401
+    sample = Image.new("RGB", (64, 64), (235, 235, 230))
+    for image_format in WARMUP_FORMATS:
+        output = io.BytesIO()
+        sample.save(output, format=image_format)
+        output.seek(0)
+        with Image.open(output) as decoded:
+            decoded.load()
+
+def _sample_page() -> bytes:
+    """A blank ruled page, encoded like a phone photo of a form"""
+    page = Image.new("RGB", (1200, 1600), (235, 235, 230))
+    draw = ImageDraw.Draw(page)
+    for y in range(100, 1600, 60):
+        draw.line((80, y, 1120, y), fill=(40, 40, 40), width=2)
+    output = io.BytesIO()
+    page.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+async def warm_up() -> Dict[str, float]:
+    """
+    Exercise the request path once before the worker takes traffic
+
+    Loads the image codecs, builds the backend's model client (importing
+    the Gemini SDK), opens the stores, loads the prompt, compiles the
+    response schema, and runs a sample page through decoding, the quality
+    gate and preprocessing on every image worker, so the first real
+    requests do not pay for imports, codec initialization, thread start-up
+    or database connections.
+
+    Returns:
+        Dict: Seconds spent warming each component
+    """
+    timings: Dict[str, float] = {}
+    if os.getenv("WARMUP_ENABLED", "true").lower() != "true":
+        record_startup_timing("warmup", timings)
+        return timings
+
+    async def step(name: str, coroutine):
+        stage_start = time.perf_counter()
+        try:
+            await coroutine
+        except Exception as e:
+            logger.warning("Warmup step %s failed: %s", name, e)
+        timings[name] = time.perf_counter() - stage_start
+
+    async def warm_state():
+        get_registry().get_prompt("extraction")
+        get_response_schema()
+        if get_extraction_mode() == "sectioned":
+            get_section_prompts()
+            get_section_schemas()
+        get_upstream_limiter()
+        get_resilient_caller()
+        get_upstream_scheduler()
+        get_result_cache()
+        await asyncio.to_thread(get_job_store().queue_depth)
+
+    async def warm_images():
+        pool = get_image_pool()
+        data = _sample_page()
+        envelopes = [ImageEnvelope.from_bytes(data, "warmup.jpg") for _ in range(pool.max_workers)]
+        await assess_images(envelopes, get_quality_thresholds(), pool)
+        await preprocess_images(envelopes, get_preprocess_profile(), pool)
+        for envelope in envelopes:
+            envelope.release()
+
+    await step("codecs", asyncio.to_thread(_warm_codecs))
+    await step("clients", asyncio.to_thread(get_backend().warm))
+    await step("state", warm_state())
+    await step("images", warm_images())
+
+    logger.info(
+        "Warmup completed in %.2fs (%s)",
+        sum(timings.values()),
+        ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in timings.items())
+    )
+    record_startup_timing("warmup", timings)
+    return timings
+
+def record_startup_timing(phase: str, seconds: Any):
+    """
+    Remember how long a startup phase took, for the readiness endpoint
+
+    Args:
+        phase: Phase name, e.g. "import" or "warmup"
+        seconds: Elapsed seconds, or seconds per step
+    """
+    _startup_timings[phase] = seconds
+
+def set_ready(ready: bool):
+    """
+    Mark whether this worker should receive traffic
+
+    Args:
+        ready: True once the warmup is done, False when shutdown starts
+    """
+    global _ready
+    _ready = ready
+
+def is_ready() -> bool:
+    """
+    Check whether this worker finished its warmup and is not shutting down
+
+    Returns:
+        bool: Readiness
+    """
+    return _ready
+
+def startup_timings() -> Dict[str, Any]:
+    """
+    Get the recorded startup phases
+
+    Returns:
+        Dict: Seconds per phase; "warmup" holds seconds per warmup step
+    """
+    return dict(_startup_timings)
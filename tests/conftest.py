@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Run from any directory: the services and utils packages live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,97 @@
+# tests/test_coalescing.py
+import asyncio
+
+import pytest
+
+from services.coalescing import SingleFlight
+
+def test_concurrent_requests_share_one_run():
+    flights = SingleFlight()
+    calls = []
+
+    async def extract():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"status": "success"}
+
+    async def scenario():
+        return await asyncio.gather(flights.run("key", "first", extract), flights.run("key", "second", extract))
+
+    first, second = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert first == ({"status": "success"}, None)
+    assert second == ({"status": "success"}, "first")
+    assert len(flights) == 0
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.run("a", "first", lambda: asyncio.sleep(0.01, result="a")),
+            flights.run("b", "second", lambda: asyncio.sleep(0.01, result="b"))
+        )
+
+    assert asyncio.run(scenario()) == [("a", None), ("b", None)]
+
+def test_finished_flight_is_not_reused():
+    flights = SingleFlight()
+    calls = []
+
+    async def extract():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        return await flights.run("key", "first", extract), await flights.run("key", "second", extract)
+
+    assert asyncio.run(scenario()) == ((1, None), (2, None))
+
+def test_error_reaches_every_waiter():
+    flights = SingleFlight()
+
+    async def extract():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.run("key", "first", extract), flights.run("key", "second", extract), return_exceptions=True
+        )
+
+    assert [type(result) for result in asyncio.run(scenario())] == [ValueError, ValueError]
+
+def test_flight_outlives_its_leader_while_others_wait():
+    flights = SingleFlight()
+
+    async def scenario():
+        leader = asyncio.create_task(flights.run("key", "first", lambda: asyncio.sleep(0.05, result="done")))
+        follower = asyncio.create_task(flights.run("key", "second", lambda: asyncio.sleep(0.05, result="other")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        return await follower
+
+    assert asyncio.run(scenario()) == ("done", "first")
+
+def test_flight_is_cancelled_when_nobody_waits():
+    flights = SingleFlight()
+    started = []
+
+    async def extract():
+        started.append(1)
+        await asyncio.sleep(1)
+
+    async def scenario():
+        caller = asyncio.create_task(flights.run("key", "first", extract))
+        await asyncio.sleep(0.01)
+        assert flights.leader_of("key") == "first"
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+        return flights.leader_of("key")
+
+    assert asyncio.run(scenario()) is None
+    assert started == [1]
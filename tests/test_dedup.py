@@ -0,0 +1,107 @@
+# tests/test_dedup.py
+import io
+import asyncio
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from services.dedup import (
+    HASH_BITS, NearDuplicateIndex, are_duplicate_images, compute_dhash, compute_dhashes, hamming_distance
+)
+from services.image_pool import ImageWorkerPool
+from services.images import ImageEnvelope
+
+def page(seed: int, size=(850, 1200)) -> Image.Image:
+    """A page of random boxes, so different seeds give unrelated layouts"""
+    rng = np.random.default_rng(seed)
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = int(rng.integers(0, size[0] - 100)), int(rng.integers(0, size[1] - 60))
+        draw.rectangle((x, y, x + int(rng.integers(20, 100)), y + int(rng.integers(10, 60))), fill=0)
+    return image
+
+def envelope(image: Image.Image, quality: int = 90) -> ImageEnvelope:
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return ImageEnvelope.from_bytes(output.getvalue())
+
+def test_re_encoding_a_scan_stays_within_the_serve_threshold():
+    original = page(1)
+    re_encoded = envelope(original, quality=50)
+
+    assert hamming_distance(compute_dhash(original), compute_dhash(re_encoded.image)) <= 4
+    assert compute_dhash(original).bit_length() <= HASH_BITS
+
+def test_dhash_tells_different_pages_apart():
+    assert hamming_distance(compute_dhash(page(1)), compute_dhash(page(2))) > 48
+
+def test_dhashes_are_computed_on_the_pool_and_stored():
+    pool = ImageWorkerPool("thread", max_workers=2)
+    images = [envelope(page(1)), envelope(page(2))]
+    try:
+        asyncio.run(compute_dhashes(images, pool))
+    finally:
+        pool.shutdown()
+
+    assert [image.dhash for image in images] == [compute_dhash(image.image) for image in images]
+
+def test_identical_uploads_are_duplicates_without_hashing():
+    front = envelope(page(1))
+    same = ImageEnvelope.from_bytes(front.data)
+
+    assert are_duplicate_images(front, same) == (True, 0)
+    assert front.dhash is None
+
+def test_front_and_back_are_not_duplicates():
+    is_duplicate, distance = are_duplicate_images(envelope(page(1)), envelope(page(2)))
+
+    assert not is_duplicate
+    assert distance > 48
+
+def test_index_finds_the_closest_pair_within_the_threshold():
+    index = NearDuplicateIndex(threshold=8, max_entries=10, ttl=3600)
+    index.add(0b1111, 0, "far", "key-far")
+    index.add(0b1, 0, "near", "key-near")
+
+    match = index.find(0, 0)
+
+    assert (match.request_id, match.cache_key, match.distance) == ("near", "key-near", 1)
+
+def test_index_needs_both_pages_within_the_threshold():
+    index = NearDuplicateIndex(threshold=4, max_entries=10, ttl=3600)
+    index.add(0, (1 << 10) - 1, "other-back", None)
+
+    assert index.find(0, 0) is None
+
+def test_index_finds_matches_that_differ_in_every_chunk():
+    index = NearDuplicateIndex(threshold=3, max_entries=10, ttl=3600)
+    # One bit off in three of the four indexed ranges
+    front = (1 << 10) | (1 << 100) | (1 << 200)
+    index.add(front, 0, "earlier", None)
+
+    assert index.find(0, 0).distance == 3
+
+def test_index_evicts_the_oldest_entries_over_capacity():
+    index = NearDuplicateIndex(threshold=1, max_entries=2, ttl=3600)
+    for request_id, front in (("a", 1 << 50), ("b", 1 << 150), ("c", 1 << 250)):
+        index.add(front, 0, request_id, None)
+
+    assert len(index) == 2
+    assert index.find(1 << 50, 0) is None
+    assert index.find(1 << 250, 0).request_id == "c"
+
+def test_index_drops_expired_entries(monkeypatch):
+    index = NearDuplicateIndex(threshold=2, max_entries=10, ttl=60)
+    index.add(0, 0, "old", None)
+    monkeypatch.setattr("services.dedup.time.time", lambda: index._entries[0].created_at + 61)
+
+    assert index.find(0, 0) is None
+    assert len(index) == 0
+
+def test_only_matches_within_the_serve_threshold_may_be_served():
+    index = NearDuplicateIndex(threshold=24, max_entries=10, ttl=3600, serve_threshold=4)
+    index.add(0, 0, "earlier", "key")
+
+    assert index.can_serve(index.find(0b11, 0b1))
+    assert not index.can_serve(index.find((1 << 20) - 1, 0))
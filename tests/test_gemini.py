@@ -0,0 +1,26 @@
+# tests/test_gemini.py
+from services.gemini import parse_response_text
+
+def test_fenced_response_is_parsed():
+    result, error = parse_response_text('```json\n{"status": "ok", "items": [1]}\n```', "req")
+
+    assert error is None
+    assert result == {"status": "ok", "items": [1]}
+
+def test_trailing_braces_after_the_object_fall_back_to_the_scan():
+    result, error = parse_response_text('{"a": 1}\nNote: fields in {} were empty', "req")
+
+    assert error is None
+    assert result == {"a": 1}
+
+def test_truncated_response_is_reported_as_truncated():
+    result, error = parse_response_text('{"a": {"b": "cut off', "req")
+
+    assert result is None
+    assert "truncated" in error
+
+def test_invalid_json_is_reported_with_the_parse_error():
+    result, error = parse_response_text("{'a': 1}", "req")
+
+    assert result is None
+    assert error.startswith("Failed to parse Gemini response as JSON")
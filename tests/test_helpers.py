@@ -0,0 +1,32 @@
+# tests/test_helpers.py
+from utils.helpers import extract_json_from_text, scan_json_object
+
+def test_object_is_found_inside_a_code_fence():
+    text = 'Here you go:\n```json\n{"a": {"b": [1, 2]}}\n```'
+    start, end, complete = scan_json_object(text)
+
+    assert complete
+    assert text[start:end] == '{"a": {"b": [1, 2]}}'
+
+def test_brackets_inside_strings_are_ignored():
+    text = '{"note": "closing } and [ brackets", "escaped": "quote \\" }"} trailing }'
+    start, end, complete = scan_json_object(text)
+
+    assert complete
+    assert text[start:end] == '{"note": "closing } and [ brackets", "escaped": "quote \\" }"}'
+
+def test_only_the_first_object_is_taken():
+    text = '{"first": 1} {"second": 2}'
+
+    assert scan_json_object(text) == (0, 12, True)
+
+def test_truncated_object_runs_to_the_end_of_the_text():
+    text = 'prefix {"a": {"b": 1}, "c": "unterminated'
+
+    assert scan_json_object(text) == (7, len(text), False)
+
+def test_text_without_an_object():
+    assert scan_json_object("no json here") == (-1, 12, False)
+
+def test_extract_strips_fences_when_there_is_no_object():
+    assert extract_json_from_text("```json\n[1, 2]\n```") == "[1, 2]"
@@ -0,0 +1,98 @@
+# tests/test_jobs.py
+import time
+
+import pytest
+
+from services.jobs import JOB_COMPLETED, JOB_QUEUED, JOB_RUNNING, JobStore, check_callback_url
+
+UPLOADS = [("front.jpg", b"front"), ("back.jpg", b"back")]
+
+@pytest.fixture
+def store(tmp_path) -> JobStore:
+    return JobStore(str(tmp_path / "jobs.db"))
+
+def test_claim_takes_the_oldest_queued_job_with_its_images(store):
+    first = store.create(UPLOADS)
+    store.create(UPLOADS)
+
+    job = store.claim_next("worker-a")
+
+    assert job["id"] == first
+    assert job["uploads"] == UPLOADS
+    assert store.get(first)["status"] == JOB_RUNNING
+    assert store.get(first)["attempts"] == 1
+
+def test_claim_returns_none_when_the_queue_is_empty(store):
+    assert store.claim_next("worker-a") is None
+
+def test_requeued_job_waits_for_its_delay(store):
+    job_id = store.create(UPLOADS)
+    store.claim_next("worker-a")
+
+    store.requeue(job_id, 60, 503, {"status": "error"})
+
+    assert store.get(job_id)["status"] == JOB_QUEUED
+    assert store.claim_next("worker-a") is None
+
+def test_requeue_after_delay_is_claimed_again_with_its_images(store):
+    job_id = store.create(UPLOADS)
+    store.claim_next("worker-a")
+    store.requeue(job_id, 0, 429, {"status": "error"})
+    time.sleep(0.01)
+
+    job = store.claim_next("worker-a")
+
+    assert job["id"] == job_id
+    assert job["uploads"] == UPLOADS
+    assert store.get(job_id)["attempts"] == 2
+
+def test_requeue_does_not_reopen_a_finished_job(store):
+    job_id = store.create(UPLOADS)
+    store.claim_next("worker-a")
+    store.complete(job_id, 200, {"status": "success"})
+
+    store.requeue(job_id, 0, 503, {"status": "error"})
+
+    assert store.get(job_id)["status"] == JOB_COMPLETED
+    assert store.get(job_id)["result"] == {"status": "success"}
+
+def test_recover_requeues_only_jobs_of_dead_workers(store):
+    live_job = store.create(UPLOADS)
+    dead_job = store.create(UPLOADS)
+    store.claim_next("live")
+    store.claim_next("dead")
+
+    assert store.recover({"live"}) == 1
+    assert store.get(live_job)["status"] == JOB_RUNNING
+    assert store.get(dead_job)["status"] == JOB_QUEUED
+
+def test_shutdown_release_does_not_count_the_interrupted_attempt(store):
+    job_id = store.create(UPLOADS)
+    for _ in range(3):
+        store.claim_next("worker-a")
+        assert store.release_owned("worker-a") == 1
+
+    assert store.get(job_id)["status"] == JOB_QUEUED
+    assert store.get(job_id)["attempts"] == 0
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook"
+])
+def test_callback_to_internal_addresses_is_refused(url, monkeypatch):
+    monkeypatch.delenv("JOB_CALLBACK_ALLOWED_HOSTS", raising=False)
+
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+def test_callback_allowlist_admits_listed_hosts_only(monkeypatch):
+    monkeypatch.setenv("JOB_CALLBACK_ALLOWED_HOSTS", "hooks.internal, 10.0.0.5")
+
+    check_callback_url("https://hooks.internal/done")
+    check_callback_url("http://10.0.0.5:8080/done")
+    with pytest.raises(ValueError):
+        check_callback_url("https://example.com/done")
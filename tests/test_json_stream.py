@@ -0,0 +1,51 @@
+# tests/test_json_stream.py
+from utils.json_stream import IncrementalJSONParser
+
+DOCUMENT = (
+    '```json\n'
+    '{"patient": {"name": "Nguyễn Văn A", "age": 70}, '
+    '"notes": "uses {braces}, \\"quotes\\" and [brackets]", '
+    '"scores": {"pulse": 0.9, "detail": {"a": 1}}, '
+    '"items": [1, 2]}\n'
+    '```'
+)
+
+def feed_in_chunks(parser: IncrementalJSONParser, text: str, size: int) -> list:
+    completed = []
+    for offset in range(0, len(text), size):
+        completed.extend(parser.feed(text[offset:offset + size]))
+    return completed
+
+def test_members_are_reported_as_they_complete():
+    parser = IncrementalJSONParser()
+
+    assert parser.feed('{"patient": {"name": "A", ') == [(["patient", "name"], "A")]
+    assert parser.feed('"age": 70}, "notes"') == [(["patient", "age"], 70)]
+    assert parser.feed(': "x"}') == [(["notes"], "x")]
+    assert parser.finished
+
+def test_result_does_not_depend_on_chunk_boundaries():
+    expected = [
+        (["patient", "name"], "Nguyễn Văn A"),
+        (["patient", "age"], 70),
+        (["notes"], 'uses {braces}, "quotes" and [brackets]'),
+        (["scores", "pulse"], 0.9),
+        (["scores", "detail"], {"a": 1}),
+        (["items"], [1, 2])
+    ]
+
+    for size in (1, 3, 7, len(DOCUMENT)):
+        assert feed_in_chunks(IncrementalJSONParser(), DOCUMENT, size) == expected
+
+def test_text_after_the_root_object_is_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1}')
+
+    assert parser.finished
+    assert parser.feed('\n```\n{"b": 2}') == []
+
+def test_unfinished_document_reports_only_complete_members():
+    parser = IncrementalJSONParser()
+
+    assert parser.feed('{"a": 1, "b": {"c": "trunc') == [(["a"], 1)]
+    assert not parser.finished
@@ -0,0 +1,139 @@
+# tests/test_limiter.py
+import asyncio
+
+import pytest
+
+from services.limiter import ConcurrencyLimiter, SharedConcurrencyLimiter, UpstreamBusyError
+from services.shared_state import SharedStateStore
+
+@pytest.fixture
+def store(tmp_path) -> SharedStateStore:
+    store = SharedStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+def local_limiter(**settings) -> ConcurrencyLimiter:
+    settings = {"max_concurrency": 1, "max_queue": 1, "queue_timeout": 1.0, "retry_after": 5, **settings}
+    return ConcurrencyLimiter(poll_interval=0.01, **settings)
+
+def test_caller_beyond_the_queue_is_rejected_at_once():
+    limiter = local_limiter()
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert await limiter.is_saturated()
+        with pytest.raises(UpstreamBusyError, match=r"\(1 in flight, 1 waiting\)") as busy:
+            await limiter.acquire()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return busy.value, limiter.waiting
+
+    busy, waiting = asyncio.run(scenario())
+
+    assert busy.retry_after == 5
+    assert waiting == 0
+
+def test_waiter_times_out_and_leaves_the_queue():
+    limiter = local_limiter(queue_timeout=0.05)
+
+    async def scenario():
+        await limiter.acquire()
+        with pytest.raises(UpstreamBusyError, match="Timed out after 0.05s"):
+            await limiter.acquire()
+        return limiter.in_flight, limiter.waiting
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+def test_released_slot_goes_to_the_waiter():
+    limiter = local_limiter()
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        await limiter.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        return limiter.in_flight, limiter.waiting
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+def test_try_acquire_does_not_wait():
+    limiter = local_limiter()
+
+    async def scenario():
+        return await limiter.try_acquire(), await limiter.try_acquire()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+def test_background_caller_times_out_without_using_the_queue():
+    limiter = local_limiter(max_queue=0)
+
+    async def scenario():
+        await limiter.acquire()
+        with pytest.raises(UpstreamBusyError, match="Timed out"):
+            await limiter.acquire_background(0.05)
+        return limiter.waiting
+
+    assert asyncio.run(scenario()) == 0
+
+def test_slot_is_released_when_the_block_raises():
+    limiter = local_limiter()
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            async with limiter.slot():
+                assert limiter.in_flight == 1
+                raise ValueError("upstream call failed")
+        return limiter.in_flight
+
+    assert asyncio.run(scenario()) == 0
+
+def shared_limiter(store: SharedStateStore, **settings) -> SharedConcurrencyLimiter:
+    settings = {"max_concurrency": 1, "max_queue": 1, "queue_timeout": 1.0, "retry_after": 5, **settings}
+    return SharedConcurrencyLimiter(store, "upstream", poll_interval=0.01, **settings)
+
+def test_shared_limiter_reports_a_full_queue_without_querying_on_the_loop(store):
+    limiter = shared_limiter(store)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        # Reads on the event loop would wait behind other workers' transactions
+        store.query = None
+        with pytest.raises(UpstreamBusyError, match=r"\(1 in flight, 1 waiting\)") as busy:
+            await limiter.acquire()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return busy.value
+
+    assert asyncio.run(scenario()).retry_after == 5
+
+def test_shared_slot_is_handed_to_the_waiter_on_release(store):
+    limiter = shared_limiter(store)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        await limiter.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        return limiter.in_flight, limiter.waiting
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+def test_cancelled_shared_waiter_leaves_the_queue(store):
+    limiter = shared_limiter(store)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        return limiter.waiting
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,76 @@
+# tests/test_logging.py
+import queue
+import logging
+
+import pytest
+
+from utils import logging as log_utils
+from utils.logging import DroppingQueueHandler, RateLimitFilter
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(log_utils.time, "monotonic", clock)
+    return clock
+
+def record(level: int = logging.INFO, lineno: int = 10, msg: str = "request %s done", args=("abc",)) -> logging.LogRecord:
+    return logging.LogRecord("patient-care-api", level, "services/extraction.py", lineno, msg, args, None)
+
+def test_info_records_beyond_the_rate_are_dropped(clock):
+    rate_filter = RateLimitFilter(rate=3)
+
+    assert [rate_filter.filter(record()) for _ in range(5)] == [True, True, True, False, False]
+
+def test_first_record_of_the_next_window_reports_the_suppressed_count(clock):
+    rate_filter = RateLimitFilter(rate=1)
+    for _ in range(4):
+        rate_filter.filter(record())
+
+    clock.now += 1.0
+    next_record = record()
+
+    assert rate_filter.filter(next_record)
+    assert next_record.suppressed == 3
+
+def test_call_sites_are_limited_separately(clock):
+    rate_filter = RateLimitFilter(rate=1)
+
+    assert rate_filter.filter(record(lineno=10))
+    assert rate_filter.filter(record(lineno=20))
+    assert not rate_filter.filter(record(lineno=10))
+
+def test_warnings_and_errors_always_pass(clock):
+    rate_filter = RateLimitFilter(rate=1)
+
+    assert all(rate_filter.filter(record(logging.WARNING)) for _ in range(10))
+    assert all(rate_filter.filter(record(logging.ERROR)) for _ in range(10))
+
+def test_zero_rate_disables_the_limit(clock):
+    rate_filter = RateLimitFilter(rate=0)
+
+    assert all(rate_filter.filter(record()) for _ in range(100))
+
+def test_queue_handler_renders_lazy_arguments_before_queueing():
+    handler = DroppingQueueHandler(queue.Queue())
+    handler.handle(record(args=("abc",)))
+
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "request abc done"
+    assert queued.args is None
+
+def test_queue_handler_drops_and_counts_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    for _ in range(5):
+        handler.handle(record())
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
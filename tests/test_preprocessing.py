@@ -0,0 +1,56 @@
+# tests/test_preprocessing.py
+import io
+
+import numpy as np
+from PIL import Image
+
+from services.images import ImageEnvelope
+from services.preprocessing import PreprocessProfile, preprocess_image
+
+# Leaves pixels alone, so a small enough upload may be sent as it is
+UNCHANGED = PreprocessProfile(contrast=1.0, sharpness=1.0)
+
+def upload(size=(800, 600), image_format: str = "JPEG", mode: str = "RGB", quality: int = 40) -> ImageEnvelope:
+    """A noisy grey page, compressed hard so a high-quality re-encode comes out larger"""
+    levels = np.random.default_rng(0).integers(180, 230, size=(size[1], size[0]), dtype=np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(levels).convert(mode).save(output, format=image_format, quality=quality)
+    return ImageEnvelope.from_bytes(output.getvalue())
+
+def test_smaller_original_is_kept_when_the_profile_would_not_change_it():
+    envelope = upload()
+    preprocessed = preprocess_image(envelope, UNCHANGED)
+
+    assert preprocessed.kept_original
+    assert preprocessed.data == envelope.data
+    assert preprocessed.mime_type == "image/jpeg"
+
+def test_enhancement_forces_a_re_encode():
+    preprocessed = preprocess_image(upload(), PreprocessProfile())
+
+    assert not preprocessed.kept_original
+    assert preprocessed.quality is not None
+
+def test_oversized_original_is_downscaled():
+    profile = PreprocessProfile(contrast=1.0, sharpness=1.0, max_long_edge=400)
+    preprocessed = preprocess_image(upload(), profile)
+
+    assert not preprocessed.kept_original
+    assert max(preprocessed.size) == 400
+
+def test_colour_original_is_converted_for_a_grayscale_profile():
+    profile = PreprocessProfile(contrast=1.0, sharpness=1.0, grayscale=True)
+
+    assert not preprocess_image(upload(), profile).kept_original
+    assert preprocess_image(upload(mode="L"), profile).kept_original
+
+def test_formats_the_upstream_rejects_are_re_encoded():
+    # A blank page, which GIF stores in far fewer bytes than JPEG
+    output = io.BytesIO()
+    Image.new("L", (800, 600), 255).save(output, format="GIF")
+    envelope = ImageEnvelope.from_bytes(output.getvalue())
+    preprocessed = preprocess_image(envelope, UNCHANGED)
+
+    assert envelope.byte_size < preprocessed.sent_bytes
+    assert not preprocessed.kept_original
+    assert preprocessed.mime_type == "image/jpeg"
@@ -0,0 +1,51 @@
+# tests/test_quality.py
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from services.quality import QualityThresholds, assess_image
+
+ROW = "Họ tên bệnh nhân: Nguyen Van A    Tuổi: 65    Chẩn đoán: Tăng huyết áp"
+
+def white_form(width: int = 1700, height: int = 2400, paper: int = 255) -> Image.Image:
+    """A care form as a flatbed scan renders it: pure white paper, black text and table rules"""
+    page = Image.new("RGB", (width, height), (paper, paper, paper))
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=26)
+    for y in range(160, height - 160, 64):
+        draw.line((100, y, width - 100, y), fill=(30, 30, 30), width=2)
+        draw.text((120, y - 40), ROW, fill=(0, 0, 0), font=font)
+    for x in (100, width // 3, 2 * width // 3, width - 100):
+        draw.line((x, 160, x, height - 160), fill=(30, 30, 30), width=2)
+    return page
+
+def enforce() -> QualityThresholds:
+    return QualityThresholds(mode="enforce")
+
+def test_white_scan_is_not_overexposed():
+    report = assess_image(white_form(), enforce())
+
+    assert report.metrics["paper_level"] == 255
+    assert report.metrics["clipped_fraction"] == 0
+    assert report.passed, [failure.message for failure in report.failures]
+
+def test_white_scan_with_sensor_noise_passes():
+    form = np.asarray(white_form(), dtype=np.int16)
+    noise = np.random.default_rng(0).integers(-4, 1, size=form.shape)
+    report = assess_image(Image.fromarray((form + noise).clip(0, 255).astype(np.uint8)), enforce())
+
+    assert report.passed, [failure.message for failure in report.failures]
+
+def test_glare_on_a_photographed_form_is_overexposed():
+    photo = white_form(paper=205)
+    # A blown-out reflection across the middle of the page, hiding the text under it
+    ImageDraw.Draw(photo).ellipse((150, 500, 1550, 1900), fill=(255, 255, 255))
+    report = assess_image(photo, enforce())
+
+    assert report.metrics["clipped_fraction"] > enforce().max_clipped_fraction
+    assert [failure.check for failure in report.failures][:1] == ["exposure"]
+
+def test_underexposed_form_is_rejected():
+    dark = Image.eval(white_form(), lambda level: level // 8)
+    report = assess_image(dark, enforce())
+
+    assert "exposure" in [failure.check for failure in report.failures]
@@ -0,0 +1,162 @@
+# tests/test_resilience.py
+import asyncio
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from services import resilience
+from services.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, SharedCircuitBreaker
+from services.shared_state import SharedStateStore
+
+class Clock:
+    """Stand-in for time.monotonic and time.time that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    monkeypatch.setattr(resilience.time, "time", clock)
+    return clock
+
+@pytest.fixture
+def store(tmp_path) -> SharedStateStore:
+    store = SharedStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+@pytest.fixture(params=["local", "shared"])
+def breaker(request, clock) -> CircuitBreaker:
+    if request.param == "local":
+        return CircuitBreaker(failure_threshold=2, recovery_time=30)
+    return SharedCircuitBreaker(request.getfixturevalue("store"), "upstream", failure_threshold=2, recovery_time=30)
+
+def trip(breaker: CircuitBreaker, clock: Clock):
+    """Open the circuit and wait out the recovery time"""
+    async def scenario():
+        for _ in range(breaker.failure_threshold):
+            await breaker.record_failure(await breaker.check())
+
+    asyncio.run(scenario())
+    clock.now += breaker.recovery_time
+
+def test_circuit_opens_at_the_threshold_and_fails_fast(breaker):
+    async def scenario():
+        await breaker.record_failure(await breaker.check())
+        assert breaker.state == "closed"
+        await breaker.record_failure(await breaker.check())
+        with pytest.raises(CircuitOpenError) as rejected:
+            await breaker.check()
+        return rejected.value
+
+    assert asyncio.run(scenario()).retry_after == 31
+    assert breaker.state == "open"
+
+def test_success_resets_the_failure_count(breaker):
+    async def scenario():
+        await breaker.record_failure(await breaker.check())
+        await breaker.record_success(await breaker.check())
+        await breaker.record_failure(await breaker.check())
+
+    asyncio.run(scenario())
+
+    assert breaker.state == "closed"
+
+def test_half_open_circuit_admits_a_single_trial(breaker, clock):
+    trip(breaker, clock)
+
+    async def scenario():
+        trial = await breaker.check()
+        with pytest.raises(CircuitOpenError):
+            await breaker.check()
+        return trial, await breaker.blocked_for()
+
+    trial, blocked_for = asyncio.run(scenario())
+
+    assert trial is not None
+    assert blocked_for > 0
+
+def test_trial_success_closes_the_circuit(breaker, clock):
+    trip(breaker, clock)
+
+    async def scenario():
+        await breaker.record_success(await breaker.check())
+        return await breaker.check()
+
+    assert asyncio.run(scenario()) is None
+    assert breaker.state == "closed"
+
+def test_trial_failure_reopens_the_circuit(breaker, clock):
+    trip(breaker, clock)
+
+    async def scenario():
+        await breaker.record_failure(await breaker.check())
+
+    asyncio.run(scenario())
+
+    assert breaker.state == "open"
+
+def test_abandoned_trial_lets_the_next_call_try(breaker, clock):
+    trip(breaker, clock)
+
+    async def scenario():
+        await breaker.abandon(await breaker.check())
+        return await breaker.check()
+
+    assert asyncio.run(scenario()) is not None
+
+def test_calls_admitted_before_the_circuit_opened_do_not_settle_the_trial(breaker, clock):
+    async def scenario():
+        straggler = await breaker.check()
+        for _ in range(breaker.failure_threshold):
+            await breaker.record_failure(await breaker.check())
+        clock.now += breaker.recovery_time
+        trial = await breaker.check()
+
+        await breaker.abandon(straggler)
+        await breaker.record_failure(straggler)
+        await breaker.record_success(straggler)
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.check()
+
+        await breaker.record_success(trial)
+
+    asyncio.run(scenario())
+
+    assert breaker.state == "closed"
+
+def test_stale_trial_token_does_not_settle_a_later_trial(breaker, clock):
+    trip(breaker, clock)
+
+    async def scenario():
+        first = await breaker.check()
+        await breaker.abandon(first)
+        second = await breaker.check()
+        await breaker.record_failure(first)
+        assert breaker.state == "half_open"
+        await breaker.record_success(second)
+
+    asyncio.run(scenario())
+
+    assert breaker.state == "closed"
+
+def test_caller_abandons_the_trial_on_errors_that_say_nothing_about_upstream(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=30)
+    caller = ResilientCaller(attempt_timeout=1, max_attempts=1, base_delay=0, max_delay=0, breaker=breaker)
+    trip(breaker, clock)
+
+    async def attempt():
+        raise api_exceptions.InvalidArgument("bad request")
+
+    async def scenario():
+        with pytest.raises(api_exceptions.InvalidArgument):
+            await caller.call(attempt, "req")
+        return await breaker.check()
+
+    assert asyncio.run(scenario()) is not None
@@ -0,0 +1,100 @@
+# tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from services import scheduler
+from services.limiter import UpstreamBusyError
+from services.scheduler import (
+    PRIORITIES, PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_JOB, RateBudget, UpstreamScheduler
+)
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    return clock
+
+def test_request_is_taken_only_when_both_buckets_afford_it(clock):
+    budget = RateBudget(rpm_limit=60, tpm_limit=600)
+
+    assert asyncio.run(budget.try_take(1, 500)) == 0
+    # 100 tokens left, so 400 more need 40 seconds at 10 tokens a second
+    assert asyncio.run(budget.try_take(1, 500)) == pytest.approx(40)
+    assert budget.remaining() == {"requests": 59, "tokens": 100}
+
+def test_buckets_refill_up_to_one_minute_of_quota(clock):
+    budget = RateBudget(rpm_limit=60, tpm_limit=0)
+    asyncio.run(budget.try_take(30, 0))
+
+    clock.now += 10
+    assert budget.remaining() == {"requests": 40}
+    clock.now += 600
+    assert budget.remaining() == {"requests": 60}
+
+def test_debit_may_overdraw_and_delays_the_next_request(clock):
+    budget = RateBudget(rpm_limit=60, tpm_limit=0)
+    asyncio.run(budget.debit(62, 0))
+
+    assert budget.estimate_wait(1, 0) == pytest.approx(3)
+    assert asyncio.run(budget.try_take(1, 0)) == pytest.approx(3)
+
+def test_drain_empties_the_buckets(clock):
+    budget = RateBudget(rpm_limit=60, tpm_limit=600)
+    asyncio.run(budget.drain())
+
+    assert budget.remaining() == {"requests": 0, "tokens": 0}
+    assert budget.estimate_wait(1, 60) == pytest.approx(6)
+
+def test_zero_limits_leave_the_budget_unbounded(clock):
+    budget = RateBudget(rpm_limit=0, tpm_limit=0)
+
+    assert budget.unlimited
+    assert budget.cap_tokens(10 ** 9) == 10 ** 9
+    assert asyncio.run(budget.try_take(10 ** 6, 10 ** 9)) == 0
+
+def test_oversized_request_is_capped_to_the_bucket(clock):
+    assert RateBudget(rpm_limit=60, tpm_limit=600).cap_tokens(5000) == 600
+
+def make_scheduler(budget: RateBudget, max_wait: float = 10) -> UpstreamScheduler:
+    return UpstreamScheduler(budget, {priority: max_wait for priority in PRIORITIES}, retry_after=5)
+
+def test_queued_callers_are_admitted_most_urgent_first():
+    # 100 requests a second, so the drained bucket refills within milliseconds
+    upstream = make_scheduler(RateBudget(rpm_limit=6000, tpm_limit=0))
+    admitted = []
+
+    async def caller(priority: str):
+        await upstream.admit(priority, 0)
+        admitted.append(priority)
+
+    async def scenario():
+        await upstream.budget.drain()
+        await asyncio.gather(caller(PRIORITY_JOB), caller(PRIORITY_BATCH), caller(PRIORITY_INTERACTIVE))
+
+    asyncio.run(scenario())
+
+    assert admitted == [PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_JOB]
+
+def test_caller_is_rejected_when_the_predicted_wait_is_too_long(clock):
+    upstream = make_scheduler(RateBudget(rpm_limit=60, tpm_limit=0), max_wait=0.5)
+
+    async def scenario():
+        await upstream.budget.drain()
+        with pytest.raises(UpstreamBusyError) as busy:
+            await upstream.admit(PRIORITY_BATCH, 0)
+        return busy.value
+
+    rejected = asyncio.run(scenario())
+
+    assert "predicted wait 1.0s for batch traffic" in str(rejected)
+    assert rejected.retry_after == 5
@@ -0,0 +1,16 @@
+# tests/test_uploads.py
+from api.uploads import UploadLimits
+from utils.errors import ErrorType
+
+def test_batch_limit_is_reported_in_pairs():
+    rejected = UploadLimits.from_env(max_files=6, max_pairs=3).too_many_files()
+
+    assert rejected.error_type == ErrorType.PAYLOAD_TOO_LARGE
+    assert "3 cặp" in rejected.message
+    assert rejected.details == {"max_pairs": 3, "max_files": 6}
+
+def test_single_extraction_limit_is_reported_in_files():
+    rejected = UploadLimits.from_env(max_files=2).too_many_files()
+
+    assert rejected.error_type == ErrorType.PAYLOAD_TOO_LARGE
+    assert rejected.details == {"max_files": 2}
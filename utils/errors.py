@@ -12,6 +12,11 @@ class ErrorType(str, Enum):
     API_REQUEST_FAILED = "API_REQUEST_FAILED"
     PROCESSING_ERROR = "PROCESSING_ERROR"
     INVALID_FILE_FORMAT = "INVALID_FILE_FORMAT"
+    SERVICE_BUSY = "SERVICE_BUSY"
+    UPSTREAM_UNAVAILABLE = "UPSTREAM_UNAVAILABLE"
+    PAYLOAD_TOO_LARGE = "PAYLOAD_TOO_LARGE"
+    INVALID_REQUEST = "INVALID_REQUEST"
+    NOT_FOUND = "NOT_FOUND"
 
 ERROR_MESSAGES = {
     ErrorType.INSUFFICIENT_IMAGES: "Cần chính xác 2 hình ảnh",
@@ -22,7 +27,12 @@ ERROR_MESSAGES = {
     ErrorType.JSON_PARSING_ERROR: "Không thể phân tích kết quả thành JSON",
     ErrorType.API_REQUEST_FAILED: "Lỗi khi gọi API",
     ErrorType.PROCESSING_ERROR: "Lỗi xử lý",
-    ErrorType.INVALID_FILE_FORMAT: "File không phải là hình ảnh hợp lệ"
+    ErrorType.INVALID_FILE_FORMAT: "File không phải là hình ảnh hợp lệ",
+    ErrorType.SERVICE_BUSY: "Hệ thống đang quá tải, vui lòng thử lại sau",
+    ErrorType.UPSTREAM_UNAVAILABLE: "Dịch vụ trích xuất tạm thời không khả dụng, vui lòng thử lại sau",
+    ErrorType.PAYLOAD_TOO_LARGE: "Dung lượng tải lên vượt quá giới hạn cho phép",
+    ErrorType.INVALID_REQUEST: "Yêu cầu không hợp lệ",
+    ErrorType.NOT_FOUND: "Không tìm thấy"
 }
 
 def get_error_message(error_type: str, additional_info: str = None) -> str:
@@ -1,23 +1,27 @@
 # utils/helpers.py
-import base64
 from PIL import Image
 import io
 import re
-import json
 import logging
+from typing import Tuple
+
+from utils import jsonlib
 
 logger = logging.getLogger("patient-care-api")
 
-def encode_image(image_bytes: bytes, mime_type: str = None) -> dict:
+def image_part(image_bytes: bytes, mime_type: str = None) -> dict:
     """
-    Encode image bytes to base64 for API request
+    Build the request part for an image from its raw bytes
+    
+    The bytes go into the SDK's binary blob as they are: no base64 text is
+    built, so the SDK does not have to decode one again.
     
     Args:
-        image_bytes: Raw image bytes
+        image_bytes: Raw image bytes, or a memory map of them
         mime_type: MIME type of the image
         
     Returns:
-        dict: Encoded image data
+        dict: Inline image part
     """
     # Detect MIME type if not provided
     if not mime_type:
@@ -25,19 +29,61 @@ def encode_image(image_bytes: bytes, mime_type: str = None) -> dict:
             img = Image.open(io.BytesIO(image_bytes))
             mime_type = f"image/{img.format.lower()}" if img.format else "image/jpeg"
         except Exception as e:
-            logger.warning(f"Failed to detect image format: {str(e)}")
+            logger.warning("Failed to detect image format: %s", e)
             mime_type = "image/jpeg"
     
-    # Encode image to base64
-    encoded = base64.b64encode(image_bytes).decode()
+    # Protobuf blobs only take bytes; a memory-mapped upload is copied once here
+    if not isinstance(image_bytes, bytes):
+        image_bytes = bytes(image_bytes)
     
     return {
         "inline_data": {
             "mime_type": mime_type,
-            "data": encoded
+            "data": image_bytes
         }
     }
 
+# Skips plain text and complete strings, then captures the next bracket; an
+# unterminated string or the end of the text leaves the bracket group empty
+_JSON_NEXT_BRACKET = re.compile(r'(?:[^{}\[\]"]+|"[^"\\]*(?:\\.[^"\\]*)*")*(?:([{}\[\]])|"|$)', re.DOTALL)
+
+def scan_json_object(text: str) -> Tuple[int, int, bool]:
+    """
+    Find the first balanced JSON object in text with a single forward scan
+    
+    Code fences and prose around the object are skipped; brackets inside
+    strings are ignored. Each character is visited once, and the Python
+    loop only runs once per bracket.
+    
+    Args:
+        text: Text containing a JSON object
+        
+    Returns:
+        Tuple containing:
+            - int: Start offset of the object, or -1 if there is no '{'
+            - int: End offset (exclusive); the end of the text if the object is not closed
+            - bool: True if the object is complete, False if the text was truncated
+    """
+    start = text.find("{")
+    if start == -1:
+        return -1, len(text), False
+    
+    depth = 0
+    position = start
+    while True:
+        match = _JSON_NEXT_BRACKET.match(text, position)
+        bracket = match.group(1)
+        if bracket is None:
+            return start, len(text), False
+        
+        position = match.end()
+        if bracket in "{[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return start, position, True
+
 def extract_json_from_text(text: str) -> str:
     """
     Extract JSON data from text that might have markdown formatting
@@ -46,28 +92,14 @@ def extract_json_from_text(text: str) -> str:
         text: Text containing JSON data
         
     Returns:
-        str: Extracted JSON string
+        str: Extracted JSON string; the text from the first '{' on if the object is truncated
     """
-    # Try to extract JSON from markdown code blocks
-    json_pattern = r'```(?:json)?\s*([\s\S]*?)\s*```'
-    json_match = re.search(json_pattern, text, re.DOTALL)
-    
-    if json_match:
-        return json_match.group(1).strip()
-    
-    # If no markdown block found, clean up the text and try to find JSON
-    # Remove any leading/trailing backticks
-    clean_text = re.sub(r'^```|```$', '', text.strip())
-    
-    # Try to find JSON object by looking for starting and ending braces
-    json_obj_pattern = r'(\{[\s\S]*\})'
-    json_obj_match = re.search(json_obj_pattern, clean_text, re.DOTALL)
-    
-    if json_obj_match:
-        return json_obj_match.group(1).strip()
+    start, end, _ = scan_json_object(text)
+    if start != -1:
+        return text[start:end]
     
-    # If still not found, return the original cleaned text
-    return clean_text.strip()
+    # No object found: return the text without code fences
+    return re.sub(r'^```(?:json)?|```$', '', text.strip()).strip()
 
 def is_valid_json(json_str: str) -> bool:
     """
@@ -80,7 +112,7 @@ def is_valid_json(json_str: str) -> bool:
         bool: True if valid JSON, False otherwise
     """
     try:
-        json.loads(json_str)
+        jsonlib.loads(json_str)
         return True
-    except json.JSONDecodeError:
-        return False
\ No newline at end of file
+    except jsonlib.JSONDecodeError:
+        return False
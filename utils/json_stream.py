@@ -0,0 +1,105 @@
+# utils/json_stream.py
+import json
+from typing import Any, List, Optional, Tuple
+
+class IncrementalJSONParser:
+    """
+    Incremental scanner for a JSON object that arrives in chunks
+
+    Text before the first '{' (such as a markdown code fence) is skipped.
+    Each time a member of the root object, or of an object nested directly
+    inside it, is complete, it is returned as (path, value). Members of the
+    root object whose value is an object are not returned, since their own
+    members already were.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self._text = ""
+        self._position = 0
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string: Optional[Tuple[int, int]] = None
+        # One frame per open container: [kind, key, value_start, path]
+        self._stack: List[list] = []
+
+    @property
+    def finished(self) -> bool:
+        """True once the root object has been closed"""
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Tuple[List[str], Any]]:
+        """
+        Scan the next chunk of text
+
+        Args:
+            chunk: Text received from the model
+
+        Returns:
+            List: (path, value) of every member completed by this chunk
+        """
+        self._text += chunk
+        completed = []
+        text = self._text
+
+        while self._position < len(text) and not self._finished:
+            char = text[self._position]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = (self._string_start, self._position + 1)
+            elif not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append(["{", None, None, []])
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._position
+            elif char == ":":
+                frame = self._stack[-1]
+                start, end = self._last_string
+                frame[1] = json.loads(text[start:end])
+                frame[2] = self._position + 1
+            elif char in "{[":
+                parent = self._stack[-1]
+                path = parent[3] + [parent[1]] if parent[0] == "{" else parent[3]
+                self._stack.append([char, None, None, path])
+            elif char in "}]":
+                frame = self._stack.pop()
+                if char == "}" and frame[2] is not None:
+                    completed.extend(self._complete_member(frame, self._position))
+                if not self._stack:
+                    self._finished = True
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame[0] == "{" and frame[2] is not None:
+                    completed.extend(self._complete_member(frame, self._position))
+                    frame[1], frame[2] = None, None
+
+            self._position += 1
+
+        return completed
+
+    def _complete_member(self, frame: list, end: int) -> List[Tuple[List[str], Any]]:
+        """Decode a finished object member if it is shallow enough to report"""
+        depth = len(frame[3]) + 1
+        if depth > self.max_depth:
+            return []
+
+        raw = self._text[frame[2]:end].strip()
+        if depth < self.max_depth and raw.startswith("{"):
+            return []
+
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return []
+        return [(frame[3] + [frame[1]], value)]
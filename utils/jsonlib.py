@@ -0,0 +1,45 @@
+# utils/jsonlib.py
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Name of the library in use, for logs and benchmarks
+JSON_LIBRARY = "orjson" if orjson is not None else "json"
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so this catches both
+JSONDecodeError = json.JSONDecodeError
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse a JSON document, using orjson when it is installed
+
+    Args:
+        data: JSON text or UTF-8 bytes
+
+    Returns:
+        Any: Parsed value
+
+    Raises:
+        JSONDecodeError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(value: Any) -> bytes:
+    """
+    Serialize a value to compact UTF-8 JSON, keeping non-ASCII text as is
+
+    Args:
+        value: Value made of dicts, lists, strings, numbers, booleans and None
+
+    Returns:
+        bytes: Serialized document
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -1,35 +1,174 @@
 # utils/logging.py
 import sys
+import json
+import time
+import queue
+import atexit
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
+import threading
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+# Request ID of the request being handled, attached to every record
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Record attributes set by logging itself; anything else came from `extra`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+def bind_request_id(request_id: str):
+    """
+    Attach a request ID to all records logged from the current task
+
+    Args:
+        request_id: Request ID
+    """
+    request_id_var.set(request_id)
+
+class RequestContextFilter(logging.Filter):
+    """Add the current request ID to records that do not carry one"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limit INFO and lower records to `rate` per second per call site
+
+    Warnings and errors always pass. The first record let through after
+    some were dropped reports how many were suppressed.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._windows: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.rate <= 0:
+            return True
+
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(site)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window else 0
+                self._windows[site] = [now, 1, 0]
+            elif window[1] < self.rate:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the caller
+
+    Records are rendered to plain messages in the calling thread, so the
+    listener does not depend on objects that may change afterwards. When
+    the queue is full, records are dropped and counted instead.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class TextFormatter(logging.Formatter):
+    """Plain text formatter that mentions suppressed records"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            text = f"{text} ({suppressed} similar messages suppressed)"
+        return text
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record
+
+    Carries the timestamp, level, message, request ID, and any fields
+    passed through `extra`, such as stage timings.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None)
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
 
 def setup_logging():
     """
     Configure logging for the application
-    
+
+    Records are handed to a queue in the calling thread and written to the
+    console and the rotating log file by a listener thread, so request
+    handling never waits on log I/O.
+
     Returns:
         logging.Logger: Configured logger
     """
+    global _listener
+    stop_logging()
+
     # Create logs directory if it doesn't exist
     os.makedirs("logs", exist_ok=True)
-    
+
     # Configure logging
     logger = logging.getLogger("patient-care-api")
-    
+
     if logger.handlers:
         logger.handlers = []
-        
-    logger.setLevel(logging.INFO)
-    
+
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
     # Formatter for logs
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter('%(asctime)s - %(levelname)s - %(message)s')
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+
     # File handler with log rotation
     file_handler = TimedRotatingFileHandler(
         "logs/api.log",
@@ -39,9 +178,29 @@ def setup_logging():
         encoding="utf-8"
     )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+
+    # Hand records to the listener thread instead of writing them here
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(float(os.getenv("LOG_INFO_RATE_LIMIT", "50"))))
+    queue_handler.addFilter(RequestContextFilter())
+    logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+
     # Prevent propagation to root logger
     logger.propagate = False
-    
-    return logger
\ No newline at end of file
+
+    return logger
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)